@@ -1,14 +1,18 @@
 # app.py
 import os
-import sqlite3
-from flask import Flask, session, redirect, url_for, render_template, request, g
+from flask import Flask, session, redirect, url_for, render_template, request
 from flask_babel import Babel
 from flask_wtf.csrf import CSRFProtect
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 from config import Config
 from modules.auth import auth_bp
+from modules.calc_api import calc_api_bp
 from modules.admin import admin_bp
-from modules.db_init import init_user_db, init_db
+from modules.db_init import init_user_db, init_db, init_main_db
+from modules import db, jobs, metrics, migrations, page_cache, passwords, report_cache, warmup
+from modules.jobs import jobs_bp
+from modules.page_cache import conditional_page
 from modules.plants import plants_bp
 from modules.projects import projects_bp
 
@@ -18,7 +22,10 @@ def create_app():
     """Crea y configura una instancia de la aplicación Flask."""
     app = Flask(__name__)
     app.config.from_object(Config)
-    app.config['MAIN_DB'] = os.path.join('database', 'main_data.db')
+    # Detrás de un proxy inverso, remote_addr y el esquema vienen de X-Forwarded-*
+    if app.config['PROXY_FIX_X_FOR']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'],
+                                x_proto=1)
 
     csrf = CSRFProtect()
     csrf.init_app(app)
@@ -32,6 +39,13 @@ def create_app():
 
     babel.init_app(app, locale_selector=get_locale)
 
+    # Registrar las bases de datos; las conexiones se abren al primer uso
+    db.init_app(app)
+    # Métricas de peticiones y consultas, expuestas en /metrics
+    metrics.init_app(app)
+    # Pool de bcrypt y límite de intentos de login
+    passwords.init_app(app)
+
     with app.app_context():
         # 1. Crear carpetas necesarias
         for folder in ['uploads', 'reports', 'database']:
@@ -46,29 +60,26 @@ def create_app():
         if not os.path.exists(app.config['PLANTS_DB']):
             init_db(app.config['PLANTS_DB'], 'schemas/plants_schema.sql')
 
+        # 4. Inicializar la base principal y aplicar las migraciones pendientes
+        if not os.path.exists(app.config['MAIN_DB']):
+            init_main_db(app.config['MAIN_DB'])
+        migrations.init_app(app)
+
+        # 5. Preparar la caché y la cola de trabajos de reportes
+        report_cache.init_app(app)
+        page_cache.init_app(app)
+        jobs.init_app(app)
+
     app.register_blueprint(auth_bp)
     app.register_blueprint(admin_bp)
     app.register_blueprint(plants_bp)
     app.register_blueprint(projects_bp)
-
-    @app.before_request
-    def before_request():
-        if request.method == 'POST':
-            import logging
-            logging.warning(f'Request form data in before_request: {request.form}')
-        g.user_db = sqlite3.connect(app.config['USER_DB'])
-        g.user_db.row_factory = sqlite3.Row
-        g.plants_db = sqlite3.connect(app.config['PLANTS_DB'])
-        g.plants_db.row_factory = sqlite3.Row
-
-    @app.teardown_request
-    def teardown_request(exception):
-        user_db = getattr(g, 'user_db', None)
-        if user_db is not None:
-            user_db.close()
-        plants_db = getattr(g, 'plants_db', None)
-        if plants_db is not None:
-            plants_db.close()
+    app.register_blueprint(jobs_bp)
+    # API JSON/NDJSON para scripts: sin token CSRF, exige Content-Type JSON
+    csrf.exempt(calc_api_bp)
+    app.register_blueprint(calc_api_bp)
+    # /healthz y /readyz (estado del calentamiento del worker)
+    warmup.init_app(app)
 
     @app.route('/change_language/<lang>')
     def change_language(lang):
@@ -83,6 +94,7 @@ def create_app():
         return redirect(url_for('auth.login'))
 
     @app.route('/dashboard')
+    @conditional_page()
     def dashboard():
         if 'user_id' not in session:
             return redirect(url_for('auth.login'))
@@ -102,6 +114,8 @@ def create_app():
     return app
 
 # --- PUNTO DE ENTRADA ---
+# Desarrollo. En producción: gunicorn -c gunicorn.conf.py wsgi:app
 if __name__ == '__main__':
     app = create_app()
+    warmup.warm_up(app)
     app.run(host='0.0.0.0', port=5002, debug=True)
@@ -0,0 +1,232 @@
+# benchmarks/run.py
+"""Benchmarks de cálculos, exportaciones y reportes a escala.
+
+Genera proyectos sintéticos (reproducibles, con semilla fija) de 1k, 10k y
+100k circuitos y mide cada etapa: las funciones escalares de
+``modules.calculations``, el cálculo vectorizado, la exportación Revit y los
+reportes Excel y PDF (sin pasar por la caché de reportes). Para cada etapa
+se guarda el mejor tiempo de ``--repeat`` ejecuciones y el pico de memoria
+de Python medido con ``tracemalloc`` en una ejecución aparte.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json --threshold 0.25
+
+Con ``--baseline`` el proceso termina con código 1 si alguna etapa es más
+lenta o usa más memoria que la línea base en más de ``--threshold``. La
+línea base depende de la máquina y no se versiona: hay que grabarla primero
+en la misma máquina con ``--save-baseline``; si el archivo no existe el
+comando termina con código 2 sin ejecutar los benchmarks.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from flask import Flask
+
+from config import Config
+from modules.batch_sizing import optimize_circuits, size_circuits
+from modules.calculations import (calculate_voltage_drop, dimension_channel, estado_caida,
+                                  select_cable)
+from modules.exports import export_for_revit, iter_revit_csv
+from modules.reporting import generate_excel_report, generate_pdf_report
+
+TAMANOS = (1000, 10000, 100000)
+SEMILLA = 20240601
+NUM_CONDUCTORES = 3
+VOLTAJE = 480
+UMBRAL = 0.25
+# Diferencias por debajo de estos mínimos se consideran ruido
+SEGUNDOS_MINIMOS = 0.01
+MEMORIA_MINIMA_MB = 1.0
+
+
+def proyecto_sintetico(n, semilla=SEMILLA):
+    """Circuitos sintéticos dentro de los rangos de las tablas normativas."""
+    rnd = random.Random(semilla + n)
+    return [{
+        'ID_Equipo': f'EQ-{i:06d}',
+        'Descripcion': f'Motor bomba {i % 97} área {i % 13}',
+        'Corriente': round(rnd.uniform(5, 100), 1),
+        'Temperatura': rnd.randint(21, 45),
+        'Longitud': round(rnd.uniform(10, 300), 1),
+    } for i in range(n)]
+
+
+def _resultados(circuitos):
+    """Lista de resultados en el formato de los reportes, vía cálculo vectorizado."""
+    lote = size_circuits(
+        [c['Corriente'] for c in circuitos],
+        [c['Temperatura'] for c in circuitos],
+        [c['Longitud'] for c in circuitos],
+        VOLTAJE, NUM_CONDUCTORES,
+    )
+    return [{
+        'ID_Equipo': c['ID_Equipo'],
+        'Descripcion': c['Descripcion'],
+        'Corriente': c['Corriente'],
+        'Calibre': lote['Calibre'][i],
+        'Caida_Tension': round(float(lote['Caida_Tension'][i]), 2),
+        'Canalizacion': lote['Canalizacion'][i],
+    } for i, c in enumerate(circuitos)]
+
+
+def etapas(circuitos, resultados):
+    """Etapas a medir: nombre -> función sin argumentos."""
+    calibres = [r['Calibre'] for r in resultados]
+
+    def escalar_select_cable():
+        for c in circuitos:
+            select_cable(c['Corriente'], c['Temperatura'])
+
+    def escalar_voltage_drop():
+        for c, calibre in zip(circuitos, calibres):
+            estado_caida(calculate_voltage_drop(c['Corriente'], c['Longitud'], calibre, VOLTAJE))
+
+    def escalar_dimension_channel():
+        for calibre in calibres:
+            dimension_channel(calibre, NUM_CONDUCTORES)
+
+    def lote_size_circuits():
+        _resultados(circuitos)
+
+    def lote_optimize_circuits():
+        optimize_circuits(
+            [c['Corriente'] for c in circuitos],
+            [c['Temperatura'] for c in circuitos],
+            [c['Longitud'] for c in circuitos],
+            VOLTAJE,
+        )
+
+    # __wrapped__: la función original, sin la caché de reportes
+    return {
+        'select_cable': escalar_select_cable,
+        'calculate_voltage_drop': escalar_voltage_drop,
+        'dimension_channel': escalar_dimension_channel,
+        'size_circuits': lote_size_circuits,
+        'optimize_circuits': lote_optimize_circuits,
+        'export_for_revit': lambda: export_for_revit.__wrapped__(resultados, 1),
+        'iter_revit_csv_gzip': lambda: sum(len(b) for b in iter_revit_csv(iter(resultados), comprimir=True)),
+        'generate_excel_report': lambda: generate_excel_report.__wrapped__(resultados, 1),
+        'generate_pdf_report': lambda: generate_pdf_report.__wrapped__(resultados, 1),
+    }
+
+
+def medir(funcion, repeticiones, memoria=True):
+    """Mejor tiempo de ``repeticiones`` ejecuciones y pico de memoria (MB)."""
+    tiempos = []
+    for _ in range(repeticiones):
+        gc.collect()
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+
+    resultado = {'segundos': round(min(tiempos), 4)}
+    if memoria:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            funcion()
+            resultado['memoria_pico_mb'] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        finally:
+            tracemalloc.stop()
+    return resultado
+
+
+def ejecutar(tamanos, repeticiones, seleccion=None, memoria=True):
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    resultados = {}
+    directorio_original = os.getcwd()
+    with app.app_context(), tempfile.TemporaryDirectory() as directorio:
+        # Los reportes se escriben en ./reports: usar un directorio temporal
+        os.chdir(directorio)
+        try:
+            for n in tamanos:
+                circuitos = proyecto_sintetico(n)
+                por_etapa = resultados[str(n)] = {}
+                for nombre, funcion in etapas(circuitos, _resultados(circuitos)).items():
+                    if seleccion and nombre not in seleccion:
+                        continue
+                    por_etapa[nombre] = medir(funcion, repeticiones, memoria)
+                    print(f'{n:>7} {nombre:<24} {por_etapa[nombre]}', flush=True)
+        finally:
+            os.chdir(directorio_original)
+    return resultados
+
+
+def comparar(actual, base, umbral):
+    """Lista de regresiones (texto) de ``actual`` respecto a ``base``."""
+    regresiones = []
+    for n, por_etapa in actual.items():
+        for etapa, medida in por_etapa.items():
+            referencia = base.get(n, {}).get(etapa)
+            if not referencia:
+                continue
+            for clave, minimo in (('segundos', SEGUNDOS_MINIMOS), ('memoria_pico_mb', MEMORIA_MINIMA_MB)):
+                if clave not in medida or clave not in referencia:
+                    continue
+                limite = referencia[clave] * (1 + umbral)
+                if medida[clave] > limite and medida[clave] - referencia[clave] > minimo:
+                    regresiones.append(
+                        f'{n} {etapa} {clave}: {medida[clave]} > {referencia[clave]} (+{umbral:.0%})'
+                    )
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks de cálculos, exportaciones y reportes.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(TAMANOS),
+                        help='Número de circuitos de cada proyecto sintético.')
+    parser.add_argument('--repeat', type=int, default=3, help='Ejecuciones por etapa (se toma la mejor).')
+    parser.add_argument('--stage', action='append', help='Medir solo esta etapa (se puede repetir).')
+    parser.add_argument('--no-memory', action='store_true', help='No medir el pico de memoria.')
+    parser.add_argument('--baseline', help='Línea base JSON con la que comparar.')
+    parser.add_argument('--threshold', type=float, default=UMBRAL,
+                        help='Regresión tolerada respecto a la línea base (0.25 = 25%%).')
+    parser.add_argument('--save-baseline', help='Guardar los resultados como línea base JSON.')
+    args = parser.parse_args(argv)
+
+    if args.baseline and not os.path.exists(args.baseline):
+        print(f'No existe la línea base {args.baseline}. Grábala primero en esta máquina:\n'
+              f'    python -m benchmarks.run --save-baseline {args.baseline}', file=sys.stderr)
+        return 2
+
+    resultados = ejecutar(args.sizes, max(1, args.repeat), args.stage, not args.no_memory)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                'meta': {
+                    'fecha': datetime.now().isoformat(timespec='seconds'),
+                    'python': platform.python_version(),
+                    'plataforma': platform.platform(),
+                    'repeticiones': args.repeat,
+                },
+                'resultados': resultados,
+            }, f, indent=2, ensure_ascii=False)
+        print(f'Línea base guardada en {args.save_baseline}')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            base = json.load(f)['resultados']
+        regresiones = comparar(resultados, base, args.threshold)
+        for regresion in regresiones:
+            print(f'REGRESIÓN {regresion}')
+        if regresiones:
+            return 1
+        print('Sin regresiones respecto a la línea base.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,6 +4,69 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or os.urandom(24)
     USER_DB = os.path.join(os.path.dirname(__file__), 'database', 'users.db')
     CALC_DB = os.path.join(os.path.dirname(__file__), 'database', 'calculations.db')
+    MAIN_DB = os.path.join(os.path.dirname(__file__), 'database', 'main_data.db')
+    # Tablas normativas usadas por modules/calculations.py (calibre, ampacidad...)
+    NORM_DB = CALC_DB
+    # Instantánea binaria de las tablas normativas (python normative_snapshot.py);
+    # si no existe o no es válida se lee NORM_DB
+    NORM_SNAPSHOT = os.environ.get('NORM_SNAPSHOT') or os.path.join(
+        os.path.dirname(__file__), 'database', 'normative.snapshot')
+    # Tablas normativas extendidas (calibre_awg, material, temperatura_aislante...)
+    NORMATIVE_DATA_DB = os.path.join(os.path.dirname(__file__), 'database', 'normative_data.db')
+    # Material y temperatura del aislante (°C) de esas tablas con los que se
+    # dimensiona cuando no se indica otro; sin filas para ellos se usa NORM_DB
+    DERATING_MATERIAL = os.environ.get('DERATING_MATERIAL', 'Cobre')
+    DERATING_TEMPERATURA_AISLANTE = int(os.environ.get('DERATING_TEMPERATURA_AISLANTE', 75))
     PLANTS_DB = os.path.join(os.path.dirname(__file__), 'database', 'plants.db')
+    JOBS_DB = os.path.join(os.path.dirname(__file__), 'database', 'jobs.db')
+    # Trabajos de reportes: procesos del pool de cada worker, trabajos en
+    # ejecución entre todos los workers, máximo en cola, segundos sin latido
+    # tras los que un trabajo 'ejecutando' se considera huérfano e intervalo
+    # (s) del despachador que recupera huérfanos y arranca los encolados
+    JOBS_MAX_WORKERS = int(os.environ.get('JOBS_MAX_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+    JOBS_MAX_RUNNING = int(os.environ.get('JOBS_MAX_RUNNING', JOBS_MAX_WORKERS))
+    JOBS_MAX_PENDING = int(os.environ.get('JOBS_MAX_PENDING', 20))
+    JOBS_STALE_SECONDS = int(os.environ.get('JOBS_STALE_SECONDS', 900))
+    JOBS_DISPATCH_INTERVAL = float(os.environ.get('JOBS_DISPATCH_INTERVAL', 5))
+    # Tamaño máximo (bytes) del cuerpo de POST /jobs/, que se guarda en la tabla
+    JOBS_MAX_PAYLOAD_BYTES = int(os.environ.get('JOBS_MAX_PAYLOAD_BYTES', 8 * 1024 * 1024))
+    # Caché de reportes: presupuesto de disco (bytes) y vida máxima (s)
+    REPORT_CACHE_MAX_BYTES = int(os.environ.get('REPORT_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+    REPORT_CACHE_TTL = int(os.environ.get('REPORT_CACHE_TTL', 7 * 24 * 3600))
+    # Caché en memoria de páginas renderizadas (número de páginas)
+    PAGE_CACHE_MAX_ENTRIES = int(os.environ.get('PAGE_CACHE_MAX_ENTRIES', 512))
+    # Métricas: /metrics exige el token Bearer o una petición desde las redes
+    # confiables (separadas por comas); registro de peticiones (fracción
+    # muestreada; las lentas y las fallidas se registran siempre)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_ALLOWED_NETWORKS = os.environ.get('METRICS_ALLOWED_NETWORKS', '127.0.0.1,::1')
+    REQUEST_LOG_SAMPLE_RATE = float(os.environ.get('REQUEST_LOG_SAMPLE_RATE', 0.01))
+    REQUEST_LOG_SLOW_MS = float(os.environ.get('REQUEST_LOG_SLOW_MS', 1000))
+    # Contraseñas: factor de trabajo de bcrypt (los hashes con otro factor se
+    # regeneran en el siguiente login), hilos del pool, cola máxima y espera (s)
+    BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+    BCRYPT_MAX_WORKERS = int(os.environ.get('BCRYPT_MAX_WORKERS', 2))
+    BCRYPT_MAX_QUEUE = int(os.environ.get('BCRYPT_MAX_QUEUE', 16))
+    BCRYPT_TIMEOUT = float(os.environ.get('BCRYPT_TIMEOUT', 10))
+    # Límite de intentos de login fallidos por ventana (s), por usuario y por IP;
+    # los fallos se guardan en USER_DB y cuentan para todos los workers
+    LOGIN_WINDOW_SECONDS = int(os.environ.get('LOGIN_WINDOW_SECONDS', 900))
+    LOGIN_MAX_FAILURES_USER = int(os.environ.get('LOGIN_MAX_FAILURES_USER', 5))
+    LOGIN_MAX_FAILURES_IP = int(os.environ.get('LOGIN_MAX_FAILURES_IP',
+                                               os.environ.get('LOGIN_MAX_ATTEMPTS_IP', 30)))
+    # Proxies inversos de confianza delante de la aplicación (0: ninguno). Con
+    # N > 0 se aplica ProxyFix y la IP del cliente (límite de login, métricas)
+    # se toma de las últimas N entradas de X-Forwarded-For
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 0))
+    # Límite de caída de tensión (%) del optimizador de calibres
+    VOLTAGE_DROP_LIMIT = float(os.environ.get('VOLTAGE_DROP_LIMIT', 3))
+    # API de cálculo por lotes (/api/calc/batch): circuitos y bytes por
+    # petición, circuitos por bloque de cálculo, tiempo máximo (s) y token
+    # Bearer opcional
+    CALC_API_MAX_BATCH = int(os.environ.get('CALC_API_MAX_BATCH', 50000))
+    CALC_API_MAX_BYTES = int(os.environ.get('CALC_API_MAX_BYTES', 32 * 1024 * 1024))
+    CALC_API_CHUNK = int(os.environ.get('CALC_API_CHUNK', 2000))
+    CALC_API_TIME_BUDGET = float(os.environ.get('CALC_API_TIME_BUDGET', 30))
+    CALC_API_TOKEN = os.environ.get('CALC_API_TOKEN')
     LANGUAGES = {'en': 'English', 'es': 'Español'}
     BABEL_DEFAULT_LOCALE = 'es'
\ No newline at end of file
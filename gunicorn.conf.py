@@ -0,0 +1,34 @@
+# gunicorn.conf.py
+"""Configuración de gunicorn para producción.
+
+La aplicación se construye en el proceso maestro (``preload_app``) y cada
+worker, al bifurcarse, la calienta antes de empezar a aceptar conexiones
+(``post_worker_init``). Los valores se pueden ajustar con variables de
+entorno.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5002')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# Hilos por worker: los streams (SSE, NDJSON, exportaciones) ocupan uno cada uno
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+# Reciclar workers para acotar el crecimiento de memoria
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 200))
+preload_app = True
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_worker_init(worker):
+    """Calienta el worker recién creado; corre antes de que acepte peticiones."""
+    from modules.warmup import warm_up
+
+    app = worker.wsgi
+    # El tiempo de calentamiento se registra con el logger de la aplicación
+    app.logger.setLevel(loglevel.upper())
+    warm_up(app)
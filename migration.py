@@ -1,47 +1,37 @@
-import sqlite3
-
-def migrate():
-    # Migrate users table
-    try:
-        conn_users = sqlite3.connect('database/users.db')
-        cursor_users = conn_users.cursor()
-        try:
-            cursor_users.execute('ALTER TABLE users ADD COLUMN email TEXT')
-            print('Columna "email" añadida a la tabla de usuarios.')
-        except sqlite3.OperationalError as e:
-            if 'duplicate column name' in str(e):
-                print('La columna "email" ya existe en la tabla de usuarios.')
-            else:
-                raise e
-        conn_users.commit()
-    except sqlite3.Error as e:
-        print(f"Error with users.db: {e}")
-    finally:
-        if conn_users:
-            conn_users.close()
-
-    # Migrate plants table
-    try:
-        conn_plants = sqlite3.connect('database/plants.db')
-        cursor_plants = conn_plants.cursor()
-        
-        # Check and add columns
-        columns_to_add = ['medium_voltage', 'low_voltage', 'control_voltage']
-        for column in columns_to_add:
-            try:
-                cursor_plants.execute(f'ALTER TABLE plants ADD COLUMN {column} TEXT')
-                print(f'Columna "{column}" añadida a la tabla de plantas.')
-            except sqlite3.OperationalError as e:
-                if 'duplicate column name' in str(e):
-                    print(f'La columna "{column}" ya existe en la tabla de plantas.')
-                else:
-                    raise e
-        conn_plants.commit()
-    except sqlite3.Error as e:
-        print(f"Error with plants.db: {e}")
-    finally:
-        if conn_plants:
-            conn_plants.close()
+# migration.py
+"""Aplica las migraciones de esquema pendientes.
+
+Uso:
+    python migration.py             # aplica las migraciones
+    python migration.py --dry-run   # muestra los planes de consulta antes y después, sin guardar cambios
+    python migration.py --db main   # solo la base indicada (users, plants, main, calc)
+"""
+
+import argparse
+
+from config import Config
+from modules.migrations import MIGRACIONES, migrate_all
+
+RUTAS = {
+    'users': Config.USER_DB,
+    'plants': Config.PLANTS_DB,
+    'main': Config.MAIN_DB,
+    'calc': Config.CALC_DB,
+}
+
+
+def migrate(dry_run=False, bases=None):
+    rutas = {nombre: ruta for nombre, ruta in RUTAS.items() if not bases or nombre in bases}
+    versiones = migrate_all(rutas, dry_run=dry_run, salida=print)
+    for nombre, version in versiones.items():
+        print(f'{nombre}: versión de esquema {version}')
+
 
 if __name__ == '__main__':
-    migrate()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Migraciones de esquema de las bases SQLite.')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Aplica las migraciones en una transacción que se deshace y muestra los planes.')
+    parser.add_argument('--db', action='append', choices=sorted(MIGRACIONES),
+                        help='Base a migrar (se puede repetir). Por defecto, todas.')
+    args = parser.parse_args()
+    migrate(dry_run=args.dry_run, bases=args.db)
@@ -1,10 +1,15 @@
 # modules/admin.py
 
 from flask import (Blueprint, render_template, request, redirect, 
-                   url_for, flash, session, g)
-import bcrypt
+                   url_for, flash, session, jsonify)
+import sqlite3
 from functools import wraps
 
+from modules.db import get_db
+from modules.page_cache import bump_version, conditional_page
+from modules.passwords import get_hasher
+from modules.pagination import keyset_page, page_json, page_params
+
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
 def admin_required(f):
@@ -20,18 +25,41 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Criterio de ordenación -> columnas de la clave del cursor
+ORDEN_USUARIOS = {
+    'username': ('username', 'id'),
+    'role': ('role', 'username', 'id'),
+    'email': ('email', 'id'),
+}
+
+# El email puede ser NULL (admin por defecto); se normaliza para compararlo en el cursor
+SELECT_USUARIOS = "SELECT * FROM (SELECT id, username, role, IFNULL(email, '') AS email FROM users)"
+
+def _pagina_usuarios():
+    """Página de usuarios según los argumentos sort_by, role, cursor y limite."""
+    sort_by = request.args.get('sort_by', 'username')
+    if sort_by not in ORDEN_USUARIOS:
+        sort_by = 'username'
+    cursor, limite = page_params(request.args)
+    return keyset_page(get_db('users'), SELECT_USUARIOS, ORDEN_USUARIOS[sort_by],
+                       {'role': request.args.get('role')}, cursor, limite)
+
 @admin_bp.route('/users', methods=['GET'])
 @admin_required
+@conditional_page(('users', 'users'))
 def manage_users():
     """
-    Muestra la lista de todos los usuarios con opción de ordenación.
+    Muestra la lista de usuarios por páginas, con opción de ordenación
+    y filtro por rol.
     """
-    sort_by = request.args.get('sort_by', 'username')
-    if sort_by not in ['username', 'role', 'email']:
-        sort_by = 'username'
+    pagina = _pagina_usuarios()
+    return render_template('admin/users.html', users=pagina.items, siguiente=pagina.siguiente)
 
-    users = g.user_db.execute(f'SELECT id, username, role, email FROM users ORDER BY {sort_by}').fetchall()
-    return render_template('admin/users.html', users=users)
+@admin_bp.route('/users/api', methods=['GET'])
+@admin_required
+def list_users():
+    """Página de usuarios en JSON para la carga incremental."""
+    return jsonify(page_json(_pagina_usuarios()))
 
 @admin_bp.route('/users/create', methods=['POST'])
 @admin_required
@@ -47,13 +75,14 @@ def create_user():
     if not all([username, password, role, email]):
         flash('Todos los campos son obligatorios.', 'warning')
     else:
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
         try:
-            g.user_db.execute('INSERT INTO users (username, password, role, email) VALUES (?, ?, ?, ?)',
+            hashed_password = get_hasher().hash(password)
+            get_db('users').execute('INSERT INTO users (username, password, role, email) VALUES (?, ?, ?, ?)',
                          (username, hashed_password, role, email))
-            g.user_db.commit()
+            get_db('users').commit()
+            bump_version('users', 'users')
             flash(f'Usuario "{username}" creado exitosamente.', 'success')
-        except g.user_db.IntegrityError:
+        except sqlite3.IntegrityError:
             flash(f'El nombre de usuario "{username}" o el correo "{email}" ya existen.', 'danger')
         except Exception as e:
             flash(f'Error al crear el usuario: {e}', 'danger')
@@ -73,10 +102,11 @@ def edit_user(user_id):
         flash('El nombre de usuario y el correo no pueden estar vacíos.', 'warning')
     else:
         try:
-            g.user_db.execute('UPDATE users SET username = ?, email = ? WHERE id = ?', (new_username, new_email, user_id))
-            g.user_db.commit()
+            get_db('users').execute('UPDATE users SET username = ?, email = ? WHERE id = ?', (new_username, new_email, user_id))
+            get_db('users').commit()
+            bump_version('users', 'users')
             flash('Usuario actualizado exitosamente.', 'success')
-        except g.user_db.IntegrityError:
+        except sqlite3.IntegrityError:
             flash(f'El nombre de usuario "{new_username}" o el correo "{new_email}" ya existen.', 'danger')
         except Exception as e:
             flash(f'Error al actualizar el usuario: {e}', 'danger')
@@ -92,8 +122,9 @@ def update_user_role(user_id):
     new_role = request.form.get('role')
     if new_role:
         try:
-            g.user_db.execute('UPDATE users SET role = ? WHERE id = ?', (new_role, user_id))
-            g.user_db.commit()
+            get_db('users').execute('UPDATE users SET role = ? WHERE id = ?', (new_role, user_id))
+            get_db('users').commit()
+            bump_version('users', 'users')
             flash('Rol de usuario actualizado exitosamente.', 'success')
         except Exception as e:
             flash(f'Error al actualizar el rol del usuario: {e}', 'danger')
@@ -109,8 +140,9 @@ def delete_user(user_id):
     Elimina un usuario.
     """
     try:
-        g.user_db.execute('DELETE FROM users WHERE id = ?', (user_id,))
-        g.user_db.commit()
+        get_db('users').execute('DELETE FROM users WHERE id = ?', (user_id,))
+        get_db('users').commit()
+        bump_version('users', 'users')
         flash('Usuario eliminado exitosamente.', 'success')
     except Exception as e:
         flash(f'Error al eliminar el usuario: {e}', 'danger')
@@ -6,16 +6,20 @@ los datos de usuarios y implementa medidas de seguridad como el hash de contrase
 
 Características principales:
 - Autenticación basada en formularios
-- Almacenamiento seguro de contraseñas con hash
+- Almacenamiento seguro de contraseñas con hash (bcrypt en un pool acotado,
+  con regeneración del hash al cambiar el factor de trabajo)
+- Límite de intentos fallidos de login por usuario y por IP
 - Gestión de sesiones de usuario
 - Control de acceso basado en roles
 """
 
 from flask import (
-    Blueprint, render_template, request, redirect, url_for, session, flash, g
+    Blueprint, render_template, request, redirect, url_for, session, flash
 )
-import bcrypt
 from forms import LoginForm
+from modules import metrics
+from modules.db import get_db
+from modules.passwords import get_hasher, get_throttle
 
 # Blueprint de autenticación
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth', template_folder='templates')
@@ -26,23 +30,57 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         username = form.username.data
-        password = form.password.data.encode('utf-8')
+        password = form.password.data
 
-        user = g.user_db.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
+        # Rechazar antes de llegar a bcrypt si el usuario o la IP superan el límite
+        espera = get_throttle().retry_after(username, request.remote_addr)
+        if espera:
+            metrics.LOGIN_ATTEMPTS.inc(resultado='limitado')
+            flash(f'Demasiados intentos de inicio de sesión. Intenta de nuevo en {espera // 60 + 1} minutos.', 'danger')
+            return render_template('login.html', form=form), 429, {'Retry-After': str(espera)}
 
-        if user and bcrypt.checkpw(password, user['password']):
+        user = get_db('users').execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
+
+        hasher = get_hasher()
+        try:
+            if user:
+                valido = hasher.verify(password, user['password'])
+            else:
+                # Mismo coste que un usuario real: el tiempo no revela qué usuarios existen
+                valido = hasher.verify_dummy(password)
+        except (OverflowError, TimeoutError):
+            metrics.LOGIN_ATTEMPTS.inc(resultado='ocupado')
+            flash('El servidor está ocupado. Intenta de nuevo en unos segundos.', 'warning')
+            return render_template('login.html', form=form), 503, {'Retry-After': '5'}
+
+        if valido:
+            get_throttle().succeeded(username)
+            metrics.LOGIN_ATTEMPTS.inc(resultado='ok')
+            if hasher.needs_rehash(user['password']):
+                _rehash(hasher, user['id'], password)
             session.clear()
             session['user_id'] = user['id']
             session['username'] = user['username']
             session['role'] = user['role']
-            print(f"DEBUG: Datos de sesión guardados -> {session}")
             flash('Inicio de sesión exitoso.', 'success')
             return redirect(url_for('dashboard'))
         else:
+            get_throttle().failed(username, request.remote_addr)
+            metrics.LOGIN_ATTEMPTS.inc(resultado='fallido')
             flash('Usuario o contraseña incorrectos.', 'danger')
 
     return render_template('login.html', form=form)
 
+def _rehash(hasher, user_id, password):
+    """Guarda el hash con el factor de trabajo actual; si falla, el login sigue."""
+    try:
+        nuevo = hasher.hash(password)
+    except (OverflowError, TimeoutError):
+        return
+    conn = get_db('users')
+    conn.execute('UPDATE users SET password = ? WHERE id = ?', (nuevo, user_id))
+    conn.commit()
+
 @auth_bp.route('/logout')
 def logout():
     """Cierra la sesión del usuario actual, conservando el idioma.
@@ -0,0 +1,333 @@
+# modules/batch_sizing.py
+"""Dimensionamiento vectorizado de listas completas de circuitos.
+
+Equivale a aplicar ``select_cable``, ``calculate_voltage_drop`` y
+``dimension_channel`` fila por fila, pero sobre columnas NumPy en una sola
+pasada: el calibre sale de la rejilla de ampacidad corregida por
+temperatura y agrupamiento (``modules.derating``, con el número de
+conductores de cada circuito) y las búsquedas de impedancia y tuberías se
+resuelven con ``searchsorted``. Los resultados coinciden con las funciones
+escalares; las filas que allí lanzarían ``ValueError`` quedan con estado
+``'Error'`` y el mismo mensaje en la columna ``Error``.
+
+``optimize_circuits`` elige además el calibre mínimo que cumple a la vez la
+ampacidad y un límite de caída de tensión: la impedancia máxima admisible de
+cada circuito se busca por bisección en la tabla de calibres, sin probar
+calibre por calibre.
+"""
+
+import math
+import time
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from modules import metrics
+from modules.calculations import CAIDA_OK, CAIDA_REVISAR, derating_grid, tablas_normativas
+from modules.derating import grid_from_tables
+from modules.raceways import (
+    AREAS_CONDUCTOR, CATALOGO_TUBERIAS, ERROR_EXCEDE, OCUPACION_TUBERIA, OCUPACION_TUBERIA_VARIOS
+)
+
+SQRT3 = math.sqrt(3)
+
+# Columnas de entrada esperadas por size_dataframe
+COLUMNAS_ENTRADA = ['Corriente', 'Temperatura', 'Longitud', 'Voltaje']
+NUM_CONDUCTORES_DEFECTO = 3
+
+
+def _flotantes(valores):
+    """Arreglo float con NaN por ``None``; sin copia si ya es un arreglo (instantánea mmap)."""
+    if isinstance(valores, np.ndarray):
+        return np.asarray(valores, dtype=float)
+    return np.array([np.nan if v is None else v for v in valores], dtype=float)
+
+
+class _ArreglosNormativos:
+    """Vista NumPy de unas TablasNormativas, construida una vez por instantánea."""
+
+    def __init__(self, tablas):
+        self.ampacidades = _flotantes(tablas.ampacidades)
+        self.calibres = np.array(tablas.calibres + [None], dtype=object)
+        self.posiciones = {calibre: i for i, calibre in enumerate(tablas.calibres)}
+
+        # Impedancia y área por posición en la tabla de ampacidad; NaN donde
+        # la versión escalar lanzaría "no encontrado" / "no soportado".
+        impedancias = []
+        for calibre in tablas.calibres:
+            datos = tablas.resistencia_reactancia(calibre)
+            if datos is None:
+                impedancias.append(np.nan)
+            else:
+                r, x = datos
+                impedancias.append(math.sqrt(r*r + x*x))
+        self.impedancias = np.array(impedancias + [np.nan], dtype=float)
+        self.areas = np.array(
+            [AREAS_CONDUCTOR.get(c, np.nan) for c in tablas.calibres] + [np.nan], dtype=float)
+
+        # Mínimo acumulado de la impedancia (no creciente) para buscar por
+        # bisección el primer calibre que cumple una impedancia máxima
+        con_infinito = np.where(np.isnan(self.impedancias[:-1]), np.inf, self.impedancias[:-1])
+        self.impedancia_minima = np.minimum.accumulate(con_infinito) if con_infinito.size else con_infinito
+
+        self.limites_tuberia = np.array([canal.area for canal in CATALOGO_TUBERIAS], dtype=float)
+        self.tuberias = np.array([canal.nombre for canal in CATALOGO_TUBERIAS] + [None], dtype=object)
+
+
+@lru_cache(maxsize=4)
+def _arreglos(tablas):
+    return _ArreglosNormativos(tablas)
+
+
+@lru_cache(maxsize=4)
+def _rejilla_de(tablas):
+    return grid_from_tables(tablas)
+
+
+def _canalizaciones(arr, j, num_conductores):
+    """Tubería mínima del catálogo de ``modules.raceways`` (``smallest_raceway``).
+
+    Returns:
+        tuple: ``(canalizaciones, excede)``; ``excede`` marca los circuitos
+        que no caben ni en la mayor tubería.
+    """
+    ocupacion = np.full(num_conductores.shape, OCUPACION_TUBERIA_VARIOS)
+    for conductores, fraccion in OCUPACION_TUBERIA.items():
+        ocupacion[num_conductores == conductores] = fraccion
+    necesaria = arr.areas[j] * num_conductores / ocupacion
+    k = np.searchsorted(arr.limites_tuberia, necesaria, side='left')
+    return arr.tuberias[k], k == len(arr.limites_tuberia)
+
+
+def _tablas_y_rejilla(tablas, rejilla):
+    """Sin tablas se usan las de la aplicación; sin rejilla, la de esas tablas."""
+    if tablas is None:
+        tablas = tablas_normativas()
+        if rejilla is None:
+            rejilla = derating_grid()
+    if rejilla is None:
+        rejilla = _rejilla_de(tablas)
+    return tablas, rejilla
+
+
+def _calibres_por_ampacidad(arr, rejilla, corrientes, temperaturas, num_conductores):
+    """Calibre por ampacidad corregida (temperatura y agrupamiento) de cada circuito.
+
+    Returns:
+        tuple: ``(calibres, j, errores, con_error)``; ``j`` es la posición de
+        cada calibre en la tabla de impedancias (``len`` si no está) y
+        ``errores`` los mensajes de ``select_cable`` donde ``con_error``.
+    """
+    calibres = rejilla.select_many(corrientes, temperaturas, num_conductores)
+    n = len(arr.ampacidades)
+    j = np.fromiter((arr.posiciones.get(c, n) for c in calibres.ravel()),
+                    dtype=np.intp, count=calibres.size).reshape(calibres.shape)
+
+    errores = np.full(corrientes.shape, None, dtype=object)
+    sin_temp = ~rejilla.temperatures_in_range(temperaturas)
+    sin_conductores = ~sin_temp & ~(num_conductores >= 1)
+    sin_calibre = ~sin_temp & ~sin_conductores & np.equal(calibres, None)
+    for i in np.flatnonzero(sin_temp):
+        errores.flat[i] = f'Temperatura {temperaturas.flat[i]}°C fuera de rango'
+    for i in np.flatnonzero(sin_conductores):
+        errores.flat[i] = 'Se requiere al menos un conductor'
+    for i in np.flatnonzero(sin_calibre):
+        errores.flat[i] = f'Corriente {corrientes.flat[i]}A excede límites de tabla'
+    return calibres, j, errores, sin_temp | sin_conductores | sin_calibre
+
+
+def size_circuits(corrientes, temperaturas, longitudes, voltajes,
+                  num_conductores=NUM_CONDUCTORES_DEFECTO, tablas=None, rejilla=None):
+    """Dimensiona un lote de circuitos en una sola pasada vectorizada.
+
+    Los argumentos aceptan arreglos, series o escalares (se difunden al
+    tamaño del lote). El calibre se elige con la ampacidad corregida por
+    temperatura y por el número de conductores de cada circuito. Si no se
+    pasan ``tablas`` se usan las de la caché normativa de la aplicación y su
+    rejilla de derating; con ``tablas`` y sin ``rejilla``, la rejilla de esas
+    tablas.
+
+    Returns:
+        dict: columnas ``Calibre``, ``Caida_Tension``, ``Canalizacion``,
+        ``Estado`` y ``Error`` como arreglos NumPy.
+    """
+    inicio = time.perf_counter()
+    tablas, rejilla = _tablas_y_rejilla(tablas, rejilla)
+    arr = _arreglos(tablas)
+
+    corrientes, temperaturas, longitudes, voltajes, num_conductores = np.broadcast_arrays(
+        np.asarray(corrientes, dtype=float),
+        np.asarray(temperaturas, dtype=float),
+        np.asarray(longitudes, dtype=float),
+        np.asarray(voltajes, dtype=float),
+        np.asarray(num_conductores, dtype=float),
+    )
+
+    # Calibre por ampacidad corregida por temperatura y agrupamiento
+    calibres, j, errores, sin_calibre = _calibres_por_ampacidad(
+        arr, rejilla, corrientes, temperaturas, num_conductores)
+
+    # Caída de tensión (fórmula trifásica, mismo orden de operaciones)
+    z = arr.impedancias[j]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        caidas = (math.sqrt(3) * corrientes * z * longitudes) / (voltajes * 10)
+
+    # Canalización
+    canalizaciones, excede = _canalizaciones(arr, j, num_conductores)
+
+    estados = np.select(
+        [caidas <= CAIDA_OK, caidas <= CAIDA_REVISAR],
+        ['OK', 'Revisar'],
+        default='Fuera de rango',
+    ).astype(object)
+
+    # Filas con error: mismo mensaje y prioridad que las funciones escalares
+    sin_impedancia = ~sin_calibre & np.isnan(z)
+    sin_area = ~sin_calibre & ~sin_impedancia & np.isnan(arr.areas[j])
+    for i in np.flatnonzero(sin_impedancia):
+        errores[i] = f'Calibre {calibres[i]} no encontrado en tabla'
+    for i in np.flatnonzero(sin_area):
+        errores[i] = f'Calibre {calibres[i]} no soportado'
+    excede = ~sin_calibre & ~sin_impedancia & ~sin_area & excede
+    errores[excede] = ERROR_EXCEDE
+
+    con_error = sin_calibre | sin_impedancia | sin_area | excede
+    calibres = calibres.copy()
+    calibres[sin_calibre] = None
+    caidas = np.where(sin_calibre | sin_impedancia, np.nan, caidas)
+    canalizaciones = np.where(con_error, None, canalizaciones)
+    estados[con_error] = 'Error'
+
+    metrics.BATCH_SIZE.observe(corrientes.size)
+    metrics.BATCH_DURATION.observe(time.perf_counter() - inicio)
+    return {
+        'Calibre': calibres,
+        'Caida_Tension': caidas,
+        'Canalizacion': canalizaciones,
+        'Estado': estados,
+        'Error': errores,
+    }
+
+
+def size_dataframe(df, tablas=None):
+    """Dimensiona un DataFrame de circuitos y devuelve una copia con resultados.
+
+    ``df`` debe tener las columnas de ``COLUMNAS_ENTRADA``; la columna
+    opcional ``Num_Conductores`` toma por defecto ``NUM_CONDUCTORES_DEFECTO``.
+    """
+    faltantes = [c for c in COLUMNAS_ENTRADA if c not in df.columns]
+    if faltantes:
+        raise ValueError(f'Faltan columnas: {", ".join(faltantes)}')
+
+    num_conductores = (df['Num_Conductores'].to_numpy()
+                       if 'Num_Conductores' in df.columns else NUM_CONDUCTORES_DEFECTO)
+    resultado = size_circuits(
+        df['Corriente'].to_numpy(),
+        df['Temperatura'].to_numpy(),
+        df['Longitud'].to_numpy(),
+        df['Voltaje'].to_numpy(),
+        num_conductores,
+        tablas=tablas,
+    )
+    salida = df.copy()
+    for columna, valores in resultado.items():
+        salida[columna] = pd.Series(valores, index=salida.index, dtype=valores.dtype)
+    return salida
+
+
+def _impedancia_maxima(corrientes, longitudes, voltajes, limite_caida):
+    """Impedancia (ohm/km) con la que la caída es exactamente ``limite_caida``."""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return limite_caida * voltajes * 10 / (SQRT3 * corrientes * longitudes)
+
+
+def optimize_circuits(corrientes, temperaturas, longitudes, voltajes, limite_caida=CAIDA_OK,
+                      num_conductores=NUM_CONDUCTORES_DEFECTO, tablas=None, rejilla=None):
+    """Calibre mínimo que cumple la ampacidad y el límite de caída de tensión.
+
+    Para cada circuito se buscan por bisección dos posiciones en la tabla de
+    calibres ordenada: la primera con ampacidad suficiente (corregida por
+    temperatura y agrupamiento, como en ``size_circuits``) y la primera cuya impedancia deja la caída en
+    ``limite_caida`` o menos. El calibre elegido es el mayor de los dos.
+
+    Returns:
+        dict: columnas ``Calibre``, ``Calibre_Ampacidad`` (el que elegiría
+        ``select_cable``), ``Caida_Tension``, ``Longitud_Maxima`` (del calibre
+        elegido), ``Canalizacion``, ``Estado`` y ``Error``.
+    """
+    inicio = time.perf_counter()
+    tablas, rejilla = _tablas_y_rejilla(tablas, rejilla)
+    arr = _arreglos(tablas)
+    n_calibres = len(arr.ampacidades)
+
+    corrientes, temperaturas, longitudes, voltajes, num_conductores = np.broadcast_arrays(
+        np.asarray(corrientes, dtype=float),
+        np.asarray(temperaturas, dtype=float),
+        np.asarray(longitudes, dtype=float),
+        np.asarray(voltajes, dtype=float),
+        np.asarray(num_conductores, dtype=float),
+    )
+
+    # Posición mínima por ampacidad
+    calibres_ampacidad, j_ampacidad, errores, sin_ampacidad = _calibres_por_ampacidad(
+        arr, rejilla, corrientes, temperaturas, num_conductores)
+
+    # Posición mínima por caída: primera con impedancia <= máxima admisible
+    z_maxima = _impedancia_maxima(corrientes, longitudes, voltajes, limite_caida)
+    j_caida = np.searchsorted(-arr.impedancia_minima, -z_maxima, side='left')
+    j_caida[np.isnan(z_maxima)] = n_calibres
+
+    j = np.maximum(j_ampacidad, j_caida)
+    # Con una tabla de impedancias no monótona el calibre elegido puede no
+    # cumplir; avanzar hasta el siguiente que cumpla (no ocurre con tablas NEC)
+    z = arr.impedancias[j]
+    revisar = np.flatnonzero((j < n_calibres) & ~(z <= z_maxima))
+    for i in revisar:
+        k = j[i]
+        while k < n_calibres and not arr.impedancias[k] <= z_maxima[i]:
+            k += 1
+        j[i] = k
+    z = arr.impedancias[j]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        caidas = (SQRT3 * corrientes * z * longitudes) / (voltajes * 10)
+        longitud_maxima = limite_caida * voltajes * 10 / (SQRT3 * corrientes * z)
+    canalizaciones, excede = _canalizaciones(arr, j, num_conductores)
+    estados = np.select(
+        [caidas <= CAIDA_OK, caidas <= CAIDA_REVISAR],
+        ['OK', 'Revisar'],
+        default='Fuera de rango',
+    ).astype(object)
+
+    # Un calibre de la rejilla sin impedancia en la tabla no cumple ninguna caída
+    sin_calibre = ~sin_ampacidad & (j == n_calibres)
+    sin_area = ~sin_ampacidad & ~sin_calibre & np.isnan(arr.areas[j])
+    for i in np.flatnonzero(sin_calibre):
+        errores[i] = f'Ningún calibre cumple la caída de {limite_caida}%'
+    for i in np.flatnonzero(sin_area):
+        errores[i] = f'Calibre {arr.calibres[j[i]]} no soportado'
+    excede = ~sin_ampacidad & ~sin_calibre & ~sin_area & excede
+    errores[excede] = ERROR_EXCEDE
+
+    sin_calibre = sin_ampacidad | sin_calibre
+    con_error = sin_calibre | sin_area | excede
+    calibres = arr.calibres[j].copy()
+    calibres[sin_calibre] = None
+    caidas = np.where(sin_calibre, np.nan, caidas)
+    longitud_maxima = np.where(sin_calibre, np.nan, longitud_maxima)
+    canalizaciones = np.where(con_error, None, canalizaciones)
+    estados[con_error] = 'Error'
+
+    metrics.BATCH_SIZE.observe(corrientes.size)
+    metrics.BATCH_DURATION.observe(time.perf_counter() - inicio)
+    return {
+        'Calibre': calibres,
+        'Calibre_Ampacidad': calibres_ampacidad,
+        'Caida_Tension': caidas,
+        'Longitud_Maxima': longitud_maxima,
+        'Canalizacion': canalizaciones,
+        'Estado': estados,
+        'Error': errores,
+    }
+
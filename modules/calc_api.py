@@ -0,0 +1,234 @@
+# modules/calc_api.py
+"""API HTTP de cálculo por lotes con respuesta NDJSON.
+
+``POST /api/calc/batch`` recibe circuitos como JSON (una lista o
+``{"circuitos": [...]}``) o NDJSON (un circuito por línea) con las claves de
+``COLUMNAS_ENTRADA`` más ``ID_Equipo`` y ``Num_Conductores`` opcionales.
+Todo el lote se valida antes de calcular; los circuitos inválidos producen
+su línea de error sin detener el resto. El cálculo se hace por bloques de
+``CALC_API_CHUNK`` circuitos con ``size_circuits`` y cada bloque se envía en
+cuanto está listo: una línea JSON por circuito, en el orden de entrada.
+
+Límites por petición: ``CALC_API_MAX_BYTES`` bytes de cuerpo y
+``CALC_API_MAX_BATCH`` circuitos (413 si se superan; el tamaño del cuerpo se
+comprueba antes de leerlo y mientras se lee) y ``CALC_API_TIME_BUDGET``
+segundos de cálculo; si el tiempo se agota la respuesta termina con una
+línea ``{"truncado": true, ...}``.
+
+La autenticación es la sesión (Administrador o Ingeniero) o, para scripts,
+el token Bearer ``CALC_API_TOKEN``. El blueprint está exento de CSRF: solo
+acepta ``application/json`` y ``application/x-ndjson``, tipos que un
+formulario de otro sitio no puede enviar sin una verificación CORS previa.
+"""
+
+import hmac
+import json
+import math
+import time
+
+from flask import Blueprint, Response, abort, current_app, jsonify, request, session, stream_with_context
+
+from modules.batch_sizing import COLUMNAS_ENTRADA, NUM_CONDUCTORES_DEFECTO, size_circuits
+from modules.calculations import derating_grid, tablas_normativas
+
+calc_api_bp = Blueprint('calc_api', __name__, url_prefix='/api/calc')
+
+TIPOS_ACEPTADOS = ('application/json', 'application/x-ndjson')
+MIMETYPE_NDJSON = 'application/x-ndjson'
+TAMANO_LECTURA = 64 * 1024
+
+# Entradas que deben ser mayores que cero (la temperatura puede no serlo)
+POSITIVAS = ('Corriente', 'Longitud', 'Voltaje')
+
+
+class LoteExcedido(Exception):
+    """El lote supera ``CALC_API_MAX_BATCH`` circuitos."""
+
+
+class CuerpoExcedido(Exception):
+    """El cuerpo de la petición supera ``CALC_API_MAX_BYTES`` bytes."""
+
+
+def _autorizado():
+    token = current_app.config.get('CALC_API_TOKEN')
+    autorizacion = request.headers.get('Authorization', '').encode('utf-8')
+    if token and hmac.compare_digest(autorizacion, f'Bearer {token}'.encode('utf-8')):
+        return True
+    return session.get('role') in ['Administrador', 'Ingeniero']
+
+
+def _leer_json(maximo, maximo_bytes):
+    # Se lee como mucho un byte más del límite: un cuerpo sin Content-Length no se carga entero
+    cuerpo = request.stream.read(maximo_bytes + 1)
+    if len(cuerpo) > maximo_bytes:
+        raise CuerpoExcedido()
+    try:
+        datos = json.loads(cuerpo)
+    except ValueError:
+        raise ValueError('JSON inválido') from None
+    if isinstance(datos, dict):
+        datos = datos.get('circuitos')
+    if not isinstance(datos, list):
+        raise ValueError('Se esperaba una lista de circuitos o {"circuitos": [...]}')
+    if len(datos) > maximo:
+        raise LoteExcedido()
+    return datos
+
+
+def _lineas(flujo, maximo_bytes, tamano=TAMANO_LECTURA):
+    """Líneas de ``flujo`` leído por bloques (iterar el flujo línea a línea es lento)."""
+    resto = b''
+    leidos = 0
+    while True:
+        bloque = flujo.read(tamano)
+        if not bloque:
+            break
+        leidos += len(bloque)
+        if leidos > maximo_bytes:
+            raise CuerpoExcedido()
+        lineas = (resto + bloque).split(b'\n')
+        resto = lineas.pop()
+        yield from lineas
+    if resto:
+        yield resto
+
+
+def _leer_ndjson(maximo, maximo_bytes):
+    """Lee el cuerpo línea a línea; se detiene en cuanto se supera ``maximo`` o ``maximo_bytes``."""
+    circuitos = []
+    for num_linea, linea in enumerate(_lineas(request.stream, maximo_bytes), start=1):
+        linea = linea.strip()
+        if not linea:
+            continue
+        if len(circuitos) == maximo:
+            raise LoteExcedido()
+        try:
+            circuitos.append(json.loads(linea))
+        except ValueError:
+            raise ValueError(f'Línea {num_linea}: JSON inválido') from None
+    return circuitos
+
+
+def _numero(valor):
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+        return None
+    valor = float(valor)
+    return valor if math.isfinite(valor) else None
+
+
+def validate_circuits(circuitos):
+    """Valida el lote y lo separa en columnas.
+
+    Returns:
+        tuple: ``(columnas, errores)``; ``columnas`` tiene listas por clave de
+        ``COLUMNAS_ENTRADA`` más ``Num_Conductores`` e ``indices`` (posición
+        de cada circuito válido en el lote); ``errores`` es
+        ``{posición: mensaje}`` de los inválidos.
+    """
+    columnas = {c: [] for c in COLUMNAS_ENTRADA + ['Num_Conductores', 'indices']}
+    errores = {}
+    for i, circuito in enumerate(circuitos):
+        if not isinstance(circuito, dict):
+            errores[i] = 'El circuito debe ser un objeto JSON'
+            continue
+        valores = {}
+        for clave in COLUMNAS_ENTRADA:
+            valor = _numero(circuito.get(clave))
+            if valor is None or (clave in POSITIVAS and valor <= 0):
+                errores[i] = f'{clave} inválido' if clave in circuito else f'Falta {clave}'
+                break
+            valores[clave] = valor
+        else:
+            conductores = circuito.get('Num_Conductores', NUM_CONDUCTORES_DEFECTO)
+            if isinstance(conductores, bool) or not isinstance(conductores, int) or conductores < 1:
+                errores[i] = 'Num_Conductores debe ser un entero positivo'
+                continue
+            for clave, valor in valores.items():
+                columnas[clave].append(valor)
+            columnas['Num_Conductores'].append(conductores)
+            columnas['indices'].append(i)
+    return columnas, errores
+
+
+def _linea(objeto):
+    return json.dumps(objeto, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+def iter_ndjson(circuitos, columnas, errores, tablas, rejilla, bloque, presupuesto):
+    """Genera las líneas NDJSON del lote, calculando por bloques de ``bloque`` circuitos."""
+    inicio = time.perf_counter()
+    indices = columnas['indices']
+    siguiente = 0  # próxima posición del lote a emitir
+
+    def id_equipo(i):
+        circuito = circuitos[i]
+        return circuito.get('ID_Equipo') if isinstance(circuito, dict) else None
+
+    def errores_hasta(limite):
+        nonlocal siguiente
+        lineas = []
+        while siguiente < limite:
+            lineas.append(_linea({'indice': siguiente, 'ID_Equipo': id_equipo(siguiente),
+                                  'Estado': 'Error', 'Error': errores[siguiente]}))
+            siguiente += 1
+        return ''.join(lineas)
+
+    for desde in range(0, len(indices), bloque):
+        if time.perf_counter() - inicio > presupuesto:
+            yield errores_hasta(indices[desde])
+            yield _linea({'truncado': True, 'procesados': siguiente,
+                          'pendientes': len(circuitos) - siguiente,
+                          'error': 'Presupuesto de tiempo agotado'})
+            return
+        hasta = min(desde + bloque, len(indices))
+        lote = size_circuits(*(columnas[c][desde:hasta] for c in COLUMNAS_ENTRADA),
+                             columnas['Num_Conductores'][desde:hasta], tablas=tablas, rejilla=rejilla)
+        lineas = []
+        for k, i in enumerate(indices[desde:hasta]):
+            lineas.append(errores_hasta(i))
+            caida = float(lote['Caida_Tension'][k])
+            lineas.append(_linea({
+                'indice': i,
+                'ID_Equipo': id_equipo(i),
+                'Calibre': lote['Calibre'][k],
+                'Caida_Tension': None if math.isnan(caida) else round(caida, 2),
+                'Canalizacion': lote['Canalizacion'][k],
+                'Estado': lote['Estado'][k],
+                'Error': lote['Error'][k],
+            }))
+            siguiente = i + 1
+        yield ''.join(lineas)
+    yield errores_hasta(len(circuitos))
+
+
+@calc_api_bp.route('/batch', methods=['POST'])
+def batch():
+    """Dimensiona un lote de circuitos y responde en NDJSON (una línea por circuito)."""
+    if not _autorizado():
+        abort(403)
+    if request.mimetype not in TIPOS_ACEPTADOS:
+        return jsonify({'error': f'Content-Type debe ser {" o ".join(TIPOS_ACEPTADOS)}'}), 415
+
+    maximo = current_app.config['CALC_API_MAX_BATCH']
+    maximo_bytes = current_app.config['CALC_API_MAX_BYTES']
+    error_bytes = {'error': f'El cuerpo supera el máximo de {maximo_bytes} bytes'}
+    if request.content_length is not None and request.content_length > maximo_bytes:
+        return jsonify(error_bytes), 413
+    leer = _leer_ndjson if request.mimetype == MIMETYPE_NDJSON else _leer_json
+    try:
+        circuitos = leer(maximo, maximo_bytes)
+    except CuerpoExcedido:
+        return jsonify(error_bytes), 413
+    except LoteExcedido:
+        return jsonify({'error': f'El lote supera el máximo de {maximo} circuitos'}), 413
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    columnas, errores = validate_circuits(circuitos)
+    # Todo el lote se calcula con la misma versión de las tablas normativas
+    tablas, rejilla = tablas_normativas(), derating_grid()
+    lineas = iter_ndjson(circuitos, columnas, errores, tablas, rejilla,
+                         current_app.config['CALC_API_CHUNK'],
+                         current_app.config['CALC_API_TIME_BUDGET'])
+    return Response(stream_with_context(lineas), mimetype=MIMETYPE_NDJSON,
+                    headers={'X-Version-Normativa': tablas.version, 'X-Accel-Buffering': 'no'})
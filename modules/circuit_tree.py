@@ -0,0 +1,262 @@
+# modules/circuit_tree.py
+"""Jerarquía de circuitos y caída de tensión acumulada.
+
+Los circuitos de un proyecto forman un árbol (tabla ``circuitos`` de
+main_data.db): alimentadores -> tableros -> ramales. El límite de caída de
+tensión se aplica a la caída acumulada desde la fuente, es decir, la suma de
+las caídas propias de todos los cables del camino hasta cada circuito.
+
+``CircuitTree.compute`` calcula la caída propia y la acumulada de todos los
+nodos en un solo recorrido en profundidad. Cuando cambia la longitud, el
+calibre o el padre de un cable, ``update_circuit`` carga solo su subárbol
+(CTE recursiva) y la acumulada del padre, y recalcula únicamente esos nodos.
+"""
+
+import math
+
+from modules.calculations import calculate_voltage_drop, estado_caida
+
+TIPOS_CIRCUITO = ('alimentador', 'tablero', 'ramal')
+CAMPOS_EDITABLES = ('longitud', 'calibre', 'corriente', 'voltaje', 'padre_id')
+CAMPOS_OBLIGATORIOS = ('tag', 'tipo', 'corriente', 'longitud', 'voltaje', 'calibre')
+
+COLUMNAS = 'id, padre_id, tag, tipo, corriente, longitud, voltaje, calibre, caida, caida_acumulada'
+
+SQL_CIRCUITOS_PROYECTO = f'SELECT {COLUMNAS} FROM circuitos WHERE proyecto_id = ?'
+
+# Nodo y todos sus descendientes (UNION descarta repetidos aunque haya un ciclo)
+SQL_SUBARBOL = f'''
+    WITH RECURSIVE subarbol(id) AS (
+        SELECT ?
+        UNION
+        SELECT c.id FROM circuitos c JOIN subarbol s ON c.padre_id = s.id
+    )
+    SELECT {COLUMNAS} FROM circuitos WHERE id IN subarbol
+'''
+
+SQL_GUARDAR = 'UPDATE circuitos SET caida = ?, caida_acumulada = ? WHERE id = ?'
+
+
+class Nodo:
+    __slots__ = ('id', 'padre_id', 'tag', 'tipo', 'corriente', 'longitud', 'voltaje',
+                 'calibre', 'caida', 'acumulada', 'hijos')
+
+    def __init__(self, fila):
+        (self.id, self.padre_id, self.tag, self.tipo, self.corriente, self.longitud,
+         self.voltaje, self.calibre, self.caida, self.acumulada) = tuple(fila)
+        self.hijos = []
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'padre_id': self.padre_id,
+            'tag': self.tag,
+            'tipo': self.tipo,
+            'corriente': self.corriente,
+            'longitud': self.longitud,
+            'voltaje': self.voltaje,
+            'calibre': self.calibre,
+            'caida': round(self.caida, 4) if self.caida is not None else None,
+            'caida_acumulada': round(self.acumulada, 4) if self.acumulada is not None else None,
+            'estado': estado_caida(self.acumulada) if self.acumulada is not None else None,
+        }
+
+
+class CircuitTree:
+    """Bosque de circuitos en memoria.
+
+    Los nodos cuyo padre no está entre las filas cargadas son raíces; su
+    caída acumulada parte de ``base[padre_id]`` (0 si es una fuente).
+    """
+
+    def __init__(self, filas, base=None):
+        self.nodos = {}
+        for fila in filas:
+            nodo = Nodo(fila)
+            self.nodos[nodo.id] = nodo
+        self.raices = []
+        for nodo in self.nodos.values():
+            padre = self.nodos.get(nodo.padre_id)
+            if padre is None:
+                self.raices.append(nodo)
+            else:
+                padre.hijos.append(nodo)
+        self.base = base or {}
+
+    def compute(self):
+        """Calcula la caída propia y acumulada de todos los nodos (un recorrido)."""
+        pila = [(raiz, self.base.get(raiz.padre_id, 0.0)) for raiz in self.raices]
+        visitados = 0
+        while pila:
+            nodo, acumulada_padre = pila.pop()
+            nodo.caida = calculate_voltage_drop(nodo.corriente, nodo.longitud,
+                                                nodo.calibre, nodo.voltaje)
+            nodo.acumulada = acumulada_padre + nodo.caida
+            pila.extend((hijo, nodo.acumulada) for hijo in nodo.hijos)
+            visitados += 1
+        if visitados != len(self.nodos):
+            raise ValueError('La jerarquía de circuitos tiene ciclos')
+        return self
+
+    def to_list(self):
+        """Nodos en orden de recorrido (padres antes que hijos)."""
+        orden, pila = [], list(reversed(self.raices))
+        while pila:
+            nodo = pila.pop()
+            orden.append(nodo.to_dict())
+            pila.extend(reversed(nodo.hijos))
+        return orden
+
+    def save(self, conn):
+        conn.executemany(SQL_GUARDAR, [(n.caida, n.acumulada, n.id) for n in self.nodos.values()])
+
+
+def load_project(conn, proyecto_id):
+    return CircuitTree(conn.execute(SQL_CIRCUITOS_PROYECTO, (proyecto_id,)).fetchall())
+
+
+def recompute_project(conn, proyecto_id):
+    """Recalcula y guarda la caída acumulada de todos los circuitos del proyecto."""
+    arbol = load_project(conn, proyecto_id).compute()
+    with conn:
+        arbol.save(conn)
+    return arbol
+
+
+def _acumulada_padre(conn, padre_id, proyecto_id):
+    if padre_id is None:
+        return 0.0
+    fila = conn.execute('SELECT caida_acumulada, proyecto_id FROM circuitos WHERE id = ?',
+                        (padre_id,)).fetchone()
+    if fila is None or fila[1] != proyecto_id:
+        raise ValueError(f'Circuito padre {padre_id} no existe en el proyecto')
+    if fila[0] is None:
+        raise ValueError(f'El circuito padre {padre_id} no tiene la caída calculada')
+    return fila[0]
+
+
+def _positivo(campo, valor):
+    if isinstance(valor, bool):
+        raise ValueError(f'{campo} debe ser un número mayor que cero')
+    try:
+        valor = float(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f'{campo} debe ser un número mayor que cero') from None
+    if not math.isfinite(valor) or valor <= 0:
+        raise ValueError(f'{campo} debe ser un número mayor que cero')
+    return valor
+
+
+def _identificador(campo, valor):
+    if valor is None:
+        return None
+    if isinstance(valor, bool) or isinstance(valor, float) and not valor.is_integer():
+        raise ValueError(f'{campo} debe ser un entero')
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f'{campo} debe ser un entero') from None
+
+
+def _texto(campo, valor):
+    if not isinstance(valor, str) or not valor.strip():
+        raise ValueError(f'{campo} debe ser un texto no vacío')
+    return valor.strip()
+
+
+def _tipo(campo, valor):
+    if valor not in TIPOS_CIRCUITO:
+        raise ValueError(f'Tipo de circuito {valor} no soportado')
+    return valor
+
+
+CONVERSIONES = {
+    'tag': _texto,
+    'tipo': _tipo,
+    'corriente': _positivo,
+    'longitud': _positivo,
+    'voltaje': _positivo,
+    'calibre': _texto,
+    'padre_id': _identificador,
+    'equipo_id': _identificador,
+}
+
+
+def parse_fields(datos, permitidos, obligatorios=()):
+    """Valida y convierte los campos de un circuito recibidos como JSON.
+
+    Args:
+        datos: Objeto JSON de la petición.
+        permitidos: Campos aceptados; cualquier otro es un error.
+        obligatorios: Campos que deben estar presentes.
+
+    Returns:
+        dict: Campos con su tipo (números como float, IDs como int).
+
+    Raises:
+        ValueError: Si ``datos`` no es un objeto, hay campos no permitidos o
+            faltantes, o algún valor no tiene el tipo esperado.
+    """
+    if not isinstance(datos, dict):
+        raise ValueError('Se esperaba un objeto JSON')
+    invalidos = [c for c in datos if c not in permitidos]
+    if invalidos:
+        raise ValueError(f'Campos no editables: {", ".join(invalidos)}')
+    faltantes = [c for c in obligatorios if c not in datos]
+    if faltantes:
+        raise ValueError(f'Faltan campos: {", ".join(faltantes)}')
+    return {campo: CONVERSIONES[campo](campo, valor) for campo, valor in datos.items()}
+
+
+def update_circuit(conn, circuito_id, **cambios):
+    """Modifica un circuito y recalcula solo su subárbol.
+
+    ``cambios`` admite las claves de ``CAMPOS_EDITABLES``. Devuelve el
+    subárbol recalculado (lista de diccionarios).
+
+    Raises:
+        ValueError: Campo no editable, circuito inexistente, padre dentro del
+            propio subárbol o calibre fuera de tabla.
+    """
+    invalidos = [c for c in cambios if c not in CAMPOS_EDITABLES]
+    if invalidos:
+        raise ValueError(f'Campos no editables: {", ".join(invalidos)}')
+
+    with conn:
+        if cambios:
+            asignaciones = ', '.join(f'{campo} = ?' for campo in cambios)
+            actualizados = conn.execute(f'UPDATE circuitos SET {asignaciones} WHERE id = ?',
+                                        (*cambios.values(), circuito_id)).rowcount
+            if not actualizados:
+                raise ValueError(f'Circuito {circuito_id} no existe')
+
+        filas = conn.execute(SQL_SUBARBOL, (circuito_id,)).fetchall()
+        if not filas:
+            raise ValueError(f'Circuito {circuito_id} no existe')
+        raiz = next(f for f in filas if f[0] == circuito_id)
+        if any(f[0] == raiz[1] for f in filas):
+            raise ValueError('Un circuito no puede colgar de su propio subárbol')
+
+        proyecto_id = conn.execute('SELECT proyecto_id FROM circuitos WHERE id = ?',
+                                   (circuito_id,)).fetchone()[0]
+        base = {raiz[1]: _acumulada_padre(conn, raiz[1], proyecto_id)}
+        arbol = CircuitTree(filas, base).compute()
+        arbol.save(conn)
+    return arbol.to_list()
+
+
+def add_circuit(conn, proyecto_id, tag, tipo, corriente, longitud, voltaje, calibre,
+                padre_id=None, equipo_id=None):
+    """Crea un circuito, calcula su caída acumulada y devuelve su ID."""
+    if tipo not in TIPOS_CIRCUITO:
+        raise ValueError(f'Tipo de circuito {tipo} no soportado')
+    with conn:
+        circuito_id = conn.execute(
+            'INSERT INTO circuitos (proyecto_id, padre_id, equipo_id, tipo, tag, corriente, '
+            'longitud, voltaje, calibre) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (proyecto_id, padre_id, equipo_id, tipo, tag, corriente, longitud, voltaje, calibre)
+        ).lastrowid
+        base = {padre_id: _acumulada_padre(conn, padre_id, proyecto_id)}
+        fila = conn.execute(f'SELECT {COLUMNAS} FROM circuitos WHERE id = ?', (circuito_id,)).fetchone()
+        CircuitTree([fila], base).compute().save(conn)
+    return circuito_id
@@ -0,0 +1,137 @@
+# modules/db.py
+"""Registro de bases de datos y conexiones SQLite reutilizables.
+
+Todas las bases de la aplicación se registran con un nombre corto
+(``users``, ``plants``, ``main``...). ``get_db(nombre)`` abre la conexión
+solo la primera vez que una petición la usa y la conserva para el mismo
+hilo, de modo que las peticiones siguientes atendidas por ese hilo la
+reutilizan en lugar de volver a conectar. Cada conexión nueva queda
+configurada con WAL, ``synchronous=NORMAL``, ``busy_timeout`` y una caché de
+sentencias preparadas.
+"""
+
+import sqlite3
+import threading
+
+from flask import g
+
+BUSY_TIMEOUT_MS = 5000
+CACHED_STATEMENTS = 256
+
+
+class ConnectionRegistry:
+    """Rutas de las bases registradas y conexiones abiertas por hilo."""
+
+    def __init__(self):
+        self._rutas = {}
+        self._adjuntas = {}
+        # Clase de las conexiones nuevas (modules.metrics instala una que mide consultas)
+        self.factory = sqlite3.Connection
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.abiertas = 0
+        self.reutilizadas = 0
+
+    def register(self, nombre, ruta, adjuntas=None):
+        """Registra (o actualiza) la ruta de una base de datos.
+
+        ``adjuntas`` es un diccionario {esquema: ruta} de bases que se
+        adjuntan con ATTACH a cada conexión, para consultarlas en un JOIN.
+        """
+        self._rutas[nombre] = ruta
+        self._adjuntas[nombre] = dict(adjuntas or {})
+
+    def path(self, nombre):
+        return self._rutas[nombre]
+
+    def _conexiones(self):
+        conexiones = getattr(self._local, 'conexiones', None)
+        if conexiones is None:
+            conexiones = self._local.conexiones = {}
+        return conexiones
+
+    def _abrir(self, ruta, adjuntas):
+        conn = sqlite3.connect(ruta, timeout=BUSY_TIMEOUT_MS / 1000,
+                               cached_statements=CACHED_STATEMENTS, factory=self.factory)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+        for esquema, ruta_adjunta in adjuntas.items():
+            conn.execute(f'ATTACH DATABASE ? AS {esquema}', (ruta_adjunta,))
+        for esquema in ['main', *adjuntas]:
+            conn.execute(f'PRAGMA {esquema}.journal_mode=WAL')
+            conn.execute(f'PRAGMA {esquema}.synchronous=NORMAL')
+        return conn
+
+    def connect(self, nombre):
+        """Devuelve la conexión del hilo actual a ``nombre``, abriéndola si hace falta."""
+        ruta = self._rutas[nombre]
+        conexiones = self._conexiones()
+        actual = conexiones.get(nombre)
+        if actual is not None and actual[0] == ruta:
+            with self._lock:
+                self.reutilizadas += 1
+            return actual[1]
+        if actual is not None:
+            actual[1].close()
+        conn = self._abrir(ruta, self._adjuntas[nombre])
+        conexiones[nombre] = (ruta, conn)
+        with self._lock:
+            self.abiertas += 1
+        return conn
+
+    def close_thread(self):
+        """Cierra las conexiones del hilo actual."""
+        conexiones = self._conexiones()
+        for _, conn in conexiones.values():
+            conn.close()
+        conexiones.clear()
+
+    def stats(self):
+        """Contadores de conexiones abiertas y reutilizadas."""
+        return {
+            'bases': sorted(self._rutas),
+            'abiertas': self.abiertas,
+            'reutilizadas': self.reutilizadas,
+        }
+
+
+registry = ConnectionRegistry()
+
+
+def get_db(nombre):
+    """Conexión a la base ``nombre`` para la petición actual."""
+    usadas = g.setdefault('_dbs_usadas', {})
+    conn = usadas.get(nombre)
+    if conn is None:
+        conn = usadas[nombre] = registry.connect(nombre)
+    return conn
+
+
+def _liberar(exception):
+    """Deshace cualquier transacción que la petición haya dejado abierta.
+
+    La conexión no se cierra: queda disponible para la siguiente petición
+    atendida por el mismo hilo.
+    """
+    usadas = g.pop('_dbs_usadas', None)
+    if not usadas:
+        return
+    for conn in usadas.values():
+        if conn.in_transaction:
+            conn.rollback()
+
+
+def init_app(app):
+    """Registra las bases configuradas y la limpieza al final de cada petición."""
+    for nombre, clave in (('users', 'USER_DB'), ('plants', 'PLANTS_DB'), ('main', 'MAIN_DB'),
+                          ('calc', 'CALC_DB'), ('norm', 'NORM_DB')):
+        if app.config.get(clave):
+            registry.register(nombre, app.config[clave])
+
+    # Conexión única con las bases adjuntas, para la capa de repositorio
+    adjuntas = {'plantas': app.config['PLANTS_DB'], 'usuarios': app.config['USER_DB']}
+    for esquema, clave in (('norma', 'NORM_DB'), ('norma_ext', 'NORMATIVE_DATA_DB')):
+        if app.config.get(clave):
+            adjuntas[esquema] = app.config[clave]
+    registry.register('datos', app.config['MAIN_DB'], adjuntas)
+    app.teardown_appcontext(_liberar)
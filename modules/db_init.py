@@ -3,6 +3,8 @@ import sqlite3
 import bcrypt
 from flask import current_app
 
+from modules.migrations import sello_normativo
+
 def init_db(db_path, schema_path):
     """Inicializa una base de datos usando un archivo de esquema SQL."""
     conn = sqlite3.connect(db_path)
@@ -158,7 +160,32 @@ def init_normative_db(db_path):
     if cursor.fetchone()[0] == 0:
         cursor.executemany("INSERT INTO reactancia_resistencia_cables (calibre, resistencia, reactancia) VALUES (?, ?, ?)", res_react)
 
+    # Contador de cambios con el que se valida la instantánea normativa
+    sello_normativo(conn)
+
     conn.commit()
     conn.close()
     print("Base de datos normativa inicializada con éxito.")
 
+
+def init_jobs_db(db_path):
+    """Crea la base de datos de trabajos de reportes en segundo plano."""
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        tipo TEXT NOT NULL,
+        proyecto_id INTEGER,
+        usuario_id INTEGER,
+        estado TEXT NOT NULL CHECK(estado IN ('en_cola', 'ejecutando', 'terminado', 'error')),
+        progreso REAL NOT NULL DEFAULT 0,
+        payload TEXT NOT NULL,
+        archivo TEXT,
+        error TEXT,
+        creado REAL NOT NULL,
+        actualizado REAL NOT NULL,
+        propietario INTEGER
+    )''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_estado ON jobs (estado, actualizado)')
+    conn.commit()
+    conn.close()
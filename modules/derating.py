@@ -0,0 +1,409 @@
+# modules/derating.py
+"""Rejilla precalculada de ampacidad corregida.
+
+La ampacidad corregida de un conductor es la ampacidad base (por material y
+temperatura del aislante) por el factor de temperatura ambiente y el de
+agrupamiento (número de conductores portadores de corriente). En lugar de
+buscar y multiplicar en cada consulta, ``RejillaDerating`` guarda todas las
+combinaciones en un arreglo denso::
+
+    ampacidad[material, aislante, temperatura, conductores, posicion]
+
+- ``temperatura`` es la temperatura ambiente en grados enteros desde la
+  primera de la tabla (un valor con decimales se redondea hacia arriba, el
+  lado conservador).
+- ``conductores`` va de 1 al mayor número de la tabla de agrupamiento; más
+  conductores usan el factor de la última fila.
+- ``posicion`` es el calibre en orden de ampacidad base de cada par
+  (material, aislante), así cada fila queda ordenada para elegir calibre.
+
+Consultar una ampacidad es indexar el arreglo. Las tablas salen de
+``normative_data.db`` (``NORMATIVE_DATA_DB``); si están vacías, no existen o
+no tienen el material y aislante por defecto (``DERATING_MATERIAL``,
+``DERATING_TEMPERATURA_AISLANTE``) se usan las de ``NORM_DB`` (un solo
+material y aislante) con los factores de agrupamiento NEC 310.15(C)(1). Las
+consultas sin material ni aislante usan los de por defecto, y los calibres de
+las tablas extendidas ('12', '1/0 AWG') se normalizan a los nombres de
+``NORM_DB`` ('12 AWG', '1/0') con los que se buscan impedancias y áreas. La
+rejilla se reconstruye solo cuando cambia alguna de las dos bases.
+
+A diferencia de la búsqueda por rangos de ``NORM_DB``, donde una temperatura
+con decimales entre dos rangos (30.5 °C entre 26-30 y 31-35) quedaba fuera de
+tabla, aquí se redondea hacia arriba y toma el factor del grado siguiente.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+
+import numpy as np
+
+from modules.normative_cache import get_normative_cache
+
+# NEC 310.15(C)(1): hasta N conductores portadores -> factor
+FACTORES_AGRUPAMIENTO_NEC = ((3, 1.0), (6, 0.8), (9, 0.7), (20, 0.5), (30, 0.45), (40, 0.4), (41, 0.35))
+
+_CALIBRE_AWG = re.compile(r'^(\d+(?:/0)?)(?:\s*AWG)?$', re.IGNORECASE)
+
+
+def normalizar_calibre(calibre):
+    """Nombre de ``calibre`` como en ``NORM_DB``: '12' -> '12 AWG', '1/0 AWG' -> '1/0'.
+
+    Los nombres que no son AWG (p. ej. '250 kcmil') se devuelven sin cambios.
+    """
+    texto = str(calibre).strip()
+    coincidencia = _CALIBRE_AWG.match(texto)
+    if coincidencia is None:
+        return texto
+    numero = coincidencia.group(1)
+    return numero if '/' in numero else f'{numero} AWG'
+
+
+class RejillaDerating:
+    """Ampacidad corregida precalculada para todas las combinaciones."""
+
+    def __init__(self, ampacidades, temperaturas, agrupamiento, material=None, aislante=None):
+        """
+        Args:
+            ampacidades: Filas ``(calibre, material, temperatura_aislante, ampacidad)``.
+            temperaturas: ``[(temperatura_entera, factor), ...]`` contiguas y
+                ordenadas; ``None`` como factor si la temperatura no tiene.
+            agrupamiento: ``[(hasta_conductores, factor), ...]`` ordenadas.
+            material, aislante: Par usado en las consultas que no indican uno.
+        """
+        self.material = material
+        self.aislante = aislante
+        # Huella de las tablas de origen y del par por defecto: cambia si cambia
+        # cualquier ampacidad corregida o el calibre que se elige sin indicar par
+        origen = json.dumps([ampacidades, temperaturas, agrupamiento, material, aislante], default=float)
+        self.version = hashlib.sha256(origen.encode('utf-8')).hexdigest()[:16]
+
+        self.materiales = sorted({fila[1] for fila in ampacidades}, key=str)
+        self.aislantes = sorted({fila[2] for fila in ampacidades}, key=str)
+        indice_material = {m: i for i, m in enumerate(self.materiales)}
+        indice_aislante = {a: i for i, a in enumerate(self.aislantes)}
+
+        por_par = {}
+        for calibre, material, aislante, ampacidad in ampacidades:
+            por_par.setdefault((material, aislante), []).append((ampacidad, calibre))
+        n_posiciones = max((len(filas) for filas in por_par.values()), default=0)
+
+        forma_base = (len(self.materiales), len(self.aislantes), n_posiciones)
+        base = np.full(forma_base, np.nan)
+        self.calibres = np.full(forma_base[:2] + (n_posiciones + 1,), None, dtype=object)
+        self._posicion = {}
+        for (material, aislante), filas in por_par.items():
+            m, a = indice_material[material], indice_aislante[aislante]
+            for p, (ampacidad, calibre) in enumerate(sorted(filas, key=lambda f: f[0])):
+                base[m, a, p] = ampacidad
+                self.calibres[m, a, p] = calibre
+                self._posicion[material, aislante, calibre] = p
+        self._indice_material = indice_material
+        self._indice_aislante = indice_aislante
+
+        self.temp_inicial = temperaturas[0][0] if temperaturas else 0
+        factores_temp = np.array([np.nan if f is None else f for _, f in temperaturas], dtype=float)
+
+        self.max_conductores = agrupamiento[-1][0] if agrupamiento else 1
+        factores_grupo = np.ones(self.max_conductores)
+        desde = 1
+        for hasta, factor in agrupamiento:
+            factores_grupo[desde - 1:hasta] = factor
+            desde = hasta + 1
+
+        # Producto exterior: (material, aislante, temperatura, conductores, posición)
+        self.ampacidad = (base[:, :, None, None, :]
+                          * factores_temp[None, None, :, None, None]
+                          * factores_grupo[None, None, None, :, None])
+        # Copia para búsquedas: NaN como infinito mantiene cada fila ordenada
+        self._busqueda = np.where(np.isnan(self.ampacidad), np.inf, self.ampacidad)
+        self._mapa = None
+
+    @classmethod
+    def from_arrays(cls, version, materiales, aislantes, calibres, temp_inicial, max_conductores,
+                    ampacidad, busqueda, material=None, aislante=None, mapa=None):
+        """Rejilla a partir de arreglos ya calculados (p. ej. vistas de un mmap).
+
+        ``calibres`` es la lista anidada ``[material][aislante][posición]``
+        (``None`` donde el par no tiene calibre) y ``busqueda`` la copia de
+        ``ampacidad`` con NaN como infinito. ``mapa`` es el objeto que
+        respalda los arreglos; se conserva mientras viva la rejilla.
+        """
+        rejilla = cls.__new__(cls)
+        rejilla.version = version
+        rejilla.material = material
+        rejilla.aislante = aislante
+        rejilla.materiales = list(materiales)
+        rejilla.aislantes = list(aislantes)
+        rejilla._indice_material = {m: i for i, m in enumerate(rejilla.materiales)}
+        rejilla._indice_aislante = {a: i for i, a in enumerate(rejilla.aislantes)}
+        n_posiciones = ampacidad.shape[4]
+        rejilla.calibres = np.full((len(rejilla.materiales), len(rejilla.aislantes), n_posiciones + 1),
+                                   None, dtype=object)
+        rejilla._posicion = {}
+        for m, material_fila in enumerate(rejilla.materiales):
+            for a, aislante_fila in enumerate(rejilla.aislantes):
+                for p, calibre in enumerate(calibres[m][a]):
+                    rejilla.calibres[m, a, p] = calibre
+                    if calibre is not None:
+                        rejilla._posicion[material_fila, aislante_fila, calibre] = p
+        rejilla.temp_inicial = temp_inicial
+        rejilla.max_conductores = max_conductores
+        rejilla.ampacidad = ampacidad
+        rejilla._busqueda = busqueda
+        rejilla._mapa = mapa
+        return rejilla
+
+    @property
+    def forma(self):
+        return self.ampacidad.shape
+
+    def _par(self, material, aislante):
+        """``(material, aislante)`` con los de por defecto donde falten."""
+        return (self.material if material is None else material,
+                self.aislante if aislante is None else aislante)
+
+    def _indices(self, material, aislante, temperatura, conductores):
+        material, aislante = self._par(material, aislante)
+        try:
+            m = self._indice_material[material]
+            a = self._indice_aislante[aislante]
+        except KeyError:
+            raise ValueError(f'Sin ampacidades para {material} / {aislante}') from None
+        if temperatura != temperatura or not 0 <= math.ceil(temperatura) - self.temp_inicial < self.ampacidad.shape[2]:
+            raise ValueError(f'Temperatura {temperatura}°C fuera de rango')
+        t = math.ceil(temperatura) - self.temp_inicial
+        if conductores < 1:
+            raise ValueError('Se requiere al menos un conductor')
+        return m, a, t, min(int(conductores), self.max_conductores) - 1
+
+    def ampacity(self, calibre, temperatura, conductores=3, material=None, aislante=None):
+        """Ampacidad corregida de ``calibre`` (indexación directa)."""
+        m, a, t, n = self._indices(material, aislante, temperatura, conductores)
+        p = self._posicion.get(self._par(material, aislante) + (calibre,))
+        if p is None:
+            raise ValueError(f'Calibre {calibre} no encontrado en tabla')
+        valor = self.ampacidad[m, a, t, n, p]
+        if math.isnan(valor):
+            raise ValueError(f'Temperatura {temperatura}°C fuera de rango')
+        return float(valor)
+
+    def select_calibre(self, corriente, temperatura, conductores=3, material=None, aislante=None):
+        """Menor calibre cuya ampacidad corregida es >= ``corriente``."""
+        m, a, t, n = self._indices(material, aislante, temperatura, conductores)
+        if np.isnan(self.ampacidad[m, a, t, n, 0]):
+            raise ValueError(f'Temperatura {temperatura}°C fuera de rango')
+        if corriente != corriente:
+            raise ValueError(f'Corriente {corriente}A excede límites de tabla')
+        p = int(np.searchsorted(self._busqueda[m, a, t, n], corriente, side='left'))
+        calibre = self.calibres[m, a, p]
+        if calibre is None:
+            raise ValueError(f'Corriente {corriente}A excede límites de tabla')
+        return calibre
+
+    def _indices_many(self, temperaturas, conductores, material, aislante):
+        """Índices vectorizados y máscara de temperaturas con factor en la tabla."""
+        material, aislante = self._par(material, aislante)
+        m = self._indice_material.get(material)
+        a = self._indice_aislante.get(aislante)
+        if m is None or a is None or 0 in self.ampacidad.shape:
+            return None
+        t = np.ceil(temperaturas) - self.temp_inicial
+        en_rango = ~np.isnan(t) & (t >= 0) & (t < self.ampacidad.shape[2])
+        t = np.where(en_rango, t, 0).astype(int)
+        n = (np.clip(np.nan_to_num(conductores, nan=1), 1, self.max_conductores) - 1).astype(int)
+        en_rango &= ~np.isnan(self.ampacidad[m, a, t, n, 0])
+        return m, a, t, n, en_rango
+
+    def temperatures_in_range(self, temperaturas, material=None, aislante=None):
+        """Máscara de las temperaturas con factor de corrección en la tabla."""
+        temperaturas = np.asarray(temperaturas, dtype=float)
+        indices = self._indices_many(temperaturas, np.ones(temperaturas.shape), material, aislante)
+        if indices is None:
+            return np.zeros(temperaturas.shape, dtype=bool)
+        return indices[4]
+
+    def select_many(self, corrientes, temperaturas, conductores=3, material=None, aislante=None):
+        """``select_calibre`` vectorizado para un par (material, aislante).
+
+        Returns:
+            numpy.ndarray: Calibres (``None`` donde la temperatura, la
+            corriente o el número de conductores quedan fuera de tabla).
+        """
+        corrientes, temperaturas, conductores = np.broadcast_arrays(
+            np.asarray(corrientes, dtype=float),
+            np.asarray(temperaturas, dtype=float),
+            np.asarray(conductores, dtype=float),
+        )
+        indices = self._indices_many(temperaturas, conductores, material, aislante)
+        if indices is None:
+            return np.full(corrientes.shape, None, dtype=object)
+        m, a, t, n, validos = indices
+        validos = validos & (conductores >= 1) & ~np.isnan(corrientes)
+        # Filas ordenadas: la posición es el número de ampacidades menores que la corriente
+        p = (self._busqueda[m, a, t, n] < corrientes[..., None]).sum(axis=-1)
+        p = np.where(validos, p, self.ampacidad.shape[4])
+        return self.calibres[m, a, p]
+
+
+def _tablas_extendidas(db_path):
+    """Filas de normative_data.db o ``None`` si no existe o está vacía."""
+    if not db_path or not os.path.exists(db_path):
+        return None
+    conn = sqlite3.connect(db_path)
+    try:
+        ampacidades = conn.execute(
+            'SELECT calibre_awg, material, temperatura_aislante, ampacidad FROM ampacidad_cables'
+        ).fetchall()
+        temperaturas = conn.execute(
+            'SELECT temperatura_ambiente, factor FROM factores_correccion_temp ORDER BY temperatura_ambiente'
+        ).fetchall()
+        agrupamiento = conn.execute(
+            'SELECT numero_conductores, factor FROM factores_correccion_agrupamiento ORDER BY numero_conductores'
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+    if not ampacidades or not temperaturas:
+        return None
+    ampacidades = [(normalizar_calibre(calibre), material, aislante, ampacidad)
+                   for calibre, material, aislante, ampacidad in ampacidades]
+
+    # Cada fila vale hasta su temperatura: se expande a grados enteros
+    desde = math.floor(temperaturas[0][0])
+    por_grado = []
+    i = 0
+    for grado in range(desde, math.ceil(temperaturas[-1][0]) + 1):
+        while temperaturas[i][0] < grado:
+            i += 1
+        por_grado.append((grado, temperaturas[i][1]))
+    return ampacidades, por_grado, agrupamiento or list(FACTORES_AGRUPAMIENTO_NEC)
+
+
+def _filas_basicas(tablas):
+    """Filas equivalentes a partir de unas ``TablasNormativas``."""
+    ampacidades = [(calibre, None, None, ampacidad)
+                   for calibre, ampacidad in zip(tablas.calibres, tablas.ampacidades)]
+    limites = tablas.limites_temp
+    if not len(limites):
+        return ampacidades, [], list(FACTORES_AGRUPAMIENTO_NEC)
+    temperaturas = [(grado, tablas.factor_temperatura(grado))
+                    for grado in range(math.floor(limites[0]), math.ceil(limites[-1]) + 1)]
+    return ampacidades, temperaturas, list(FACTORES_AGRUPAMIENTO_NEC)
+
+
+def grid_from_tables(tablas):
+    """Rejilla de un solo material y aislante a partir de unas ``TablasNormativas``."""
+    return RejillaDerating(*_filas_basicas(tablas))
+
+
+def sello_extendido(normative_data_db):
+    """Tamaño y fecha de modificación de normative_data.db (``None`` si no existe).
+
+    Esa base solo guarda tablas normativas, así que cualquier escritura la
+    cambia; es el sello con el que se valida la rejilla de una instantánea.
+    """
+    if not normative_data_db or not os.path.exists(normative_data_db):
+        return None
+    st = os.stat(normative_data_db)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def build_grid(norm_db, normative_data_db=None, material=None, aislante=None, tablas=None):
+    """Construye la rejilla desde normative_data.db o, si está vacía, desde ``NORM_DB``.
+
+    ``material`` y ``aislante`` son el par por defecto de las tablas
+    extendidas; si esas tablas no lo tienen también se usa ``NORM_DB`` (o
+    las ``tablas`` indicadas).
+    """
+    filas = _tablas_extendidas(normative_data_db)
+    if filas is not None and not any(fila[1] == material and fila[2] == aislante for fila in filas[0]):
+        logging.warning('normative_data.db no tiene ampacidades para %s / %s, se usa NORM_DB',
+                        material, aislante)
+        filas = None
+    if filas is None:
+        return grid_from_tables(tablas or get_normative_cache(norm_db).tablas())
+    return RejillaDerating(*filas, material=material, aislante=aislante)
+
+
+class DeratingCache:
+    """Rejilla del proceso; se reconstruye si cambia alguna base de origen.
+
+    Los cambios en ``NORM_DB`` se detectan con la versión (hash de contenido)
+    de sus tablas normativas, así escribir otras tablas de esa base (p. ej.
+    resultados) no reconstruye la rejilla. Los de normative_data.db, con el
+    archivo y ``PRAGMA data_version`` de una conexión de vigilancia, como en
+    ``modules.normative_cache``. Si las tablas vienen de una instantánea
+    binaria cuya rejilla se compiló con el mismo normative_data.db y el mismo
+    par por defecto, se usa esa rejilla (vistas del mmap) sin reconstruirla.
+    """
+
+    def __init__(self, norm_db, normative_data_db=None, material=None, aislante=None, snapshot=None):
+        self.norm_db = norm_db
+        self.normative_data_db = normative_data_db
+        self.material = material
+        self.aislante = aislante
+        self.snapshot = snapshot
+        self._lock = threading.Lock()
+        self._conn = None
+        self._archivo = None
+        self._firma = None
+        self._rejilla = None
+        self.reconstrucciones = 0
+
+    def _firma_extendida(self):
+        ruta = self.normative_data_db
+        if not ruta or not os.path.exists(ruta):
+            return None
+        st = os.stat(ruta)
+        archivo = (st.st_ino, st.st_size, st.st_mtime_ns)
+        if archivo != self._archivo and self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        if self._conn is None:
+            self._conn = sqlite3.connect(ruta, check_same_thread=False)
+            self._archivo = archivo
+        return archivo, self._conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def _desde_snapshot(self, tablas):
+        """Rejilla precompilada de ``tablas`` si corresponde a esta configuración."""
+        origen = [sello_extendido(self.normative_data_db), self.material, self.aislante]
+        if tablas.rejilla is not None and tablas.origen_rejilla == origen:
+            return tablas.rejilla
+        return None
+
+    def grid(self):
+        """Devuelve la rejilla vigente."""
+        with self._lock:
+            tablas = get_normative_cache(self.norm_db, self.snapshot).tablas()
+            firma = tablas.version, self._firma_extendida()
+            if self._rejilla is None or firma != self._firma:
+                self._rejilla = self._desde_snapshot(tablas) or build_grid(
+                    self.norm_db, self.normative_data_db, self.material, self.aislante, tablas)
+                self._firma = firma
+                self.reconstrucciones += 1
+            return self._rejilla
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_derating_grid(config):
+    """Rejilla vigente para las bases de ``config`` (``NORM_DB``, ``NORMATIVE_DATA_DB``)
+    con el material y aislante por defecto de ``DERATING_MATERIAL`` y
+    ``DERATING_TEMPERATURA_AISLANTE`` y la instantánea ``NORM_SNAPSHOT``."""
+    clave = (config['NORM_DB'], config.get('NORMATIVE_DATA_DB'),
+             config.get('DERATING_MATERIAL'), config.get('DERATING_TEMPERATURA_AISLANTE'),
+             config.get('NORM_SNAPSHOT'))
+    with _caches_lock:
+        cache = _caches.get(clave)
+        if cache is None:
+            cache = _caches[clave] = DeratingCache(*clave)
+    return cache.grid()
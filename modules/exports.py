@@ -1,78 +1,143 @@
+# modules/exports.py
+"""Exportación CSV compatible con Revit/Eplan.
+
+``iter_revit_csv`` recorre los resultados (una lista o un generador, p. ej.
+``results_store.iter_results`` sobre el cursor de la base) y produce el CSV
+en bloques de bytes, opcionalmente comprimidos con gzip, sin acumular el
+archivo en memoria. Los destinos consumen esos bloques:
+
+- ``export_for_revit``: archivo en ``reports/`` (caché de reportes y trabajos).
+- ``write_revit_csv``: cualquier archivo binario abierto.
+- La ruta ``/projects/<id>/export/revit.csv`` los envía como respuesta HTTP
+  fragmentada.
+"""
+
 import csv
-from datetime import datetime
-import os
+import io
+import zlib
+
+from modules.calculations import estado_caida
+from modules.report_cache import cached_report, new_report_file
+
+# Versión de la plantilla CSV; cambiarla invalida las exportaciones en caché
+VERSION_PLANTILLA_REVIT = 1
+
+# Bytes de CSV que se acumulan antes de entregar un bloque
+TAMANO_BLOQUE = 64 * 1024
+
+# Encabezados para Revit
+ENCABEZADOS_REVIT = [
+    'ID_Equipo',
+    'Descripcion',
+    'Corriente_A',
+    'Calibre_AWG',
+    'Caida_Tension_Pct',
+    'Canalizacion_in',
+    'Estado',
+    'Familia_Revit',
+    'Tipo_Revit'
+]
+
+# Mapeo de calibres a familias Revit
+FAMILIA_POR_CALIBRE = {
+    '14 AWG': 'Cable_THHN_14',
+    '12 AWG': 'Cable_THHN_12',
+    '10 AWG': 'Cable_THHN_10',
+    '8 AWG': 'Cable_THHN_8',
+    '6 AWG': 'Cable_THHN_6',
+    '4 AWG': 'Cable_THHN_4',
+    '2 AWG': 'Cable_THHN_2',
+    '1/0': 'Cable_THHN_1/0',
+    '2/0': 'Cable_THHN_2/0',
+    '3/0': 'Cable_THHN_3/0',
+    '4/0': 'Cable_THHN_4/0'
+}
+
+# Mapeo de canalizaciones a familias Revit
+FAMILIA_CANALIZACION = {
+    '1"': 'Conduit_EMT_1',
+    '1-1/4"': 'Conduit_EMT_1-1/4',
+    '1-1/2"': 'Conduit_EMT_1-1/2',
+    '2"': 'Conduit_EMT_2',
+    '2-1/2"': 'Conduit_EMT_2-1/2',
+    '3"': 'Conduit_EMT_3',
+    '4"': 'Conduit_EMT_4'
+}
+
+
+def revit_row(r):
+    """Fila CSV (en el orden de ``ENCABEZADOS_REVIT``) de un resultado."""
+    # Determinar familia y tipo Revit para el cable y la canalización
+    familia_cable = FAMILIA_POR_CALIBRE.get(r['Calibre'], 'Cable_THHN_Generico')
+    familia_conduit = FAMILIA_CANALIZACION.get(r['Canalizacion'], 'Conduit_EMT_Generico')
+
+    return (
+        r['ID_Equipo'],
+        r['Descripcion'],
+        f"{r['Corriente']:.2f}",
+        r['Calibre'],
+        f"{r['Caida_Tension']:.2f}",
+        r['Canalizacion'],
+        estado_caida(r['Caida_Tension']),
+        f"{familia_cable}|{familia_conduit}",
+        'THHN|EMT',
+    )
 
+
+def iter_revit_csv(resultados, comprimir=False, tamano_bloque=TAMANO_BLOQUE):
+    """Genera el CSV de Revit en bloques de bytes.
+
+    El encabezado se entrega de inmediato; después, un bloque cada
+    ``tamano_bloque`` bytes de filas. Con ``comprimir`` los bloques forman un
+    único flujo gzip.
+    """
+    compresor = zlib.compressobj(wbits=31) if comprimir else None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def vaciar():
+        datos = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return compresor.compress(datos) if compresor else datos
+
+    writer.writerow(ENCABEZADOS_REVIT)
+    if compresor is None:
+        yield vaciar()
+    else:
+        # Forzar la salida del encabezado: el primer byte llega sin esperar filas
+        yield vaciar() + compresor.flush(zlib.Z_SYNC_FLUSH)
+
+    for r in resultados:
+        writer.writerow(revit_row(r))
+        if buffer.tell() >= tamano_bloque:
+            bloque = vaciar()
+            if bloque:
+                yield bloque
+
+    bloque = vaciar()
+    if compresor is not None:
+        bloque += compresor.flush()
+    if bloque:
+        yield bloque
+
+
+def write_revit_csv(resultados, archivo, comprimir=False):
+    """Escribe el CSV de Revit en ``archivo`` (binario, ya abierto). Devuelve los bytes escritos."""
+    escritos = 0
+    for bloque in iter_revit_csv(resultados, comprimir):
+        archivo.write(bloque)
+        escritos += len(bloque)
+    return escritos
+
+
+@cached_report('revit', '_revit.csv', VERSION_PLANTILLA_REVIT)
 def export_for_revit(resultados, proyecto_id):
     """Exporta los resultados a un archivo CSV compatible con Revit/Eplan."""
-    # Crear directorio reports si no existe
-    if not os.path.exists('reports'):
-        os.makedirs('reports')
-    
-    # Nombre del archivo
-    filename = f'reports/proyecto_{proyecto_id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}_revit.csv'
-    
-    # Encabezados para Revit
-    headers = [
-        'ID_Equipo',
-        'Descripcion',
-        'Corriente_A',
-        'Calibre_AWG',
-        'Caida_Tension_Pct',
-        'Canalizacion_in',
-        'Estado',
-        'Familia_Revit',
-        'Tipo_Revit'
-    ]
-    
-    # Mapeo de calibres a familias Revit
-    familia_por_calibre = {
-        '14 AWG': 'Cable_THHN_14',
-        '12 AWG': 'Cable_THHN_12',
-        '10 AWG': 'Cable_THHN_10',
-        '8 AWG': 'Cable_THHN_8',
-        '6 AWG': 'Cable_THHN_6',
-        '4 AWG': 'Cable_THHN_4',
-        '2 AWG': 'Cable_THHN_2',
-        '1/0': 'Cable_THHN_1/0',
-        '2/0': 'Cable_THHN_2/0',
-        '3/0': 'Cable_THHN_3/0',
-        '4/0': 'Cable_THHN_4/0'
-    }
-    
-    # Mapeo de canalizaciones a familias Revit
-    familia_canalizacion = {
-        '1"': 'Conduit_EMT_1',
-        '1-1/4"': 'Conduit_EMT_1-1/4',
-        '1-1/2"': 'Conduit_EMT_1-1/2',
-        '2"': 'Conduit_EMT_2',
-        '2-1/2"': 'Conduit_EMT_2-1/2',
-        '3"': 'Conduit_EMT_3',
-        '4"': 'Conduit_EMT_4'
-    }
-    
-    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=headers)
-        writer.writeheader()
-        
-        for r in resultados:
-            estado = 'OK' if r['Caida_Tension'] <= 3 else 'Revisar' if r['Caida_Tension'] <= 5 else 'Fuera de rango'
-            
-            # Determinar familia y tipo Revit para el cable
-            familia_cable = familia_por_calibre.get(r['Calibre'], 'Cable_THHN_Generico')
-            
-            # Determinar familia y tipo Revit para la canalización
-            familia_conduit = familia_canalizacion.get(r['Canalizacion'], 'Conduit_EMT_Generico')
-            
-            writer.writerow({
-                'ID_Equipo': r['ID_Equipo'],
-                'Descripcion': r['Descripcion'],
-                'Corriente_A': f"{r['Corriente']:.2f}",
-                'Calibre_AWG': r['Calibre'],
-                'Caida_Tension_Pct': f"{r['Caida_Tension']:.2f}",
-                'Canalizacion_in': r['Canalizacion'],
-                'Estado': estado,
-                'Familia_Revit': f"{familia_cable}|{familia_conduit}",
-                'Tipo_Revit': 'THHN|EMT'
-            })
-    
+    # Archivo propio del trabajo (nombre único en reports/)
+    filename = new_report_file(proyecto_id, '_revit.csv')
+
+    with open(filename, 'wb') as archivo:
+        write_revit_csv(resultados, archivo)
+
     return filename
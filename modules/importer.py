@@ -0,0 +1,256 @@
+# modules/importer.py
+"""Importación de listas de equipos desde archivos Excel (.xlsx).
+
+El libro se recorre en modo de solo lectura de openpyxl, fila a fila, sin
+cargar la hoja completa en memoria. Las filas se validan y se guardan por
+bloques: cada bloque es una única transacción con ``executemany``. Los tags
+repetidos se detectan con un conjunto en memoria, y los ya registrados (y su
+proyecto) con una sola consulta por bloque, limitada a los tags del bloque.
+Las filas inválidas no detienen la importación; se devuelven en el reporte.
+Las columnas de datos de cálculo (corriente, longitud, voltaje, conductores,
+grupo de ruta) son opcionales; una celda vacía no borra el valor guardado.
+
+``import_rows`` contiene la validación y el guardado; otros formatos de
+origen (p. ej. ``modules.parquet_io``) solo aportan las filas.
+"""
+
+import json
+import sqlite3
+import unicodedata
+
+from openpyxl import load_workbook
+
+TAMANO_BLOQUE = 1000
+MAX_ERRORES = 1000
+
+# Nombre de columna en la tabla equipment -> encabezados aceptados en el Excel
+COLUMNAS = {
+    'tag': ('tag', 'id_equipo', 'id equipo', 'equipo'),
+    'descripcion': ('descripcion', 'description'),
+    'corriente': ('corriente', 'corriente (a)', 'current', 'current (a)'),
+    'longitud': ('longitud', 'longitud (m)', 'length', 'length (m)'),
+    'voltaje': ('voltaje', 'voltaje (v)', 'tension', 'tension (v)', 'voltage', 'voltage (v)'),
+    'num_conductores': ('num_conductores', 'conductores', 'conductors'),
+    'grupo_ruta': ('grupo_ruta', 'grupo de ruta', 'ruta', 'routing group'),
+}
+# Columnas numéricas (datos de cálculo); una celda vacía conserva el valor guardado
+COLUMNAS_NUMERICAS = ('corriente', 'longitud', 'voltaje', 'num_conductores')
+COLUMNAS_OBLIGATORIAS = ('tag',)
+
+SQL_UPSERT = (
+    'INSERT INTO equipment (tag, descripcion, proyecto_id, corriente, longitud, voltaje, num_conductores, '
+    'grupo_ruta) VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+    'ON CONFLICT(tag) DO UPDATE SET descripcion = excluded.descripcion, '
+    'proyecto_id = excluded.proyecto_id, '
+    'corriente = COALESCE(excluded.corriente, corriente), '
+    'longitud = COALESCE(excluded.longitud, longitud), '
+    'voltaje = COALESCE(excluded.voltaje, voltaje), '
+    'num_conductores = COALESCE(excluded.num_conductores, num_conductores), '
+    'grupo_ruta = COALESCE(excluded.grupo_ruta, grupo_ruta)'
+)
+
+# Proyecto de los tags ya registrados entre los de un bloque (lista JSON)
+SQL_EXISTENTES = 'SELECT tag, proyecto_id FROM equipment WHERE tag IN (SELECT value FROM json_each(?))'
+
+
+def _normalizar(texto):
+    """Pasa un encabezado a minúsculas, sin tildes ni espacios sobrantes."""
+    texto = unicodedata.normalize('NFKD', str(texto).strip().lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def _mapear_encabezado(encabezado):
+    """Devuelve {columna: índice} según la fila de encabezado del Excel."""
+    indices = {}
+    for i, valor in enumerate(encabezado or ()):
+        if valor is None:
+            continue
+        nombre = _normalizar(valor)
+        for columna, alias in COLUMNAS.items():
+            if nombre in alias and columna not in indices:
+                indices[columna] = i
+    return indices
+
+
+def _texto(valor):
+    if valor is None:
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    texto = str(valor).strip()
+    return texto or None
+
+
+def _numero(valor):
+    """Convierte una celda en número positivo; ``None`` si está vacía."""
+    if valor is None or (isinstance(valor, str) and not valor.strip()):
+        return None
+    numero = float(str(valor).replace(',', '.')) if isinstance(valor, str) else float(valor)
+    if not numero > 0:
+        raise ValueError(f'{valor} no es un número positivo')
+    return numero
+
+
+class ImportReport:
+    """Resultado de una importación: contadores y errores por fila."""
+
+    def __init__(self, max_errores=MAX_ERRORES):
+        self.filas = 0
+        self.insertados = 0
+        self.actualizados = 0
+        self.errores = []
+        self.errores_omitidos = 0
+        self._max_errores = max_errores
+
+    def error(self, fila, tag, mensaje):
+        if len(self.errores) < self._max_errores:
+            self.errores.append({'fila': fila, 'tag': tag, 'error': mensaje})
+        else:
+            self.errores_omitidos += 1
+
+    @property
+    def total_errores(self):
+        return len(self.errores) + self.errores_omitidos
+
+    def to_dict(self):
+        return {
+            'filas': self.filas,
+            'insertados': self.insertados,
+            'actualizados': self.actualizados,
+            'total_errores': self.total_errores,
+            'errores': self.errores,
+            'errores_omitidos': self.errores_omitidos,
+        }
+
+
+def import_rows(filas, indices, db_path, proyecto_id,
+                tamano_bloque=TAMANO_BLOQUE, max_errores=MAX_ERRORES):
+    """Valida y guarda filas ya leídas de cualquier formato de origen.
+
+    Args:
+        filas: Iterable de ``(num_fila, valores)``; ``valores`` es una
+            secuencia indexable por las posiciones de ``indices``.
+        indices: ``{columna: posición}`` (ver ``COLUMNAS``).
+        db_path: Ruta de la base de datos principal.
+        proyecto_id: Proyecto al que se asignan los equipos.
+        tamano_bloque: Filas por transacción.
+        max_errores: Máximo de errores detallados en el reporte.
+
+    Returns:
+        ImportReport: Contadores de filas y errores por fila.
+
+    Raises:
+        ValueError: Si falta una columna obligatoria.
+    """
+    faltantes = [c for c in COLUMNAS_OBLIGATORIAS if c not in indices]
+    if faltantes:
+        raise ValueError(f'Faltan columnas obligatorias: {", ".join(faltantes)}')
+
+    reporte = ImportReport(max_errores)
+    conn = sqlite3.connect(db_path)
+    try:
+        vistos = set()
+        bloque = []
+
+        def guardar():
+            # Tags del bloque ya registrados y su proyecto
+            existentes = dict(conn.execute(SQL_EXISTENTES, (json.dumps([v[0] for _, v in bloque]),)))
+            validas = []
+            for num_fila, valores in bloque:
+                tag = valores[0]
+                if tag in existentes and existentes[tag] != proyecto_id:
+                    reporte.error(num_fila, tag, 'El tag ya pertenece a otro proyecto')
+                else:
+                    validas.append((num_fila, valores, tag not in existentes))
+            bloque.clear()
+            nuevos = sum(nuevo for _, _, nuevo in validas)
+            try:
+                with conn:
+                    conn.executemany(SQL_UPSERT, (valores for _, valores, _ in validas))
+                reporte.insertados += nuevos
+                reporte.actualizados += len(validas) - nuevos
+            except sqlite3.Error:
+                # Reintentar fila a fila para aislar la que falla
+                for num_fila, valores, nuevo in validas:
+                    try:
+                        with conn:
+                            conn.execute(SQL_UPSERT, valores)
+                    except sqlite3.Error as e:
+                        reporte.error(num_fila, valores[0], f'Error de base de datos: {e}')
+                    else:
+                        if nuevo:
+                            reporte.insertados += 1
+                        else:
+                            reporte.actualizados += 1
+
+        for num_fila, fila in filas:
+            if fila is None or all(v is None for v in fila):
+                continue
+            reporte.filas += 1
+            valores = {c: fila[i] if i < len(fila) else None for c, i in indices.items()}
+            for columna in valores:
+                if columna not in COLUMNAS_NUMERICAS:
+                    valores[columna] = _texto(valores[columna])
+            tag = valores['tag']
+
+            if tag is None:
+                reporte.error(num_fila, None, 'Tag vacío')
+                continue
+            if tag in vistos:
+                reporte.error(num_fila, tag, 'Tag duplicado en el archivo')
+                continue
+            vistos.add(tag)
+
+            try:
+                numeros = [_numero(valores.get(c)) for c in COLUMNAS_NUMERICAS]
+            except ValueError as e:
+                reporte.error(num_fila, tag, f'Valor numérico inválido: {e}')
+                continue
+            if numeros[3] is not None:
+                if not numeros[3].is_integer():
+                    reporte.error(num_fila, tag,
+                                  f'Valor numérico inválido: num_conductores '
+                                  f'{valores["num_conductores"]} no es un número entero')
+                    continue
+                numeros[3] = int(numeros[3])
+
+            # Si es nuevo o de otro proyecto se decide al guardar el bloque
+            bloque.append((num_fila, (tag, valores.get('descripcion'), proyecto_id, *numeros,
+                                      valores.get('grupo_ruta'))))
+            if len(bloque) >= tamano_bloque:
+                guardar()
+
+        if bloque:
+            guardar()
+    finally:
+        conn.close()
+    return reporte
+
+
+def import_equipment_xlsx(origen, db_path, proyecto_id, hoja=None,
+                          tamano_bloque=TAMANO_BLOQUE, max_errores=MAX_ERRORES):
+    """Importa la lista de equipos de un .xlsx en la tabla ``equipment``.
+
+    Args:
+        origen: Ruta o archivo (con ``seek``) del libro Excel.
+        db_path: Ruta de la base de datos principal.
+        proyecto_id: Proyecto al que se asignan los equipos.
+        hoja: Nombre de la hoja; por defecto la hoja activa.
+        tamano_bloque: Filas por transacción.
+        max_errores: Máximo de errores detallados en el reporte.
+
+    Returns:
+        ImportReport: Contadores de filas y errores por fila.
+
+    Raises:
+        ValueError: Si falta la fila de encabezado o una columna obligatoria.
+    """
+    wb = load_workbook(origen, read_only=True, data_only=True)
+    try:
+        ws = wb[hoja] if hoja else wb.active
+        filas = ws.iter_rows(values_only=True)
+        indices = _mapear_encabezado(next(filas, None))
+        return import_rows(enumerate(filas, start=2), indices, db_path, proyecto_id,
+                           tamano_bloque, max_errores)
+    finally:
+        wb.close()
@@ -0,0 +1,513 @@
+# modules/jobs.py
+"""Trabajos de reportes en segundo plano.
+
+Los reportes PDF, Excel y la exportación Revit se ejecutan en un pool de
+procesos local en lugar de dentro de la petición. Cada trabajo se guarda en
+la tabla ``jobs`` (``JOBS_DB``) con su estado, progreso y archivo generado,
+de modo que sobrevive a un reinicio del servidor.
+
+La tabla es también la cola compartida por todos los workers del servidor.
+Un despachador por proceso (un hilo que se arranca con la primera petición
+y se repite cada ``JOBS_DISPATCH_INTERVAL`` segundos, además de al encolar
+y al terminar un trabajo):
+
+- devuelve a la cola los trabajos 'ejecutando' cuyo proceso (``propietario``)
+  ya no existe o que llevan ``JOBS_STALE_SECONDS`` sin latido (el PID solo
+  se comprueba en la máquina local: todos los workers que comparten
+  ``JOBS_DB`` deben correr en el mismo host);
+- reclama trabajos en cola con un UPDATE condicional que respeta
+  ``JOBS_MAX_RUNNING`` trabajos en ejecución entre todos los workers y los
+  envía a su pool de ``JOBS_MAX_WORKERS`` procesos.
+
+Se rechazan nuevos trabajos cuando hay ``JOBS_MAX_PENDING`` en cola, así una
+ráfaga de reportes no deja sin CPU al tráfico interactivo.
+
+Si el trabajo no trae ``resultados``, el proceso del pool los lee del
+almacén de resultados (``modules.results_store``), que se pone al día antes
+de encolar el trabajo.
+"""
+
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import (Blueprint, Response, abort, current_app, jsonify, request,
+                   send_file, session, stream_with_context)
+
+from modules import metrics, report_cache, results_store
+from modules.db import get_db
+from modules.db_init import init_jobs_db
+from modules.repository import get_repository
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/jobs')
+
+ESTADOS_FINALES = ('terminado', 'error')
+
+# Tipo de trabajo -> opciones admitidas
+TIPOS = {
+    'pdf': ('modo',),
+    'excel': (),
+    'revit': (),
+}
+
+# Cada cuántas filas procesadas se guarda el progreso
+FILAS_POR_PROGRESO = 500
+
+# Intervalo de sondeo (s) y duración máxima (s) del flujo de eventos SSE
+INTERVALO_EVENTOS = 1.0
+DURACION_MAXIMA_EVENTOS = 600
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _conectar(db_path):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+# --- Ejecución en los procesos del pool ---
+
+def _funcion_trabajo(tipo):
+    """Importa la función que genera el artefacto de un tipo de trabajo."""
+    if tipo == 'pdf':
+        from modules.reporting import generate_pdf_report
+        return generate_pdf_report
+    if tipo == 'excel':
+        from modules.reporting import generate_excel_report
+        return generate_excel_report
+    if tipo == 'revit':
+        from modules.exports import export_for_revit
+        return export_for_revit
+    raise ValueError(f'Tipo de trabajo {tipo} no soportado')
+
+
+def _resultados_guardados(calc_db, proyecto_id):
+    conn = sqlite3.connect(calc_db, timeout=30)
+    try:
+        return results_store.load_results(conn, proyecto_id)
+    finally:
+        conn.close()
+
+
+def _ejecutar_trabajo(db_path, job_id, despachador, config_cache):
+    """Ejecuta un trabajo en un proceso del pool.
+
+    El despachador ya reclamó el trabajo a su nombre (``propietario``); aquí
+    se traspasa al proceso del pool con un UPDATE condicional, de modo que si
+    el trabajo se devolvió a la cola y lo reclamó otro proceso, este no lo
+    ejecuta. Devuelve ``(tipo, estado, segundos)`` o ``None`` si no se reclamó.
+    """
+    report_cache.configure(**config_cache)
+    inicio = time.perf_counter()
+    pid = os.getpid()
+    conn = _conectar(db_path)
+    try:
+        with conn:
+            reclamado = conn.execute(
+                "UPDATE jobs SET propietario = ?, progreso = 0, actualizado = ? "
+                "WHERE id = ? AND estado = 'ejecutando' AND propietario = ?",
+                (pid, time.time(), job_id, despachador)
+            ).rowcount
+        if not reclamado:
+            return None
+
+        def progreso(fila, total):
+            # Guardar el progreso (y el latido) del trabajo cada tantas filas
+            if fila % FILAS_POR_PROGRESO == 0:
+                with conn:
+                    conn.execute('UPDATE jobs SET progreso = ?, actualizado = ? '
+                                 'WHERE id = ? AND propietario = ?',
+                                 (fila / total, time.time(), job_id, pid))
+
+        job = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        try:
+            payload = json.loads(job['payload'])
+            funcion = _funcion_trabajo(job['tipo'])
+            resultados = payload.get('resultados')
+            if resultados is None:
+                resultados = _resultados_guardados(payload['almacen'], job['proyecto_id'])
+            archivo = funcion(resultados, job['proyecto_id'], progreso=progreso,
+                              **payload.get('opciones', {}))
+        except Exception as e:
+            with conn:
+                conn.execute(
+                    "UPDATE jobs SET estado = 'error', error = ?, actualizado = ? "
+                    "WHERE id = ? AND propietario = ?",
+                    (str(e), time.time(), job_id, pid)
+                )
+            return job['tipo'], 'error', time.perf_counter() - inicio
+
+        with conn:
+            conn.execute(
+                "UPDATE jobs SET estado = 'terminado', progreso = 1, archivo = ?, actualizado = ? "
+                "WHERE id = ? AND propietario = ?",
+                (os.path.abspath(archivo), time.time(), job_id, pid)
+            )
+        return job['tipo'], 'terminado', time.perf_counter() - inicio
+    finally:
+        conn.close()
+
+
+# --- Lado de la aplicación ---
+
+def _get_executor(app, reiniciar=False):
+    """Devuelve el pool de procesos de este proceso, creándolo si hace falta."""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if reiniciar or _executor is None or _executor_pid != os.getpid():
+            # 'spawn' evita heredar hilos y conexiones SQLite del servidor
+            _executor = ProcessPoolExecutor(
+                max_workers=app.config['JOBS_MAX_WORKERS'],
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _registrar_duracion(futuro):
+    """Registra en las métricas de este proceso la duración de un trabajo terminado."""
+    if futuro.cancelled() or futuro.exception() is not None or futuro.result() is None:
+        return
+    tipo, estado, segundos = futuro.result()
+    metrics.JOB_DURATION.observe(segundos, tipo=tipo, estado=estado)
+
+
+def _proceso_vivo(pid):
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def reap_orphans(conn, stale_seconds):
+    """Devuelve a la cola los trabajos 'ejecutando' sin proceso vivo o sin latido reciente.
+
+    Que el proceso exista se comprueba con ``os.kill(pid, 0)`` en esta
+    máquina, así que solo es válido si todos los workers que comparten
+    ``JOBS_DB`` corren en el mismo host: en otro host el PID no existiría (o
+    sería de otro proceso) y el trabajo se daría por huérfano o por vivo sin
+    serlo.
+
+    Returns:
+        int: Número de trabajos recuperados.
+    """
+    limite = time.time() - stale_seconds
+    huerfanos = [
+        (fila['id'], fila['propietario'])
+        for fila in conn.execute(
+            "SELECT id, propietario, actualizado FROM jobs WHERE estado = 'ejecutando'")
+        if fila['actualizado'] < limite or not _proceso_vivo(fila['propietario'])
+    ]
+    recuperados = 0
+    with conn:
+        for job_id, propietario in huerfanos:
+            # Condicional: si otro proceso ya lo recuperó y reclamó, no se toca
+            recuperados += conn.execute(
+                "UPDATE jobs SET estado = 'en_cola', propietario = NULL, actualizado = ? "
+                "WHERE id = ? AND estado = 'ejecutando' AND propietario IS ?",
+                (time.time(), job_id, propietario)
+            ).rowcount
+    return recuperados
+
+
+def _reclamar(conn, maximo):
+    """Pasa a 'ejecutando' el trabajo en cola más antiguo si hay cupo global. Devuelve su ID."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        fila = conn.execute(
+            "UPDATE jobs SET estado = 'ejecutando', propietario = ?, actualizado = ? "
+            "WHERE id = (SELECT id FROM jobs WHERE estado = 'en_cola' ORDER BY creado LIMIT 1) "
+            "AND (SELECT COUNT(*) FROM jobs WHERE estado = 'ejecutando') < ? "
+            "RETURNING id",
+            (os.getpid(), time.time(), maximo)
+        ).fetchone()
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    return fila[0] if fila else None
+
+
+_en_curso = set()
+_despacho_lock = threading.Lock()
+
+
+def _enviar(app, job_id):
+    cache = report_cache.get_report_cache()
+    args = (app.config['JOBS_DB'], job_id, os.getpid(),
+            {'max_bytes': cache.max_bytes, 'ttl': cache.ttl})
+    try:
+        futuro = _get_executor(app).submit(_ejecutar_trabajo, *args)
+    except BrokenProcessPool:
+        # Un proceso del pool murió; se crea otro pool
+        futuro = _get_executor(app, reiniciar=True).submit(_ejecutar_trabajo, *args)
+
+    def terminado(futuro):
+        with _despacho_lock:
+            _en_curso.discard(job_id)
+        _registrar_duracion(futuro)
+        # Un hueco libre: arrancar el siguiente trabajo en cola
+        dispatch_pending(app)
+
+    futuro.add_done_callback(terminado)
+
+
+def dispatch_pending(app):
+    """Recupera huérfanos y arranca trabajos en cola hasta los límites.
+
+    El límite global (``JOBS_MAX_RUNNING``) se aplica en la tabla; el del
+    proceso (``JOBS_MAX_WORKERS``), con los trabajos enviados a su pool.
+    """
+    conn = _conectar(app.config['JOBS_DB'])
+    conn.isolation_level = None
+    try:
+        reap_orphans(conn, app.config['JOBS_STALE_SECONDS'])
+        while True:
+            with _despacho_lock:
+                if len(_en_curso) >= app.config['JOBS_MAX_WORKERS']:
+                    return
+                job_id = _reclamar(conn, app.config['JOBS_MAX_RUNNING'])
+                if job_id is None:
+                    return
+                _en_curso.add(job_id)
+            _enviar(app, job_id)
+    finally:
+        conn.close()
+
+
+_despachador_pid = None
+_despachador_lock = threading.Lock()
+
+
+def _bucle_despachador(app, intervalo):
+    while True:
+        try:
+            dispatch_pending(app)
+        except Exception:
+            app.logger.exception('Error al despachar trabajos en segundo plano')
+        time.sleep(intervalo)
+
+
+def start_dispatcher(app):
+    """Arranca (una vez por proceso) el hilo que despacha los trabajos periódicamente."""
+    global _despachador_pid, _en_curso
+    with _despachador_lock:
+        if _despachador_pid == os.getpid():
+            return
+        # Tras un fork los trabajos en curso del proceso padre no son de este
+        _en_curso = set()
+        _despachador_pid = os.getpid()
+    hilo = threading.Thread(target=_bucle_despachador, name='jobs-despachador', daemon=True,
+                            args=(app, app.config['JOBS_DISPATCH_INTERVAL']))
+    hilo.start()
+
+
+def init_app(app):
+    """Crea la tabla de trabajos y arranca el despachador con la primera petición.
+
+    El despachador no se arranca aquí: con ``preload_app`` esta función se
+    ejecuta en el proceso maestro, que no debe tener pool de trabajos.
+    """
+    init_jobs_db(app.config['JOBS_DB'])
+
+    @app.before_request
+    def _asegurar_despachador():
+        start_dispatcher(app)
+
+
+def submit_job(tipo, proyecto_id, resultados=None, opciones=None, usuario_id=None):
+    """Registra un trabajo en la cola y lo despacha si hay cupo. Devuelve su ID.
+
+    Sin ``resultados`` se usan los del almacén de resultados del proyecto,
+    recalculando antes los equipos cuyas entradas cambiaron.
+
+    Raises:
+        ValueError: Si el tipo o las opciones no son válidos.
+        OverflowError: Si ya hay ``JOBS_MAX_PENDING`` trabajos en cola.
+    """
+    if tipo not in TIPOS:
+        raise ValueError(f'Tipo de trabajo {tipo} no soportado')
+    opciones = opciones or {}
+    invalidas = [k for k in opciones if k not in TIPOS[tipo]]
+    if invalidas:
+        raise ValueError(f'Opciones no soportadas: {", ".join(invalidas)}')
+
+    app = current_app._get_current_object()
+    if resultados is None:
+        if proyecto_id is None:
+            raise ValueError('Se requiere proyecto_id o resultados')
+        results_store.refresh(get_db('datos'), get_db('calc'), proyecto_id)
+        payload = {'almacen': app.config['CALC_DB'], 'opciones': opciones}
+    else:
+        payload = {'resultados': resultados, 'opciones': opciones}
+    job_id = uuid.uuid4().hex
+    ahora = time.time()
+    conn = _conectar(app.config['JOBS_DB'])
+    try:
+        with conn:
+            en_cola = conn.execute("SELECT COUNT(*) FROM jobs WHERE estado = 'en_cola'").fetchone()[0]
+            if en_cola >= app.config['JOBS_MAX_PENDING']:
+                raise OverflowError('Demasiados trabajos en cola')
+            conn.execute(
+                "INSERT INTO jobs (id, tipo, proyecto_id, usuario_id, estado, payload, creado, actualizado) "
+                "VALUES (?, ?, ?, ?, 'en_cola', ?, ?, ?)",
+                (job_id, tipo, proyecto_id, usuario_id,
+                 json.dumps(payload), ahora, ahora)
+            )
+    finally:
+        conn.close()
+
+    dispatch_pending(app)
+    return job_id
+
+
+def get_job(job_id):
+    """Devuelve la fila del trabajo (sin el payload) o ``None``."""
+    conn = _conectar(current_app.config['JOBS_DB'])
+    try:
+        return conn.execute(
+            'SELECT id, tipo, proyecto_id, usuario_id, estado, progreso, archivo, error, creado, actualizado '
+            'FROM jobs WHERE id = ?',
+            (job_id,)
+        ).fetchone()
+    finally:
+        conn.close()
+
+
+def _job_a_dict(job):
+    return {
+        'id': job['id'],
+        'tipo': job['tipo'],
+        'proyecto_id': job['proyecto_id'],
+        'estado': job['estado'],
+        'progreso': round(job['progreso'], 3),
+        'error': job['error'],
+        'creado': job['creado'],
+        'actualizado': job['actualizado'],
+    }
+
+
+def _job_del_usuario(job_id):
+    """Carga el trabajo y verifica que sea del usuario (o que sea admin)."""
+    if 'user_id' not in session:
+        abort(401)
+    job = get_job(job_id)
+    if job is None:
+        abort(404)
+    if job['usuario_id'] != session['user_id'] and session.get('role') != 'Administrador':
+        abort(403)
+    return job
+
+
+def _cuerpo_json(maximo_bytes):
+    """Cuerpo JSON de la petición o ``None`` si supera ``maximo_bytes`` bytes."""
+    if request.content_length is not None and request.content_length > maximo_bytes:
+        return None
+    # Se lee como mucho un byte más del límite: un cuerpo sin Content-Length no se carga entero
+    cuerpo = request.stream.read(maximo_bytes + 1)
+    if len(cuerpo) > maximo_bytes:
+        return None
+    try:
+        datos = json.loads(cuerpo or b'{}')
+    except ValueError:
+        return {}
+    return datos if isinstance(datos, dict) else {}
+
+
+@jobs_bp.route('/', methods=['POST'])
+def submit():
+    """Encola un reporte. Cuerpo JSON: tipo, proyecto_id, resultados (opcional), opciones.
+
+    El proyecto debe existir y el cuerpo no superar ``JOBS_MAX_PAYLOAD_BYTES``
+    (413), porque ``resultados`` se guarda tal cual en la tabla de trabajos.
+    """
+    if session.get('role') not in ['Administrador', 'Ingeniero']:
+        abort(403)
+    maximo_bytes = current_app.config['JOBS_MAX_PAYLOAD_BYTES']
+    datos = _cuerpo_json(maximo_bytes)
+    if datos is None:
+        return jsonify({'error': f'El cuerpo supera el máximo de {maximo_bytes} bytes'}), 413
+    proyecto_id = datos.get('proyecto_id')
+    if isinstance(proyecto_id, bool) or not isinstance(proyecto_id, int):
+        return jsonify({'error': 'proyecto_id debe ser un entero'}), 400
+    if get_repository().project(proyecto_id) is None:
+        return jsonify({'error': 'Proyecto no encontrado'}), 404
+    if datos.get('resultados') is not None and not isinstance(datos['resultados'], list):
+        return jsonify({'error': 'resultados debe ser una lista'}), 400
+    try:
+        job_id = submit_job(
+            datos.get('tipo'),
+            proyecto_id,
+            datos.get('resultados'),
+            datos.get('opciones'),
+            session['user_id']
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except OverflowError as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '30'}
+    return jsonify({'id': job_id, 'estado': 'en_cola'}), 202
+
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def status(job_id):
+    """Estado y progreso de un trabajo."""
+    return jsonify(_job_a_dict(_job_del_usuario(job_id)))
+
+
+@jobs_bp.route('/<job_id>/events', methods=['GET'])
+def events(job_id):
+    """Flujo Server-Sent Events con el progreso hasta que el trabajo termina."""
+    _job_del_usuario(job_id)
+    db_path = current_app.config['JOBS_DB']
+
+    def generar():
+        ultimo = None
+        limite = time.monotonic() + DURACION_MAXIMA_EVENTOS
+        conn = _conectar(db_path)
+        try:
+            while time.monotonic() < limite:
+                job = conn.execute(
+                    'SELECT id, tipo, proyecto_id, estado, progreso, error, creado, actualizado '
+                    'FROM jobs WHERE id = ?',
+                    (job_id,)
+                ).fetchone()
+                if job is None:
+                    break
+                datos = _job_a_dict(job)
+                if datos != ultimo:
+                    yield f'data: {json.dumps(datos)}\n\n'
+                    ultimo = datos
+                if job['estado'] in ESTADOS_FINALES:
+                    break
+                time.sleep(INTERVALO_EVENTOS)
+        finally:
+            conn.close()
+
+    return Response(stream_with_context(generar()), mimetype='text/event-stream',
+                     headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@jobs_bp.route('/<job_id>/download', methods=['GET'])
+def download(job_id):
+    """Descarga el archivo de un trabajo terminado."""
+    job = _job_del_usuario(job_id)
+    if job['estado'] != 'terminado':
+        return jsonify({'error': 'El trabajo no ha terminado', 'estado': job['estado']}), 409
+    if not job['archivo'] or not os.path.exists(job['archivo']):
+        abort(410)
+    return send_file(job['archivo'], as_attachment=True)
@@ -0,0 +1,375 @@
+# modules/metrics.py
+"""Métricas de la aplicación en formato de texto de Prometheus.
+
+Registra, por endpoint y blueprint:
+
+- latencia de las peticiones (histograma);
+- número y tiempo de consultas SQLite, contadas con el ``trace callback`` de
+  cada conexión del registro de ``modules.db`` y cronometradas en
+  ``execute``/``executemany``/``commit`` (no incluye el tiempo de recorrer
+  los resultados);
+- duración de la generación de reportes y de los trabajos en segundo plano;
+- tamaño y duración de los lotes de cálculo vectorizado.
+
+Se publican en ``/metrics``, accesible solo con el token Bearer
+``METRICS_TOKEN`` o desde las redes de ``METRICS_ALLOWED_NETWORKS`` (por
+defecto, la propia máquina). Las métricas son por proceso y no se agregan
+entre workers: cada muestra lleva la etiqueta ``worker`` con el PID del
+proceso que atendió ``/metrics``, y con varios workers cada raspado ve solo
+las de uno (súmelas en Prometheus con ``sum without (worker)``).
+
+Además escribe un registro estructurado (JSON, una línea por petición) de
+una muestra de las peticiones, siempre de las lentas y de las que fallan,
+con los valores sensibles del formulario ocultos.
+"""
+
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+
+from flask import Response, abort, g, request, session
+
+LATENCIA_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+REPORTE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+LOTE_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000)
+
+# Campos de formulario cuyo valor nunca se escribe en el registro
+CAMPOS_SENSIBLES = re.compile(r'pass|token|secret|key|csrf', re.IGNORECASE)
+LONGITUD_MAXIMA_CAMPO = 100
+
+logger = logging.getLogger('electric.requests')
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(nombres, valores, fijas=()):
+    nombres = tuple(n for n, _ in fijas) + tuple(nombres)
+    valores = tuple(v for _, v in fijas) + tuple(valores)
+    if not nombres:
+        return ''
+    pares = ','.join(f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores))
+    return '{' + pares + '}'
+
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Counter:
+    tipo = 'counter'
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, valor=1, **etiquetas):
+        clave = tuple(etiquetas.get(n, '') for n in self.etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+    def muestras(self, fijas=()):
+        with self._lock:
+            valores = dict(self._valores)
+        for clave, valor in sorted(valores.items()):
+            yield f'{self.nombre}{_etiquetas(self.etiquetas, clave, fijas)} {_numero(valor)}'
+
+
+class Histogram:
+    tipo = 'histogram'
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=LATENCIA_BUCKETS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, valor, **etiquetas):
+        clave = tuple(etiquetas.get(n, '') for n in self.etiquetas)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [[0] * len(self.buckets), 0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[0][i] += 1
+                    break
+            serie[1] += valor
+            serie[2] += 1
+
+    def muestras(self, fijas=()):
+        with self._lock:
+            series = {k: ([*v[0]], v[1], v[2]) for k, v in self._series.items()}
+        nombres = self.etiquetas + ('le',)
+        for clave, (conteos, suma, total) in sorted(series.items()):
+            acumulado = 0
+            for limite, conteo in zip(self.buckets, conteos):
+                acumulado += conteo
+                etiquetas = _etiquetas(nombres, clave + (_numero(limite),), fijas)
+                yield f'{self.nombre}_bucket{etiquetas} {acumulado}'
+            yield f'{self.nombre}_sum{_etiquetas(self.etiquetas, clave, fijas)} {_numero(suma)}'
+            yield f'{self.nombre}_count{_etiquetas(self.etiquetas, clave, fijas)} {total}'
+
+
+class Registry:
+    """Métricas registradas y colectores de valores leídos en cada exportación."""
+
+    def __init__(self):
+        self._metricas = []
+        self._colectores = []
+
+    def counter(self, *args, **kwargs):
+        metrica = Counter(*args, **kwargs)
+        self._metricas.append(metrica)
+        return metrica
+
+    def histogram(self, *args, **kwargs):
+        metrica = Histogram(*args, **kwargs)
+        self._metricas.append(metrica)
+        return metrica
+
+    def collector(self, funcion):
+        """Registra ``funcion() -> [(nombre, tipo, ayuda, valor), ...]`` evaluada en cada exportación.
+
+        ``tipo`` es ``'counter'`` para totales acumulados desde el arranque
+        del proceso (con sufijo ``_total``) o ``'gauge'`` para valores
+        instantáneos.
+        """
+        self._colectores.append(funcion)
+        return funcion
+
+    def render(self):
+        """Texto de exposición de Prometheus (versión 0.0.4) de este proceso."""
+        # El PID se lee en cada exportación: tras el fork cada worker tiene el suyo
+        fijas = (('worker', os.getpid()),)
+        lineas = []
+        for metrica in self._metricas:
+            lineas.append(f'# HELP {metrica.nombre} {metrica.ayuda}')
+            lineas.append(f'# TYPE {metrica.nombre} {metrica.tipo}')
+            lineas.extend(metrica.muestras(fijas))
+        for colector in self._colectores:
+            for nombre, tipo, ayuda, valor in colector():
+                lineas.append(f'# HELP {nombre} {ayuda}')
+                lineas.append(f'# TYPE {nombre} {tipo}')
+                lineas.append(f'{nombre}{_etiquetas((), (), fijas)} {_numero(valor)}')
+        return '\n'.join(lineas) + '\n'
+
+
+registry = Registry()
+
+ETIQUETAS_PETICION = ('endpoint', 'blueprint')
+
+REQUEST_LATENCY = registry.histogram(
+    'http_request_duration_seconds', 'Latencia de las peticiones HTTP.',
+    ETIQUETAS_PETICION + ('method', 'status'))
+SQLITE_QUERIES = registry.counter(
+    'sqlite_queries_total', 'Sentencias SQLite ejecutadas.', ETIQUETAS_PETICION + ('db',))
+SQLITE_SECONDS = registry.counter(
+    'sqlite_query_seconds_total', 'Tiempo en execute/executemany/commit de SQLite.',
+    ETIQUETAS_PETICION + ('db',))
+SQLITE_QUERIES_PER_REQUEST = registry.histogram(
+    'sqlite_queries_per_request', 'Sentencias SQLite por petición.', ETIQUETAS_PETICION,
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250))
+REPORT_DURATION = registry.histogram(
+    'report_generation_seconds', 'Duración de la generación de reportes.',
+    ('formato', 'cache'), buckets=REPORTE_BUCKETS)
+JOB_DURATION = registry.histogram(
+    'report_job_seconds', 'Duración de los trabajos de reportes en segundo plano.',
+    ('tipo', 'estado'), buckets=REPORTE_BUCKETS)
+BATCH_SIZE = registry.histogram(
+    'calculation_batch_size', 'Circuitos por lote de cálculo vectorizado.', buckets=LOTE_BUCKETS)
+BATCH_DURATION = registry.histogram(
+    'calculation_batch_seconds', 'Duración de los lotes de cálculo vectorizado.')
+PASSWORD_HASH_SECONDS = registry.histogram(
+    'password_hash_seconds', 'Duración de bcrypt (verify/hash) por factor de trabajo.',
+    ('operacion', 'rounds'))
+PASSWORD_QUEUE_WAIT = registry.histogram(
+    'password_queue_wait_seconds', 'Espera en cola del pool de bcrypt.', ('operacion',))
+LOGIN_ATTEMPTS = registry.counter(
+    'login_attempts_total', 'Intentos de login por resultado.', ('resultado',))
+
+
+# --- Medición de SQLite ---
+
+_local = threading.local()
+
+
+def _etiquetas_actuales():
+    return getattr(_local, 'etiquetas', ('-', '-'))
+
+
+class MeteredConnection(sqlite3.Connection):
+    """Conexión que cuenta sentencias (trace callback) y mide su ejecución."""
+
+    def __init__(self, database, *args, **kwargs):
+        super().__init__(database, *args, **kwargs)
+        self.db = os.path.splitext(os.path.basename(str(database)))[0]
+        self.set_trace_callback(self._traza)
+
+    def _traza(self, sql):
+        endpoint, blueprint = _etiquetas_actuales()
+        SQLITE_QUERIES.inc(endpoint=endpoint, blueprint=blueprint, db=self.db)
+        _local.consultas = getattr(_local, 'consultas', 0) + 1
+
+    def _medir(self, metodo, *args):
+        inicio = time.perf_counter()
+        try:
+            return metodo(*args)
+        finally:
+            duracion = time.perf_counter() - inicio
+            endpoint, blueprint = _etiquetas_actuales()
+            SQLITE_SECONDS.inc(duracion, endpoint=endpoint, blueprint=blueprint, db=self.db)
+            _local.tiempo_db = getattr(_local, 'tiempo_db', 0.0) + duracion
+
+    def execute(self, *args):
+        return self._medir(super().execute, *args)
+
+    def executemany(self, *args):
+        return self._medir(super().executemany, *args)
+
+    def commit(self):
+        return self._medir(super().commit)
+
+
+# --- Peticiones ---
+
+def _formulario_redactado():
+    datos = {}
+    for campo in request.form:
+        if CAMPOS_SENSIBLES.search(campo):
+            datos[campo] = '[oculto]'
+        else:
+            datos[campo] = request.form.get(campo, '')[:LONGITUD_MAXIMA_CAMPO]
+    return datos
+
+
+def _inicio_peticion():
+    g._metricas_inicio = time.perf_counter()
+    _local.etiquetas = (request.endpoint or '-', request.blueprint or '-')
+    _local.consultas = 0
+    _local.tiempo_db = 0.0
+
+
+def _respuesta(respuesta):
+    g._metricas_status = respuesta.status_code
+    return respuesta
+
+
+def _fin_peticion(app, exception):
+    inicio = g.pop('_metricas_inicio', None)
+    if inicio is None:
+        return
+    duracion = time.perf_counter() - inicio
+    status = g.pop('_metricas_status', 500)
+    endpoint, blueprint = _etiquetas_actuales()
+    consultas = getattr(_local, 'consultas', 0)
+    tiempo_db = getattr(_local, 'tiempo_db', 0.0)
+    _local.etiquetas = ('-', '-')
+
+    REQUEST_LATENCY.observe(duracion, endpoint=endpoint, blueprint=blueprint,
+                            method=request.method, status=status)
+    SQLITE_QUERIES_PER_REQUEST.observe(consultas, endpoint=endpoint, blueprint=blueprint)
+
+    lenta = duracion * 1000 >= app.config['REQUEST_LOG_SLOW_MS']
+    if status >= 500 or lenta or random.random() < app.config['REQUEST_LOG_SAMPLE_RATE']:
+        registro = {
+            'ts': round(time.time(), 3),
+            'method': request.method,
+            'path': request.path,
+            'endpoint': endpoint,
+            'blueprint': blueprint,
+            'status': status,
+            'duration_ms': round(duracion * 1000, 2),
+            'db_queries': consultas,
+            'db_ms': round(tiempo_db * 1000, 2),
+            'user_id': session.get('user_id'),
+            'remote_addr': request.remote_addr,
+        }
+        if request.method == 'POST' and request.form:
+            registro['form'] = _formulario_redactado()
+        if exception is not None:
+            registro['error'] = repr(exception)
+        logger.info(json.dumps(registro, ensure_ascii=False, default=str))
+
+
+def _redes_confiables(valor):
+    """Redes de una lista separada por comas (``'127.0.0.1,10.0.0.0/8'``)."""
+    return tuple(ipaddress.ip_network(red.strip(), strict=False)
+                 for red in (valor or '').split(',') if red.strip())
+
+
+def _direccion_confiable(direccion, redes):
+    try:
+        ip = ipaddress.ip_address(direccion or '')
+    except ValueError:
+        return False
+    return any(ip in red for red in redes)
+
+
+def metrics_view():
+    """Exposición de métricas: con el token ``METRICS_TOKEN`` o desde una red confiable."""
+    from flask import current_app
+    token = current_app.config.get('METRICS_TOKEN')
+    autorizacion = request.headers.get('Authorization', '').encode('utf-8')
+    if token and hmac.compare_digest(autorizacion, f'Bearer {token}'.encode('utf-8')):
+        pass
+    elif not _direccion_confiable(request.remote_addr,
+                                  current_app.extensions['metrics_redes_confiables']):
+        abort(401 if token else 403)
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+@registry.collector
+def _estado_caches():
+    from modules import db, page_cache, report_cache
+
+    conexiones = db.registry.stats()
+    reportes = report_cache.get_report_cache().stats()
+    paginas = page_cache.get_page_cache().stats()
+    return [
+        ('sqlite_connections_opened_total', 'counter',
+         'Conexiones SQLite abiertas por el registro.', conexiones['abiertas']),
+        ('sqlite_connections_reused_total', 'counter',
+         'Conexiones SQLite reutilizadas.', conexiones['reutilizadas']),
+        ('report_cache_hits_total', 'counter', 'Aciertos de la caché de reportes.', reportes['hits']),
+        ('report_cache_misses_total', 'counter', 'Fallos de la caché de reportes.', reportes['misses']),
+        ('report_cache_bytes', 'gauge', 'Bytes en la caché de reportes.', reportes['bytes']),
+        ('page_cache_hits_total', 'counter', 'Aciertos de la caché de páginas.', paginas['hits']),
+        ('page_cache_not_modified_total', 'counter',
+         'Respuestas 304 de la caché de páginas.', paginas['not_modified']),
+    ]
+
+
+def init_app(app):
+    """Instala la medición de peticiones y SQLite y registra ``/metrics``."""
+    from modules import db
+
+    db.registry.factory = MeteredConnection
+    if app.config.get('REQUEST_LOG_SAMPLE_RATE') and not logger.handlers:
+        manejador = logging.StreamHandler()
+        manejador.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(manejador)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    app.before_request(_inicio_peticion)
+    app.after_request(_respuesta)
+    app.teardown_request(lambda exception: _fin_peticion(app, exception))
+    app.extensions['metrics_redes_confiables'] = _redes_confiables(
+        app.config.get('METRICS_ALLOWED_NETWORKS'))
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
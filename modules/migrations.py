@@ -0,0 +1,287 @@
+# modules/migrations.py
+"""Migraciones de esquema versionadas.
+
+Cada base tiene una lista ordenada de migraciones. La versión aplicada se
+guarda en ``PRAGMA user_version``, así que al arrancar solo se ejecutan las
+migraciones con número mayor, cada una dentro de su propia transacción.
+Tras cambiar el esquema se ejecuta ``ANALYZE`` para que el planificador use
+las estadísticas de los índices nuevos.
+
+En modo de prueba (``dry_run``) todas las migraciones pendientes se aplican
+en una sola transacción que se deshace al final, y se muestran los planes de
+las consultas frecuentes antes y después.
+"""
+
+import logging
+import sqlite3
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+Migracion = namedtuple('Migracion', 'version descripcion pasos')
+
+
+def _agregar_columna(tabla, columna, tipo):
+    """Paso que añade una columna solo si no existe (bases creadas con migration.py)."""
+    def paso(conn):
+        existentes = {fila[1] for fila in conn.execute(f'PRAGMA table_info({tabla})')}
+        if columna not in existentes:
+            conn.execute(f'ALTER TABLE {tabla} ADD COLUMN {columna} {tipo}')
+    return paso
+
+
+# Contadores de cambios por tabla (modules/page_cache.py)
+SQL_VERSIONES = '''
+    CREATE TABLE IF NOT EXISTS versiones (
+        tabla TEXT PRIMARY KEY,
+        version INTEGER NOT NULL,
+        modificado REAL NOT NULL
+    )'''
+
+# Tablas normativas de NORM_DB; su contador 'normativa' en ``versiones`` lo
+# incrementan triggers, así cualquier cambio (también desde fuera de la
+# aplicación) se detecta leyendo una fila (modules/normative_cache.py)
+TABLAS_NORMATIVAS = ('factores_correccion_temp', 'ampacidad_cables', 'reactancia_resistencia_cables')
+_AHORA = "(julianday('now') - 2440587.5) * 86400.0"
+
+
+def sello_normativo(conn):
+    """Paso que crea el contador de cambios de las tablas normativas existentes."""
+    conn.execute(SQL_VERSIONES)
+    conn.execute(f"INSERT OR IGNORE INTO versiones (tabla, version, modificado) "
+                 f"VALUES ('normativa', 1, {_AHORA})")
+    existentes = {fila[0] for fila in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for tabla in TABLAS_NORMATIVAS:
+        if tabla not in existentes:
+            continue
+        for operacion in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS sello_{tabla}_{operacion.lower()}
+                AFTER {operacion} ON {tabla} BEGIN
+                    UPDATE versiones SET version = version + 1, modificado = {_AHORA}
+                    WHERE tabla = 'normativa';
+                END''')
+
+
+# Migraciones por base (nombre del registro de modules/db.py)
+MIGRACIONES = {
+    'users': [
+        Migracion(1, 'Columna email en usuarios', [
+            _agregar_columna('users', 'email', 'TEXT'),
+        ]),
+        Migracion(2, 'Índice para filtrar usuarios por rol', [
+            'CREATE INDEX IF NOT EXISTS idx_users_role ON users (role, username)',
+        ]),
+        Migracion(3, 'Contadores de versión de tablas', [
+            SQL_VERSIONES,
+        ]),
+        Migracion(4, 'Intentos fallidos de login compartidos entre procesos', [
+            '''CREATE TABLE IF NOT EXISTS login_fallos (
+                tipo TEXT NOT NULL CHECK (tipo IN ('usuario', 'ip')),
+                clave TEXT NOT NULL,
+                momento REAL NOT NULL
+            )''',
+            'CREATE INDEX IF NOT EXISTS idx_login_fallos ON login_fallos (tipo, clave, momento)',
+        ]),
+    ],
+    'plants': [
+        Migracion(1, 'Columnas de tensiones en plantas', [
+            _agregar_columna('plants', 'medium_voltage', 'TEXT'),
+            _agregar_columna('plants', 'low_voltage', 'TEXT'),
+            _agregar_columna('plants', 'control_voltage', 'TEXT'),
+        ]),
+        Migracion(2, 'Índices para filtrar plantas por cliente y país', [
+            'CREATE INDEX IF NOT EXISTS idx_plants_cliente ON plants (cliente, nombre)',
+            'CREATE INDEX IF NOT EXISTS idx_plants_pais ON plants (pais, nombre)',
+        ]),
+        Migracion(3, 'Contadores de versión de tablas', [
+            SQL_VERSIONES,
+        ]),
+        Migracion(4, 'Temperatura ambiente de diseño de la planta', [
+            _agregar_columna('plants', 'temperatura_ambiente', 'REAL'),
+        ]),
+    ],
+    'main': [
+        Migracion(1, 'Índices de proyectos por planta y equipos por proyecto', [
+            # Cubre el listado de proyectos de una planta ordenado por nombre
+            'CREATE INDEX IF NOT EXISTS idx_projects_planta ON projects (planta_id, nombre)',
+            # Cubre el listado y el conteo de equipos de un proyecto
+            'CREATE INDEX IF NOT EXISTS idx_equipment_proyecto '
+            'ON equipment (proyecto_id, tag, descripcion)',
+        ]),
+        Migracion(2, 'Contadores de versión de tablas', [
+            SQL_VERSIONES,
+        ]),
+        Migracion(3, 'Jerarquía de circuitos con caída de tensión acumulada', [
+            '''CREATE TABLE IF NOT EXISTS circuitos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                proyecto_id INTEGER NOT NULL REFERENCES projects (id),
+                padre_id INTEGER REFERENCES circuitos (id),
+                equipo_id INTEGER REFERENCES equipment (id),
+                tipo TEXT NOT NULL CHECK (tipo IN ('alimentador', 'tablero', 'ramal')),
+                tag TEXT NOT NULL,
+                corriente REAL NOT NULL,
+                longitud REAL NOT NULL,
+                voltaje REAL NOT NULL,
+                calibre TEXT NOT NULL,
+                caida REAL,
+                caida_acumulada REAL
+            )''',
+            # Recorrido del subárbol (CTE recursiva por padre_id)
+            'CREATE INDEX IF NOT EXISTS idx_circuitos_padre ON circuitos (padre_id)',
+            'CREATE INDEX IF NOT EXISTS idx_circuitos_proyecto ON circuitos (proyecto_id)',
+        ]),
+        Migracion(4, 'Datos de cálculo de los equipos', [
+            _agregar_columna('equipment', 'corriente', 'REAL'),
+            _agregar_columna('equipment', 'longitud', 'REAL'),
+            _agregar_columna('equipment', 'voltaje', 'REAL'),
+            _agregar_columna('equipment', 'num_conductores', 'INTEGER'),
+        ]),
+        Migracion(5, 'Grupo de ruta de los equipos (canalización compartida)', [
+            _agregar_columna('equipment', 'grupo_ruta', 'TEXT'),
+        ]),
+    ],
+    'calc': [
+        Migracion(1, 'Resultados de cálculo por equipo con huella de entradas', [
+            '''CREATE TABLE IF NOT EXISTS resultados_calculo (
+                equipo_id INTEGER PRIMARY KEY,
+                proyecto_id INTEGER NOT NULL,
+                tag TEXT NOT NULL,
+                descripcion TEXT,
+                corriente REAL,
+                temperatura REAL,
+                longitud REAL,
+                voltaje REAL,
+                num_conductores INTEGER,
+                version_normativa TEXT NOT NULL,
+                huella TEXT NOT NULL,
+                calibre TEXT,
+                caida_tension REAL,
+                canalizacion TEXT,
+                estado TEXT NOT NULL,
+                error TEXT,
+                calculado REAL NOT NULL
+            )''',
+            # Lectura de los resultados de un proyecto en el orden de los reportes
+            'CREATE INDEX IF NOT EXISTS idx_resultados_proyecto ON resultados_calculo (proyecto_id, tag)',
+        ]),
+        Migracion(2, 'Contador de cambios de las tablas normativas', [
+            sello_normativo,
+        ]),
+    ],
+}
+
+# Consultas frecuentes cuyo plan se muestra en modo de prueba
+CONSULTAS_FRECUENTES = {
+    'users': [
+        ('SELECT * FROM users WHERE username = ?', ('admin',)),
+        ('SELECT * FROM users WHERE role = ? AND (username, id) > (?, ?) ORDER BY username, id LIMIT 51',
+         ('Ingeniero', '', 0)),
+    ],
+    'plants': [
+        ('SELECT * FROM plants WHERE (nombre, id) > (?, ?) ORDER BY nombre, id LIMIT 51', ('', 0)),
+        ('SELECT * FROM plants WHERE pais = ? AND (nombre, id) > (?, ?) ORDER BY nombre, id LIMIT 51',
+         ('Colombia', '', 0)),
+    ],
+    'main': [
+        ('SELECT id, nombre, planta_id FROM projects WHERE planta_id = ? ORDER BY nombre', (1,)),
+        ('SELECT id, tag, descripcion, proyecto_id FROM equipment WHERE proyecto_id = ? ORDER BY tag', (1,)),
+        ('SELECT COUNT(*) FROM equipment WHERE proyecto_id = ?', (1,)),
+    ],
+    'calc': [
+        ('SELECT * FROM resultados_calculo WHERE proyecto_id = ? ORDER BY tag', (1,)),
+    ],
+}
+
+
+def user_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def _aplicar(conn, migracion):
+    for paso in migracion.pasos:
+        if callable(paso):
+            paso(conn)
+        else:
+            conn.execute(paso)
+    conn.execute(f'PRAGMA user_version = {int(migracion.version)}')
+
+
+def query_plans(conn, nombre):
+    """Devuelve {consulta: [detalle, ...]} con ``EXPLAIN QUERY PLAN`` de las consultas frecuentes."""
+    planes = {}
+    for sql, params in CONSULTAS_FRECUENTES.get(nombre, []):
+        try:
+            filas = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+        except sqlite3.OperationalError as e:
+            # La tabla aún no existe antes de aplicar su migración
+            planes[sql] = [f'({e})']
+            continue
+        planes[sql] = [fila[-1] for fila in filas]
+    return planes
+
+
+def _mostrar_planes(titulo, planes, salida):
+    salida(f'  {titulo}:')
+    for sql, detalles in planes.items():
+        salida(f'    {sql}')
+        for detalle in detalles:
+            salida(f'      -> {detalle}')
+
+
+def migrate(db_path, nombre, dry_run=False, salida=logger.info):
+    """Aplica las migraciones pendientes de la base ``nombre``. Devuelve la versión final.
+
+    Los mensajes se envían a ``salida`` (por defecto, el log del módulo).
+    """
+    migraciones = sorted(MIGRACIONES.get(nombre, []), key=lambda m: m.version)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        actual = user_version(conn)
+        pendientes = [m for m in migraciones if m.version > actual]
+
+        if dry_run:
+            salida(f'[{nombre}] versión {actual}, {len(pendientes)} migraciones pendientes')
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                _mostrar_planes('Antes', query_plans(conn, nombre), salida)
+                for migracion in pendientes:
+                    salida(f'  Aplicando {migracion.version}: {migracion.descripcion}')
+                    _aplicar(conn, migracion)
+                if pendientes:
+                    conn.execute('ANALYZE')
+                _mostrar_planes('Después', query_plans(conn, nombre), salida)
+            finally:
+                conn.execute('ROLLBACK')
+            return actual
+
+        for migracion in pendientes:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                _aplicar(conn, migracion)
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+            salida(f'[{nombre}] migración {migracion.version} aplicada: {migracion.descripcion}')
+        if pendientes:
+            conn.execute('ANALYZE')
+        return user_version(conn)
+    finally:
+        conn.close()
+
+
+def migrate_all(rutas, dry_run=False, salida=logger.info):
+    """Migra todas las bases. ``rutas`` es un diccionario {nombre: ruta}."""
+    return {nombre: migrate(rutas[nombre], nombre, dry_run, salida)
+            for nombre in MIGRACIONES if rutas.get(nombre)}
+
+
+def init_app(app):
+    """Aplica las migraciones pendientes de las bases configuradas."""
+    migrate_all({
+        'users': app.config['USER_DB'],
+        'plants': app.config['PLANTS_DB'],
+        'main': app.config['MAIN_DB'],
+        'calc': app.config['CALC_DB'],
+    }, salida=app.logger.info)
@@ -0,0 +1,304 @@
+# modules/normative_cache.py
+"""Caché en memoria de las tablas normativas.
+
+Las tablas ``factores_correccion_temp``, ``ampacidad_cables`` y
+``reactancia_resistencia_cables`` se cargan una sola vez por proceso y se
+consultan en memoria:
+
+- Los rangos de temperatura se indexan como intervalos elementales ordenados,
+  de modo que cada búsqueda es una bisección.
+- La ampacidad se guarda como lista ordenada y se busca con ``bisect``.
+- Resistencia y reactancia quedan en un diccionario por calibre.
+
+La caché se invalida sola cuando cambia el archivo de la base de datos
+(inodo, tamaño o fecha de modificación) o su ``PRAGMA data_version``, que
+SQLite incrementa cada vez que otra conexión confirma cambios. Cada
+instantánea lleva una ``version`` (hash de su contenido) que identifica la
+normativa con la que se calculó un resultado; si una recarga produce el mismo
+contenido se conserva la instantánea anterior.
+
+Cuando ``data_version`` cambia se lee primero el contador ``normativa`` de
+la tabla ``versiones``, que incrementan triggers en cada INSERT, UPDATE o
+DELETE de las tablas normativas (``modules.migrations.sello_normativo``): si
+no cambió, otra tabla de la base fue la modificada y se conservan las tablas
+vigentes sin releerlas.
+
+Si se configura una instantánea binaria (``NORM_SNAPSHOT``, ver
+``modules.normative_snapshot``) las tablas indexadas y la rejilla de derating
+se mapean desde ese archivo en lugar de construirlas en cada proceso. La
+instantánea guarda el contador con el que se compiló y solo se usa si
+coincide con el actual, así que arrancar con ella no ejecuta los SELECT de
+las tablas. Si falta, no es válida, está desactualizada o la base no tiene
+contador se usa SQLite.
+"""
+
+import bisect
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+
+SQL_SELLO = "SELECT version FROM versiones WHERE tabla = 'normativa'"
+
+
+def leer_sello(conn):
+    """Contador de cambios de las tablas normativas o ``None`` si la base no lo tiene."""
+    try:
+        fila = conn.execute(SQL_SELLO).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return None if fila is None else fila[0]
+
+
+def version_normativa(temperaturas, ampacidades, impedancias):
+    """Hash del contenido de las filas de las tablas normativas."""
+    return hashlib.sha256(json.dumps(
+        [sorted(temperaturas), sorted(ampacidades), impedancias], default=str
+    ).encode('utf-8')).hexdigest()[:16]
+
+
+class TablasNormativas:
+    """Instantánea inmutable de las tablas normativas ya indexadas."""
+
+    # Rejilla de derating precompilada (instantánea binaria) y el origen con
+    # el que se compiló; ``None`` si las tablas se leyeron de SQLite
+    rejilla = None
+    origen_rejilla = None
+
+    def __init__(self, temperaturas, ampacidades, impedancias):
+        # temperaturas: filas (id, temp_min, temp_max, factor)
+        # ampacidades: filas (id, calibre, ampacidad)
+        # impedancias: filas (calibre, resistencia, reactancia)
+        self.version = version_normativa(temperaturas, ampacidades, impedancias)
+        self._indexar_temperaturas(temperaturas)
+        self._mapa = None
+
+        ordenadas = sorted(ampacidades, key=lambda fila: (fila[2], fila[0]))
+        self.calibres = [fila[1] for fila in ordenadas]
+        self.ampacidades = [fila[2] for fila in ordenadas]
+
+        self.impedancias = {}
+        for calibre, resistencia, reactancia in impedancias:
+            # Igual que el SELECT original: gana la primera fila encontrada
+            self.impedancias.setdefault(calibre, (resistencia, reactancia))
+
+    @classmethod
+    def from_arrays(cls, version, limites_temp, factor_en_limite, factor_en_tramo,
+                    calibres, ampacidades, impedancias, mapa=None):
+        """Instantánea a partir de estructuras ya indexadas (p. ej. vistas de un mmap).
+
+        ``impedancias`` es cualquier mapeo ``calibre -> (resistencia,
+        reactancia)``. ``mapa`` es el objeto que respalda los arreglos; se
+        conserva mientras viva la instantánea.
+        """
+        tablas = cls.__new__(cls)
+        tablas.version = version
+        tablas.limites_temp = limites_temp
+        tablas.factor_en_limite = factor_en_limite
+        tablas.factor_en_tramo = factor_en_tramo
+        tablas.calibres = list(calibres)
+        tablas.ampacidades = ampacidades
+        tablas.impedancias = impedancias
+        tablas._mapa = mapa
+        return tablas
+
+    def _indexar_temperaturas(self, filas):
+        """Construye el índice de intervalos elementales de temperatura.
+
+        Los extremos de todos los rangos dividen la recta en puntos y tramos
+        abiertos; para cada uno se guarda el factor de la primera fila (por
+        id) que lo cubre, reproduciendo exactamente el resultado de
+        ``WHERE temp_min <= ? AND temp_max >= ?`` aunque haya solapes.
+        """
+        filas = sorted(filas, key=lambda fila: fila[0])
+        limites = sorted({fila[1] for fila in filas} | {fila[2] for fila in filas})
+
+        def primer_factor(desde, hasta):
+            for _, temp_min, temp_max, factor in filas:
+                if temp_min <= desde and temp_max >= hasta:
+                    return factor
+            return None
+
+        self.limites_temp = limites
+        self.factor_en_limite = [primer_factor(t, t) for t in limites]
+        self.factor_en_tramo = [
+            primer_factor(limites[k], limites[k + 1]) for k in range(len(limites) - 1)
+        ]
+
+    def factor_temperatura(self, temperatura):
+        """Devuelve el factor de corrección para ``temperatura`` o ``None``."""
+        if temperatura != temperatura:  # NaN nunca cumple el rango en SQL
+            return None
+        limites = self.limites_temp
+        i = bisect.bisect_left(limites, temperatura)
+        if i < len(limites) and limites[i] == temperatura:
+            factor = self.factor_en_limite[i]
+        elif 0 < i < len(limites):
+            factor = self.factor_en_tramo[i - 1]
+        else:
+            return None
+        # En los arreglos de una instantánea binaria "sin factor" es NaN
+        return None if factor is None or factor != factor else factor
+
+    def calibre_para_corriente(self, corriente):
+        """Devuelve el menor calibre con ampacidad >= ``corriente`` o ``None``."""
+        if corriente != corriente:
+            return None
+        i = bisect.bisect_left(self.ampacidades, corriente)
+        if i == len(self.ampacidades):
+            return None
+        return self.calibres[i]
+
+    def resistencia_reactancia(self, calibre):
+        """Devuelve ``(resistencia, reactancia)`` del calibre o ``None``."""
+        return self.impedancias.get(calibre)
+
+
+class NormativeCache:
+    """Caché de proceso para una base de datos normativa concreta."""
+
+    def __init__(self, db_path, snapshot=None):
+        self.db_path = db_path
+        self.snapshot = snapshot
+        self._lock = threading.Lock()
+        self._conn = None
+        self._firma_archivo = None
+        self._data_version = None
+        self._sello = None
+        self._tablas = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidaciones = 0
+
+    def _conectar(self):
+        # Conexión dedicada solo a vigilar PRAGMA data_version; se comparte
+        # entre hilos bajo self._lock.
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _filas(self, conn):
+        temperaturas = conn.execute(
+            'SELECT id, temp_min, temp_max, factor FROM factores_correccion_temp'
+        ).fetchall()
+        ampacidades = conn.execute(
+            'SELECT id, calibre, ampacidad FROM ampacidad_cables'
+        ).fetchall()
+        impedancias = conn.execute(
+            'SELECT calibre, resistencia, reactancia FROM reactancia_resistencia_cables ORDER BY id'
+        ).fetchall()
+        return (
+            [tuple(fila) for fila in temperaturas],
+            [tuple(fila) for fila in ampacidades],
+            [tuple(fila) for fila in impedancias],
+        )
+
+    def cargar_sqlite(self):
+        """Lee las tablas de SQLite con una conexión propia, sin tocar la caché.
+
+        Returns:
+            tuple: ``(tablas, sello)``, leídos en la misma transacción.
+        """
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            conn.execute('BEGIN')
+            sello = leer_sello(conn)
+            return TablasNormativas(*self._filas(conn)), sello
+        finally:
+            conn.close()
+
+    def _desde_snapshot(self, sello):
+        """Tablas de la instantánea si es válida y del contador ``sello``; si no, ``None``."""
+        from modules.normative_snapshot import SnapshotError, load_snapshot
+
+        if not os.path.exists(self.snapshot):
+            return None
+        try:
+            return load_snapshot(self.snapshot, sello_esperado=sello)
+        except SnapshotError as e:
+            logging.warning('Instantánea normativa descartada, se usa SQLite: %s', e)
+            return None
+
+    def tablas(self):
+        """Devuelve las tablas vigentes, recargándolas si la BD cambió."""
+        with self._lock:
+            st = os.stat(self.db_path)
+            firma = (st.st_ino, st.st_size, st.st_mtime_ns)
+            if firma != self._firma_archivo and self._conn is not None:
+                # El archivo fue reemplazado o modificado: reabrir la conexión
+                self._conn.close()
+                self._conn = None
+            if self._conn is None:
+                self._conn = self._conectar()
+                self._firma_archivo = firma
+                self._data_version = None
+
+            data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+            if self._tablas is not None and data_version == self._data_version:
+                self.hits += 1
+                return self._tablas
+
+            self._data_version = data_version
+            sello = leer_sello(self._conn)
+            if self._tablas is not None and sello is not None and sello == self._sello:
+                # Otra tabla de la base cambió: se conserva la instantánea vigente
+                self.hits += 1
+                return self._tablas
+
+            tablas = self._desde_snapshot(sello) if self.snapshot and sello is not None else None
+            if tablas is None:
+                filas = self._filas(self._conn)
+                if self._tablas is not None and self._tablas.version == version_normativa(*filas):
+                    # Mismo contenido (p. ej. base sin contador): se conserva
+                    self._sello = sello
+                    self.hits += 1
+                    return self._tablas
+                tablas = TablasNormativas(*filas)
+
+            if self._tablas is not None:
+                self.invalidaciones += 1
+            self.misses += 1
+            self._tablas = tablas
+            self._sello = sello
+            return self._tablas
+
+    def invalidate(self):
+        """Descarta las tablas cargadas; la próxima consulta las relee."""
+        with self._lock:
+            if self._tablas is not None:
+                self.invalidaciones += 1
+            self._tablas = None
+
+    def stats(self):
+        """Contadores de aciertos, fallos e invalidaciones de la caché."""
+        return {
+            'db_path': self.db_path,
+            'snapshot': self.snapshot if self._tablas is not None and self._tablas._mapa is not None else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidaciones': self.invalidaciones,
+        }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_normative_cache(db_path, snapshot=None):
+    """Devuelve la caché compartida del proceso para ``db_path``.
+
+    ``snapshot`` es la ruta opcional de la instantánea binaria de esas tablas.
+    """
+    clave = os.path.abspath(db_path)
+    with _caches_lock:
+        cache = _caches.get(clave)
+        if cache is None:
+            cache = _caches[clave] = NormativeCache(db_path, snapshot)
+        elif snapshot and cache.snapshot != snapshot:
+            # Las tablas ya cargadas no vienen de esta instantánea
+            cache.snapshot = snapshot
+            cache.invalidate()
+        return cache
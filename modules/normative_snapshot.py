@@ -0,0 +1,249 @@
+# modules/normative_snapshot.py
+"""Instantánea binaria de las tablas normativas, compartida por mmap.
+
+``compile_snapshot`` lee las tablas normativas de ``NORM_DB`` una vez y las
+escribe ya indexadas (las mismas estructuras de ``TablasNormativas``) junto
+con la rejilla de derating (``modules.derating``) en un archivo binario:
+
+    cabecera  b'ELNSNAP\\0', formato (uint32), longitud del JSON (uint32)
+    JSON      contador de cambios de las tablas normativas de origen
+              (``sello``), versión normativa (hash de su contenido), SHA-256
+              de los datos, calibres, (desplazamiento, longitud) de cada
+              arreglo y los metadatos y el origen de la rejilla
+    datos     arreglos float64 little-endian alineados a 8 bytes
+
+``load_snapshot`` mapea el archivo en memoria y devuelve unas
+``TablasNormativas`` cuyos arreglos numéricos (factores de temperatura,
+ampacidades, resistencias, reactancias y la rejilla) son vistas sobre el
+mapa, sin copiarlos ni ejecutar SQL. Como el mapa es de solo lectura y
+respaldado por el archivo, todos los workers de un servidor pre-fork
+comparten la misma copia en la caché de páginas del sistema. Un formato
+distinto, una suma de verificación que no coincide o un ``sello`` distinto
+del contador actual de ``NORM_DB`` lanza ``SnapshotError`` y la caché
+normativa vuelve a leer SQLite.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+from collections.abc import Mapping
+
+import numpy as np
+
+from modules.derating import RejillaDerating, build_grid, sello_extendido
+from modules.normative_cache import TablasNormativas, get_normative_cache
+
+MAGIA = b'ELNSNAP\x00'
+FORMATO = 2
+CABECERA = struct.Struct('<8sII')
+ALINEACION = 8
+BYTES_FLOTANTE = 8
+
+ARREGLOS = ('limites_temp', 'factor_en_limite', 'factor_en_tramo', 'ampacidades',
+            'resistencias', 'reactancias', 'rejilla_ampacidad', 'rejilla_busqueda')
+CLAVES_CABECERA = ('sello', 'version', 'sha256', 'calibres', 'calibres_impedancia',
+                   'arreglos', 'rejilla')
+
+
+class SnapshotError(Exception):
+    """La instantánea no existe, es de otro formato o está corrupta."""
+
+
+class _Impedancias(Mapping):
+    """``calibre -> (resistencia, reactancia)`` leído de las vistas del mapa."""
+
+    def __init__(self, calibres, resistencias, reactancias):
+        self._indice = {calibre: i for i, calibre in enumerate(calibres)}
+        self._resistencias = resistencias
+        self._reactancias = reactancias
+
+    def __getitem__(self, calibre):
+        i = self._indice[calibre]
+        return float(self._resistencias[i]), float(self._reactancias[i])
+
+    def __iter__(self):
+        return iter(self._indice)
+
+    def __len__(self):
+        return len(self._indice)
+
+
+def _flotantes(valores):
+    return np.array([np.nan if v is None else v for v in valores], dtype='<f8')
+
+
+def write_snapshot(tablas, sello, rejilla, origen_rejilla, destino):
+    """Escribe ``tablas`` y su ``rejilla`` en ``destino`` (reemplazo atómico). Devuelve la versión.
+
+    Args:
+        tablas: ``TablasNormativas`` de origen.
+        sello: Contador de cambios de las tablas normativas leídas.
+        rejilla: ``RejillaDerating`` construida para esas tablas.
+        origen_rejilla: ``[sello de normative_data.db, material, aislante]``
+            con los que se construyó la rejilla.
+        destino: Archivo de la instantánea.
+    """
+    calibres_impedancia = list(tablas.impedancias)
+    arreglos = {
+        'limites_temp': _flotantes(tablas.limites_temp),
+        'factor_en_limite': _flotantes(tablas.factor_en_limite),
+        'factor_en_tramo': _flotantes(tablas.factor_en_tramo),
+        'ampacidades': _flotantes(tablas.ampacidades),
+        'resistencias': _flotantes(tablas.impedancias[c][0] for c in calibres_impedancia),
+        'reactancias': _flotantes(tablas.impedancias[c][1] for c in calibres_impedancia),
+        'rejilla_ampacidad': np.ascontiguousarray(rejilla.ampacidad, dtype='<f8').ravel(),
+        'rejilla_busqueda': np.ascontiguousarray(rejilla._busqueda, dtype='<f8').ravel(),
+    }
+    posiciones = {}
+    datos = bytearray()
+    for nombre in ARREGLOS:
+        posiciones[nombre] = (len(datos), len(arreglos[nombre]))
+        datos += arreglos[nombre].tobytes()
+
+    cabecera = json.dumps({
+        'sello': sello,
+        'version': tablas.version,
+        'sha256': hashlib.sha256(datos).hexdigest(),
+        'calibres': tablas.calibres,
+        'calibres_impedancia': calibres_impedancia,
+        'arreglos': posiciones,
+        'rejilla': {
+            'origen': origen_rejilla,
+            'version': rejilla.version,
+            'material': rejilla.material,
+            'aislante': rejilla.aislante,
+            'materiales': rejilla.materiales,
+            'aislantes': rejilla.aislantes,
+            'calibres': rejilla.calibres[:, :, :-1].tolist(),
+            'temp_inicial': rejilla.temp_inicial,
+            'max_conductores': rejilla.max_conductores,
+            'forma': list(rejilla.ampacidad.shape),
+        },
+    }).encode('utf-8')
+    relleno = -(CABECERA.size + len(cabecera)) % ALINEACION
+    cabecera += b' ' * relleno
+
+    temporal = f'{destino}.tmp'
+    with open(temporal, 'wb') as f:
+        f.write(CABECERA.pack(MAGIA, FORMATO, len(cabecera)))
+        f.write(cabecera)
+        f.write(datos)
+    os.replace(temporal, destino)
+    return tablas.version
+
+
+def compile_snapshot(norm_db, destino, normative_data_db=None, material=None, aislante=None):
+    """Compila las tablas normativas de ``norm_db`` y su rejilla en ``destino``. Devuelve la versión.
+
+    ``normative_data_db``, ``material`` y ``aislante`` son los de
+    ``modules.derating.get_derating_grid`` (``NORMATIVE_DATA_DB``,
+    ``DERATING_MATERIAL``, ``DERATING_TEMPERATURA_AISLANTE``); la rejilla de
+    la instantánea solo se usa con esa misma configuración.
+    """
+    tablas, sello = get_normative_cache(norm_db).cargar_sqlite()
+    if sello is None:
+        raise SnapshotError(f'{norm_db} no tiene contador de cambios normativos; '
+                            'aplique las migraciones antes de compilar')
+    origen = [sello_extendido(normative_data_db), material, aislante]
+    rejilla = build_grid(norm_db, normative_data_db, material, aislante, tablas)
+    return write_snapshot(tablas, sello, rejilla, origen, destino)
+
+
+def _cabecera(mapa, sello_esperado):
+    """Valida el mapa y devuelve ``(cabecera, inicio de los datos)``."""
+    if len(mapa) < CABECERA.size:
+        raise SnapshotError('Instantánea truncada')
+    magia, formato, longitud = CABECERA.unpack_from(mapa, 0)
+    if magia != MAGIA:
+        raise SnapshotError('El archivo no es una instantánea normativa')
+    if formato != FORMATO:
+        raise SnapshotError(f'Formato de instantánea {formato}, se esperaba {FORMATO}')
+    inicio = CABECERA.size + longitud
+    try:
+        cabecera = json.loads(mapa[CABECERA.size:inicio])
+    except ValueError:
+        raise SnapshotError('Cabecera de instantánea ilegible') from None
+    if not isinstance(cabecera, dict) or any(clave not in cabecera for clave in CLAVES_CABECERA):
+        raise SnapshotError('Cabecera de instantánea incompleta')
+    if sello_esperado is not None and cabecera['sello'] != sello_esperado:
+        raise SnapshotError(f'Instantánea del contador {cabecera["sello"]}, las tablas '
+                            f'actuales son el {sello_esperado}; vuelva a compilarla')
+    with memoryview(mapa) as vista:
+        suma = hashlib.sha256(vista[inicio:]).hexdigest()
+    if suma != cabecera['sha256']:
+        raise SnapshotError('La suma de verificación de la instantánea no coincide')
+    for nombre in ARREGLOS:
+        desplazamiento, n = cabecera['arreglos'].get(nombre, (-1, 0))
+        if desplazamiento < 0 or inicio + desplazamiento + n * BYTES_FLOTANTE > len(mapa):
+            raise SnapshotError(f'Arreglo {nombre} fuera de la instantánea')
+    forma = cabecera['rejilla']['forma']
+    if int(np.prod(forma)) != cabecera['arreglos']['rejilla_ampacidad'][1]:
+        raise SnapshotError('Forma de la rejilla inconsistente')
+    return cabecera, inicio
+
+
+def load_snapshot(ruta, sello_esperado=None):
+    """Mapea ``ruta`` y devuelve sus ``TablasNormativas`` (con ``rejilla``).
+
+    Args:
+        ruta: Archivo de la instantánea.
+        sello_esperado: Contador de cambios actual de las tablas normativas
+            de ``NORM_DB``; si se indica, la instantánea debe haberse
+            compilado con él.
+
+    Raises:
+        SnapshotError: Si falta el archivo, el formato no coincide, la
+            instantánea está desactualizada o los datos no corresponden a la
+            suma de verificación. El mapa se cierra antes de lanzarla.
+    """
+    try:
+        with open(ruta, 'rb') as f:
+            mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as e:
+        raise SnapshotError(f'No se pudo abrir la instantánea {ruta}: {e}') from None
+
+    try:
+        cabecera, inicio = _cabecera(mapa, sello_esperado)
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        mapa.close()
+        raise SnapshotError(f'Cabecera de instantánea inválida: {e!r}') from None
+    except BaseException:
+        mapa.close()
+        raise
+
+    def arreglo(nombre, forma=None):
+        desplazamiento, n = cabecera['arreglos'][nombre]
+        # Vista sobre el mapa: sin copia
+        vista = np.frombuffer(mapa, dtype='<f8', count=n, offset=inicio + desplazamiento)
+        return vista if forma is None else vista.reshape(forma)
+
+    datos_rejilla = cabecera['rejilla']
+    forma = tuple(datos_rejilla['forma'])
+    tablas = TablasNormativas.from_arrays(
+        cabecera['version'],
+        limites_temp=arreglo('limites_temp'),
+        factor_en_limite=arreglo('factor_en_limite'),
+        factor_en_tramo=arreglo('factor_en_tramo'),
+        calibres=cabecera['calibres'],
+        ampacidades=arreglo('ampacidades'),
+        impedancias=_Impedancias(cabecera['calibres_impedancia'],
+                                 arreglo('resistencias'), arreglo('reactancias')),
+        mapa=mapa,
+    )
+    tablas.rejilla = RejillaDerating.from_arrays(
+        datos_rejilla['version'],
+        materiales=datos_rejilla['materiales'],
+        aislantes=datos_rejilla['aislantes'],
+        calibres=datos_rejilla['calibres'],
+        temp_inicial=datos_rejilla['temp_inicial'],
+        max_conductores=datos_rejilla['max_conductores'],
+        ampacidad=arreglo('rejilla_ampacidad', forma),
+        busqueda=arreglo('rejilla_busqueda', forma),
+        material=datos_rejilla['material'],
+        aislante=datos_rejilla['aislante'],
+        mapa=mapa,
+    )
+    tablas.origen_rejilla = datos_rejilla['origen']
+    return tablas
@@ -0,0 +1,172 @@
+# modules/page_cache.py
+"""Versiones de tablas, GET condicional y caché de páginas renderizadas.
+
+Cada base tiene una tabla ``versiones`` con un contador por tabla de datos.
+Las rutas que escriben llaman a ``bump_version`` después de confirmar sus
+cambios. Las páginas de listados derivan su ETag de esas versiones y de todo
+lo que cambia el HTML para el usuario: ruta y argumentos, idioma, rol,
+usuario y token CSRF de la sesión. Si el navegador envía un ETag vigente se
+responde 304 sin consultar ni renderizar; si no, se busca el HTML en una
+caché en memoria antes de renderizarlo.
+
+La validación es solo por ETag: la fecha de la última escritura no refleja
+los cambios de idioma, rol, usuario o token, así que no se envía
+``Last-Modified`` y una petición con solo ``If-Modified-Since`` recibe la
+página completa.
+
+El HTML incluye el token CSRF, que caduca tras ``WTF_CSRF_TIME_LIMIT``
+segundos, por eso la clave también incluye un periodo de media vida del
+token: una página servida desde caché nunca lleva un token a punto de
+caducar.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+from flask_babel import get_locale
+from flask_wtf.csrf import generate_csrf
+
+from modules.db import get_db
+
+MAX_PAGINAS_DEFECTO = 512
+
+SQL_VERSION = 'SELECT version, modificado FROM versiones WHERE tabla = ?'
+SQL_BUMP = '''
+    INSERT INTO versiones (tabla, version, modificado) VALUES (?, 1, ?)
+    ON CONFLICT(tabla) DO UPDATE SET version = version + 1, modificado = excluded.modificado
+'''
+
+
+def bump_version(nombre_db, tabla):
+    """Incrementa el contador de ``tabla``; llamar después del commit de la escritura."""
+    conn = get_db(nombre_db)
+    conn.execute(SQL_BUMP, (tabla, time.time()))
+    conn.commit()
+
+
+def table_version(nombre_db, tabla):
+    """Devuelve ``(version, modificado)`` de ``tabla``; ``(0, None)`` si nunca se escribió."""
+    fila = get_db(nombre_db).execute(SQL_VERSION, (tabla,)).fetchone()
+    return (fila[0], fila[1]) if fila else (0, None)
+
+
+class PageCache:
+    """Caché LRU en memoria de páginas renderizadas, por clave de ETag."""
+
+    def __init__(self, max_paginas=MAX_PAGINAS_DEFECTO):
+        self.max_paginas = max_paginas
+        self._paginas = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def obtener(self, clave):
+        with self._lock:
+            html = self._paginas.get(clave)
+            if html is None:
+                self.misses += 1
+                return None
+            self._paginas.move_to_end(clave)
+            self.hits += 1
+            return html
+
+    def guardar(self, clave, html):
+        with self._lock:
+            self._paginas[clave] = html
+            self._paginas.move_to_end(clave)
+            while len(self._paginas) > self.max_paginas:
+                self._paginas.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._paginas.clear()
+
+    def stats(self):
+        """Contadores de aciertos, fallos y respuestas 304."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'not_modified': self.not_modified,
+            'paginas': len(self._paginas),
+            'max_paginas': self.max_paginas,
+        }
+
+
+_cache = PageCache()
+
+
+def get_page_cache():
+    """Devuelve la caché de páginas del proceso."""
+    return _cache
+
+
+def init_app(app):
+    """Ajusta el tamaño de la caché con ``PAGE_CACHE_MAX_ENTRIES``."""
+    _cache.max_paginas = app.config.get('PAGE_CACHE_MAX_ENTRIES', MAX_PAGINAS_DEFECTO)
+
+
+def _periodo_csrf():
+    limite = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    if not limite:
+        return 0
+    return int(time.time() // max(limite // 2, 1))
+
+
+def _clave(tablas):
+    versiones = [table_version(nombre_db, tabla) for nombre_db, tabla in tablas]
+    csrf = session.get('csrf_token') or ''
+    datos = [
+        request.full_path,
+        [v[0] for v in versiones],
+        str(get_locale()),
+        session.get('role'),
+        session.get('user_id'),
+        session.get('username'),
+        hashlib.sha256(csrf.encode('utf-8')).hexdigest()[:16],
+        _periodo_csrf(),
+    ]
+    clave = hashlib.sha256(json.dumps(datos, default=str).encode('utf-8')).hexdigest()[:32]
+    return clave
+
+
+def conditional_page(*tablas):
+    """Decorador de vistas GET que dependen de ``tablas`` (pares ``(base, tabla)``).
+
+    Solo se guardan en caché las respuestas HTML renderizadas (la vista
+    devuelve un ``str``); las redirecciones pasan sin tocar. Si hay mensajes
+    flash pendientes la página se renderiza normalmente, para mostrarlos.
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or session.get('_flashes'):
+                return vista(*args, **kwargs)
+
+            # Asegurar el token CSRF de la sesión antes de calcular la clave
+            generate_csrf()
+            clave = _clave(tablas)
+            if request.if_none_match.contains(clave):
+                with _cache._lock:
+                    _cache.not_modified += 1
+                respuesta = make_response('', 304)
+            else:
+                html = _cache.obtener(clave)
+                if html is None:
+                    html = vista(*args, **kwargs)
+                    if not isinstance(html, str):
+                        return html
+                    _cache.guardar(clave, html)
+                respuesta = make_response(html)
+
+            respuesta.set_etag(clave)
+            respuesta.headers['Cache-Control'] = 'private, no-cache'
+            respuesta.vary.update(('Cookie', 'Accept-Language'))
+            return respuesta
+        return wrapper
+    return decorador
@@ -0,0 +1,92 @@
+# modules/pagination.py
+"""Paginación por cursor (keyset) para los listados.
+
+En lugar de ``OFFSET`` cada página continúa después de la última fila de la
+anterior: ``WHERE (nombre, id) > (?, ?) ORDER BY nombre, id LIMIT n``. Con
+un índice sobre las columnas de orden la consulta lee solo las filas de la
+página, así que su costo no crece con el tamaño de la tabla.
+
+El cursor es la clave de ordenación de la última fila, serializada en JSON y
+codificada en base64 para usarla en la URL (``?cursor=...``).
+"""
+
+import base64
+import binascii
+import json
+from collections import namedtuple
+from dataclasses import asdict, is_dataclass
+
+TAMANO_PAGINA = 50
+TAMANO_PAGINA_MAXIMO = 200
+
+Pagina = namedtuple('Pagina', 'items siguiente')
+
+
+def encode_cursor(valores):
+    datos = json.dumps(list(valores), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(datos).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, columnas):
+    """Devuelve la lista de valores del cursor, o ``None`` si falta o no es válido."""
+    if not cursor:
+        return None
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+    except (ValueError, binascii.Error):
+        return None
+    if not isinstance(valores, list) or len(valores) != columnas:
+        return None
+    return valores
+
+
+def page_params(args):
+    """Lee ``cursor`` y ``limite`` de los argumentos de la petición."""
+    try:
+        limite = int(args.get('limite', TAMANO_PAGINA))
+    except (TypeError, ValueError):
+        limite = TAMANO_PAGINA
+    return args.get('cursor') or None, max(1, min(limite, TAMANO_PAGINA_MAXIMO))
+
+
+def keyset_page(conn, select, orden, filtros=None, cursor=None, limite=TAMANO_PAGINA):
+    """Ejecuta una consulta paginada por cursor y devuelve una ``Pagina``.
+
+    Args:
+        conn: Conexión SQLite con ``row_factory = sqlite3.Row``.
+        select: ``SELECT ... FROM ...`` sin ``WHERE`` ni ``ORDER BY``.
+        orden: Columnas de ordenación; la última debe ser única (normalmente ``id``).
+            Se pueden calificar (``p.nombre``); en la fila se leen por su nombre sin prefijo.
+        filtros: Diccionario {columna: valor} de igualdades; los valores vacíos se ignoran.
+    """
+    condiciones, valores = [], []
+    for columna, valor in (filtros or {}).items():
+        if valor not in (None, ''):
+            condiciones.append(f'{columna} = ?')
+            valores.append(valor)
+
+    clave = decode_cursor(cursor, len(orden))
+    if clave is not None:
+        condiciones.append(f"({', '.join(orden)}) > ({', '.join('?' * len(orden))})")
+        valores.extend(clave)
+
+    sql = select
+    if condiciones:
+        sql += ' WHERE ' + ' AND '.join(condiciones)
+    sql += f" ORDER BY {', '.join(orden)} LIMIT ?"
+    valores.append(limite + 1)
+
+    filas = conn.execute(sql, valores).fetchall()
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        ultima = filas[-1]
+        siguiente = encode_cursor(ultima[columna.split('.')[-1]] for columna in orden)
+    return Pagina(filas, siguiente)
+
+
+def page_json(pagina):
+    """Convierte una ``Pagina`` (filas o dataclasses) en un diccionario serializable."""
+    items = [asdict(item) if is_dataclass(item) else dict(item) for item in pagina.items]
+    return {'items': items, 'siguiente': pagina.siguiente}
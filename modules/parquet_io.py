@@ -0,0 +1,177 @@
+# modules/parquet_io.py
+"""Importación y exportación en Parquet (Arrow) de datos de cálculo.
+
+- ``import_equipment_parquet`` lee solo las columnas reconocidas del archivo
+  (proyección) y lo recorre por lotes de registros, sin cargarlo completo;
+  la validación y el guardado son los de ``modules.importer``.
+- ``write_results_parquet`` e ``iter_results_parquet`` exportan los
+  resultados guardados (``resultados_calculo``) con columnas tipadas:
+  números como float64/int32 y calibre, canalización y estado como
+  categóricas (diccionario). Cada bloque del cursor se escribe como un grupo
+  de filas, así la memoria no crece con el tamaño del proyecto.
+"""
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from modules.importer import MAX_ERRORES, TAMANO_BLOQUE, _mapear_encabezado, import_rows
+
+FILAS_POR_GRUPO = 64 * 1024
+
+_CATEGORICA = pa.dictionary(pa.int16(), pa.string())
+
+# Columnas exportables de resultados_calculo, en orden
+ESQUEMA_RESULTADOS = pa.schema([
+    ('tag', pa.string()),
+    ('descripcion', pa.string()),
+    ('corriente', pa.float64()),
+    ('temperatura', pa.float64()),
+    ('longitud', pa.float64()),
+    ('voltaje', pa.float64()),
+    ('num_conductores', pa.int32()),
+    ('calibre', _CATEGORICA),
+    ('caida_tension', pa.float64()),
+    ('canalizacion', _CATEGORICA),
+    ('estado', _CATEGORICA),
+    ('error', pa.string()),
+])
+
+
+def import_equipment_parquet(origen, db_path, proyecto_id,
+                             tamano_bloque=TAMANO_BLOQUE, max_errores=MAX_ERRORES):
+    """Importa la lista de equipos de un archivo Parquet en la tabla ``equipment``.
+
+    Los nombres de columna se reconocen igual que los encabezados del Excel.
+    El número de fila del reporte es la posición del registro (desde 1).
+
+    Args:
+        origen: Ruta o archivo binario (con ``seek``) del Parquet.
+        db_path: Ruta de la base de datos principal.
+        proyecto_id: Proyecto al que se asignan los equipos.
+        tamano_bloque: Registros por lote leído y por transacción.
+        max_errores: Máximo de errores detallados en el reporte.
+
+    Returns:
+        ImportReport: Contadores de filas y errores por fila.
+
+    Raises:
+        ValueError: Si el archivo no es Parquet o falta una columna obligatoria.
+    """
+    try:
+        archivo = pq.ParquetFile(origen)
+    except pa.ArrowException as e:
+        raise ValueError(f'Archivo Parquet inválido: {e}') from None
+    nombres = archivo.schema_arrow.names
+    por_posicion = _mapear_encabezado(nombres)
+    # Proyección: solo se leen las columnas reconocidas
+    columnas = sorted(set(por_posicion.values()))
+    indices = {c: columnas.index(i) for c, i in por_posicion.items()}
+
+    def filas():
+        num_fila = 1
+        for lote in archivo.iter_batches(batch_size=tamano_bloque,
+                                         columns=[nombres[i] for i in columnas]):
+            for fila in zip(*(columna.to_pylist() for columna in lote.columns)):
+                yield num_fila, fila
+                num_fila += 1
+
+    try:
+        return import_rows(filas(), indices, db_path, proyecto_id, tamano_bloque, max_errores)
+    finally:
+        archivo.close()
+
+
+def _esquema(columnas):
+    if columnas is None:
+        return ESQUEMA_RESULTADOS
+    desconocidas = [c for c in columnas if c not in ESQUEMA_RESULTADOS.names]
+    if desconocidas:
+        raise ValueError(f'Columnas no exportables: {", ".join(desconocidas)}')
+    return pa.schema([ESQUEMA_RESULTADOS.field(c) for c in columnas])
+
+
+def _lotes(calc, proyecto_id, esquema, filas_por_grupo):
+    """Lotes de registros de los resultados del proyecto, leídos del cursor por bloques."""
+    # Los nombres vienen del esquema fijo, no de la petición
+    cursor = calc.execute(
+        f'SELECT {", ".join(esquema.names)} FROM resultados_calculo '
+        'WHERE proyecto_id = ? ORDER BY tag',
+        (proyecto_id,)
+    )
+    while True:
+        filas = cursor.fetchmany(filas_por_grupo)
+        if not filas:
+            break
+        valores = zip(*filas)
+        yield pa.record_batch([pa.array(v, type=campo.type) for campo, v in zip(esquema, valores)],
+                              schema=esquema)
+
+
+def write_results_parquet(calc, proyecto_id, destino, columnas=None,
+                          filas_por_grupo=FILAS_POR_GRUPO):
+    """Escribe los resultados del proyecto en ``destino`` (ruta o archivo binario).
+
+    Args:
+        calc: Conexión a calculations.db.
+        proyecto_id: Proyecto a exportar.
+        destino: Ruta o archivo binario abierto.
+        columnas: Columnas de ``ESQUEMA_RESULTADOS`` a exportar; por defecto todas.
+        filas_por_grupo: Filas por grupo de filas de Parquet.
+
+    Returns:
+        int: Número de filas escritas.
+
+    Raises:
+        ValueError: Si se pide una columna que no existe.
+    """
+    esquema = _esquema(columnas)
+    escritas = 0
+    with pq.ParquetWriter(destino, esquema, compression='zstd') as writer:
+        for lote in _lotes(calc, proyecto_id, esquema, filas_por_grupo):
+            writer.write_batch(lote)
+            escritas += lote.num_rows
+    return escritas
+
+
+class _Bloques:
+    """Destino de escritura que acumula bytes hasta que se recogen."""
+
+    closed = False
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def recoger(self):
+        datos = b''.join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def iter_results_parquet(calc, proyecto_id, columnas=None, filas_por_grupo=FILAS_POR_GRUPO):
+    """Genera el Parquet de resultados en bloques de bytes, uno por grupo de filas.
+
+    Raises:
+        ValueError: Si se pide una columna que no existe (antes del primer bloque).
+    """
+    esquema = _esquema(columnas)
+
+    def generar():
+        destino = _Bloques()
+        with pq.ParquetWriter(destino, esquema, compression='zstd') as writer:
+            for lote in _lotes(calc, proyecto_id, esquema, filas_por_grupo):
+                writer.write_batch(lote)
+                yield destino.recoger()
+        # Pie del archivo (metadatos de los grupos de filas)
+        yield destino.recoger()
+
+    return generar()
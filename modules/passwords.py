@@ -0,0 +1,196 @@
+# modules/passwords.py
+"""Verificación de contraseñas con bcrypt y limitación de intentos de login.
+
+bcrypt libera el GIL mientras calcula el hash, así que las verificaciones se
+ejecutan en un pool de hilos dedicado (``BCRYPT_MAX_WORKERS``). El pool solo
+acota la concurrencia: limita cuántos núcleos se dedican a bcrypt en una
+ráfaga de logins, pero el hilo de la petición sigue esperando el resultado
+(hasta ``BCRYPT_TIMEOUT``), así que no libera el worker. Si ya hay
+``BCRYPT_MAX_QUEUE`` verificaciones esperando, la nueva se rechaza al
+instante en lugar de ocupar un hilo más. El resto de peticiones (dashboards,
+listados) sigue teniendo CPU.
+
+``LoginThrottle`` cuenta los intentos fallidos en una ventana deslizante por
+usuario y por IP, y se consulta antes de llegar a bcrypt: un ataque de
+fuerza bruta no consume CPU de hashing, y los usuarios legítimos detrás de
+una misma IP (NAT, oficina) no se bloquean por sus logins correctos. Los
+fallos se guardan en la tabla ``login_fallos`` de users.db, así el límite es
+el mismo con cualquier número de workers de gunicorn. La IP es
+``request.remote_addr``: detrás de un proxy inverso hay que configurar
+``PROXY_FIX_X_FOR`` para que sea la del cliente y no la del proxy.
+"""
+
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout
+
+import bcrypt
+
+from modules import metrics
+
+
+def _a_bytes(valor):
+    return valor.encode('utf-8') if isinstance(valor, str) else valor
+
+
+def hash_rounds(hashed):
+    """Factor de trabajo de un hash bcrypt (``$2b$12$...`` -> 12)."""
+    try:
+        return int(_a_bytes(hashed).split(b'$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """Pool acotado para ``bcrypt.checkpw``/``hashpw``."""
+
+    def __init__(self, rounds=12, max_workers=2, max_queue=16, timeout=10):
+        self.rounds = rounds
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bcrypt')
+        # Plazas = en ejecución + en cola
+        self._plazas = threading.BoundedSemaphore(max_workers + max_queue)
+        self._hash_ficticio = None
+        self._lock = threading.Lock()
+
+    def _ejecutar(self, operacion, rounds, funcion, *args):
+        """Ejecuta ``funcion`` en el pool y espera su resultado.
+
+        El hilo que llama queda bloqueado hasta que termina (o hasta
+        ``timeout``): el pool acota cuántos hashes corren a la vez, no libera
+        al llamador.
+        """
+        if not self._plazas.acquire(blocking=False):
+            raise OverflowError('Demasiadas verificaciones de contraseña en curso')
+        encolado = time.perf_counter()
+
+        def tarea():
+            inicio = time.perf_counter()
+            metrics.PASSWORD_QUEUE_WAIT.observe(inicio - encolado, operacion=operacion)
+            try:
+                return funcion(*args)
+            finally:
+                metrics.PASSWORD_HASH_SECONDS.observe(time.perf_counter() - inicio,
+                                                      operacion=operacion, rounds=rounds)
+                self._plazas.release()
+
+        futuro = self._executor.submit(tarea)
+        try:
+            return futuro.result(timeout=self.timeout)
+        except FuturesTimeout:
+            raise TimeoutError('La verificación de contraseña tardó demasiado') from None
+
+    def verify(self, password, hashed):
+        """``True`` si ``password`` corresponde a ``hashed``."""
+        # El coste de verificar lo fija el factor del hash guardado, no el configurado
+        return self._ejecutar('verify', hash_rounds(hashed), bcrypt.checkpw,
+                              _a_bytes(password), _a_bytes(hashed))
+
+    def verify_dummy(self, password):
+        """Verifica ``password`` contra un hash ficticio y devuelve ``False``.
+
+        Para usuarios inexistentes: el login tarda lo mismo que con un
+        usuario real y el tiempo de respuesta no revela qué nombres existen.
+        """
+        with self._lock:
+            if self._hash_ficticio is None:
+                self._hash_ficticio = bcrypt.hashpw(b'', bcrypt.gensalt(self.rounds))
+        self._ejecutar('verify', self.rounds, bcrypt.checkpw,
+                       _a_bytes(password), self._hash_ficticio)
+        return False
+
+    def hash(self, password):
+        """Hash bcrypt de ``password`` con el factor de trabajo configurado."""
+        return self._ejecutar('hash', self.rounds,
+                              lambda p: bcrypt.hashpw(p, bcrypt.gensalt(self.rounds)),
+                              _a_bytes(password))
+
+    def needs_rehash(self, hashed):
+        """``True`` si ``hashed`` se generó con un factor distinto del configurado."""
+        return hash_rounds(hashed) != self.rounds
+
+
+SQL_FALLOS = '''
+    SELECT COUNT(*), MIN(momento) FROM login_fallos
+    WHERE tipo = ? AND clave = ? AND momento > ?
+'''
+
+
+class LoginThrottle:
+    """Ventana deslizante de intentos fallidos de login por usuario y por IP.
+
+    El estado vive en ``login_fallos`` (``db_path``, users.db), compartido por
+    todos los procesos; cada operación abre una conexión corta.
+    """
+
+    def __init__(self, db_path, ventana=900, max_fallos_usuario=5, max_fallos_ip=30):
+        self.db_path = db_path
+        self.ventana = ventana
+        self.max_fallos_usuario = max_fallos_usuario
+        self.max_fallos_ip = max_fallos_ip
+        self.bloqueos = 0
+
+    def _conectar(self):
+        return closing(sqlite3.connect(self.db_path, timeout=5))
+
+    def retry_after(self, usuario, ip):
+        """Segundos de espera si el intento debe rechazarse; 0 si se permite."""
+        ahora = time.time()
+        desde = ahora - self.ventana
+        espera = 0
+        with self._conectar() as conn:
+            for tipo, clave, maximo in (('usuario', (usuario or '').lower(), self.max_fallos_usuario),
+                                        ('ip', ip or '', self.max_fallos_ip)):
+                fallos, primero = conn.execute(SQL_FALLOS, (tipo, clave, desde)).fetchone()
+                if fallos >= maximo:
+                    espera = max(espera, primero + self.ventana - ahora)
+        if espera > 0:
+            self.bloqueos += 1
+            return int(espera) + 1
+        return 0
+
+    def failed(self, usuario, ip):
+        ahora = time.time()
+        with self._conectar() as conn, conn:
+            conn.executemany('INSERT INTO login_fallos (tipo, clave, momento) VALUES (?, ?, ?)',
+                             [('usuario', (usuario or '').lower(), ahora), ('ip', ip or '', ahora)])
+            # Los fallos fuera de la ventana ya no cuentan
+            conn.execute('DELETE FROM login_fallos WHERE momento <= ?', (ahora - self.ventana,))
+
+    def succeeded(self, usuario):
+        # Los fallos de la IP se conservan: un login correcto no libera al resto de la IP
+        with self._conectar() as conn, conn:
+            conn.execute("DELETE FROM login_fallos WHERE tipo = 'usuario' AND clave = ?",
+                         ((usuario or '').lower(),))
+
+
+_hasher = None
+_throttle = None
+
+
+def get_hasher():
+    return _hasher
+
+
+def get_throttle():
+    return _throttle
+
+
+def init_app(app):
+    """Crea el pool de bcrypt y el limitador con la configuración de la aplicación."""
+    global _hasher, _throttle
+    _hasher = PasswordHasher(
+        rounds=app.config['BCRYPT_ROUNDS'],
+        max_workers=app.config['BCRYPT_MAX_WORKERS'],
+        max_queue=app.config['BCRYPT_MAX_QUEUE'],
+        timeout=app.config['BCRYPT_TIMEOUT'],
+    )
+    _throttle = LoginThrottle(
+        app.config['USER_DB'],
+        ventana=app.config['LOGIN_WINDOW_SECONDS'],
+        max_fallos_usuario=app.config['LOGIN_MAX_FAILURES_USER'],
+        max_fallos_ip=app.config['LOGIN_MAX_FAILURES_IP'],
+    )
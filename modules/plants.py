@@ -1,11 +1,15 @@
 # modules/plants.py
 
 from flask import (Blueprint, render_template, request, redirect, 
-                   url_for, flash, session, g)
+                   url_for, flash, session, jsonify)
 import sqlite3
-import logging
 from functools import wraps
 
+from modules.db import get_db
+from modules.page_cache import bump_version, conditional_page
+from modules.pagination import page_json, page_params
+from modules.repository import get_repository
+
 # Decorador para requerir rol de Ingeniero o Administrador
 def engineer_or_admin_required(f):
     @wraps(f)
@@ -23,22 +27,25 @@ plants_bp = Blueprint('plants', __name__, url_prefix='/plants')
 
 @plants_bp.route('/', methods=['GET', 'POST'])
 @engineer_or_admin_required
+@conditional_page(('plants', 'plants'))
 def manage_plants():
     """Muestra la lista de plantas y maneja la creación de nuevas plantas."""
     if request.method == 'POST':
-        logging.warning(f'Request form data: {request.form}')
         # Lógica para crear una nueva planta
         try:
             elevacion = request.form.get('elevacion')
             humedad = request.form.get('humedad')
+            temperatura = request.form.get('temperatura_ambiente')
 
-            g.plants_db.execute(
-                'INSERT INTO plants (nombre, cliente, sigla, pais, elevacion, humedad, medium_voltage, low_voltage, control_voltage) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            get_db('plants').execute(
+                'INSERT INTO plants (nombre, cliente, sigla, pais, elevacion, humedad, medium_voltage, low_voltage, control_voltage, temperatura_ambiente) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
                 (request.form['nombre'], request.form['cliente'], request.form['sigla'], 
                  request.form['pais'], elevacion if elevacion else None, humedad if humedad else None,
-                 request.form.get('medium_voltage'), request.form.get('low_voltage'), request.form.get('control_voltage'))
+                 request.form.get('medium_voltage'), request.form.get('low_voltage'), request.form.get('control_voltage'),
+                 temperatura if temperatura else None)
             )
-            g.plants_db.commit()
+            get_db('plants').commit()
+            bump_version('plants', 'plants')
             flash(f"Planta '{request.form['nombre']}' creada exitosamente.", 'success')
         except sqlite3.IntegrityError:
             flash('Ya existe una planta con ese nombre.', 'danger')
@@ -46,9 +53,25 @@ def manage_plants():
             flash(f'Error al crear la planta: {e}', 'danger')
         return redirect(url_for('plants.manage_plants'))
 
-    # Lógica para mostrar la lista de plantas
-    plants = g.plants_db.execute('SELECT * FROM plants ORDER BY nombre').fetchall()
-    return render_template('plants.html', plants=plants, template_name='plants.html')
+    # Lógica para mostrar la lista de plantas (una página, con filtros)
+    pagina = _pagina_plantas()
+    return render_template('plants.html', plants=pagina.items, siguiente=pagina.siguiente,
+                           template_name='plants.html')
+
+@plants_bp.route('/api', methods=['GET'])
+@engineer_or_admin_required
+def list_plants():
+    """Página de plantas en JSON para la carga incremental."""
+    return jsonify(page_json(_pagina_plantas()))
+
+def _pagina_plantas():
+    """Página de plantas según los argumentos cliente, pais, cursor y limite."""
+    cursor, limite = page_params(request.args)
+    return get_repository().plants_page(
+        cliente=request.args.get('cliente', '').strip(),
+        pais=request.args.get('pais', '').strip(),
+        cursor=cursor, limite=limite
+    )
 
 @plants_bp.route('/edit/<int:id>', methods=['POST'])
 @engineer_or_admin_required
@@ -57,13 +80,16 @@ def edit_plant(id):
     try:
         elevacion = request.form.get('elevacion')
         humedad = request.form.get('humedad')
-        g.plants_db.execute(
-            'UPDATE plants SET nombre=?, cliente=?, sigla=?, pais=?, elevacion=?, humedad=?, medium_voltage=?, low_voltage=?, control_voltage=? WHERE id=?',
+        temperatura = request.form.get('temperatura_ambiente')
+        get_db('plants').execute(
+            'UPDATE plants SET nombre=?, cliente=?, sigla=?, pais=?, elevacion=?, humedad=?, medium_voltage=?, low_voltage=?, control_voltage=?, temperatura_ambiente=? WHERE id=?',
             (request.form['nombre'], request.form['cliente'], request.form['sigla'],
              request.form['pais'], elevacion if elevacion else None, humedad if humedad else None, 
-             request.form.get('medium_voltage'), request.form.get('low_voltage'), request.form.get('control_voltage'), id)
+             request.form.get('medium_voltage'), request.form.get('low_voltage'), request.form.get('control_voltage'),
+             temperatura if temperatura else None, id)
         )
-        g.plants_db.commit()
+        get_db('plants').commit()
+        bump_version('plants', 'plants')
         flash('Planta actualizada exitosamente.', 'success')
     except Exception as e:
         flash(f'Error al editar la planta: {e}', 'danger')
@@ -74,8 +100,9 @@ def edit_plant(id):
 def delete_plant(id):
     """Maneja la eliminación de una planta."""
     try:
-        g.plants_db.execute('DELETE FROM plants WHERE id = ?', (id,))
-        g.plants_db.commit()
+        get_db('plants').execute('DELETE FROM plants WHERE id = ?', (id,))
+        get_db('plants').commit()
+        bump_version('plants', 'plants')
         flash('Planta eliminada exitosamente.', 'success')
     except Exception as e:
         flash(f'Error al eliminar la planta: {e}', 'danger')
@@ -1,10 +1,22 @@
 # modules/projects.py
 
+import math
+
 from flask import (Blueprint, render_template, request, redirect, 
-                   url_for, flash, session, current_app)
-import sqlite3
+                   url_for, flash, session, current_app, jsonify, Response,
+                   stream_with_context)
 from functools import wraps
 
+from modules import circuit_tree, raceways, results_store
+from modules.exports import iter_revit_csv
+from modules.batch_sizing import NUM_CONDUCTORES_DEFECTO, optimize_circuits
+from modules.db import get_db
+from modules.importer import import_equipment_xlsx
+from modules.parquet_io import import_equipment_parquet, iter_results_parquet
+from modules.page_cache import bump_version, conditional_page
+from modules.pagination import page_json, page_params
+from modules.repository import get_repository
+
 # Decorador para requerir rol de Ingeniero o Administrador
 def engineer_or_admin_required(f):
     @wraps(f)
@@ -19,14 +31,13 @@ def engineer_or_admin_required(f):
 projects_bp = Blueprint('projects', __name__, url_prefix='/projects')
 
 def get_main_db_connection():
-    """Conecta a la base de datos principal."""
-    conn = sqlite3.connect(current_app.config['MAIN_DB'])
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Conexión a la base de datos principal para la petición actual."""
+    return get_db('main')
 
 @projects_bp.route('/', defaults={'planta_id': None}, methods=['GET'])
 @projects_bp.route('/<int:planta_id>', methods=['GET', 'POST'])
 @engineer_or_admin_required
+@conditional_page(('plants', 'plants'), ('main', 'projects'), ('main', 'equipment'))
 def manage_projects(planta_id):
     """
     Muestra y gestiona los proyectos. Si no se especifica una planta,
@@ -34,9 +45,7 @@ def manage_projects(planta_id):
     """
     if planta_id is None:
         # Si no se proporciona planta_id, mostrar página de selección de planta
-        conn = get_main_db_connection()
-        plants = conn.execute('SELECT * FROM plants ORDER BY nombre').fetchall()
-        conn.close()
+        plants = get_repository().plants()
         return render_template('select_plant_for_projects.html', plants=plants)
 
     # Lógica para crear un nuevo proyecto para esta planta
@@ -52,27 +61,198 @@ def manage_projects(planta_id):
                     (nombre_proyecto, planta_id)
                 )
                 conn.commit()
+                bump_version('main', 'projects')
                 flash(f"Proyecto '{nombre_proyecto}' creado exitosamente.", 'success')
             except Exception as e:
                 flash(f'Error al crear el proyecto: {e}', 'danger')
-            finally:
-                if conn:
-                    conn.close()
         return redirect(url_for('projects.manage_projects', planta_id=planta_id))
 
     # Lógica para mostrar la lista de proyectos de la planta
-    conn = get_main_db_connection()
+    repo = get_repository()
     # Obtener datos de la planta para mostrar su nombre
-    planta = conn.execute('SELECT * FROM plants WHERE id = ?', (planta_id,)).fetchone()
-    # Obtener la lista de proyectos de esa planta
-    projects = conn.execute('SELECT * FROM projects WHERE planta_id = ? ORDER BY nombre', (planta_id,)).fetchall()
-    conn.close()
-
+    planta = repo.plant(planta_id)
     if not planta:
         flash('La planta especificada no existe.', 'danger')
         return redirect(url_for('plants.manage_plants'))
 
-    return render_template('projects.html', projects=projects, planta=planta, template_name='projects.html')
+    # Proyectos de la planta con su número de equipos (una página)
+    cursor, limite = page_params(request.args)
+    pagina = repo.projects_summary_page(planta_id, cursor, limite)
+
+    return render_template('projects.html', projects=pagina.items, siguiente=pagina.siguiente,
+                           planta=planta, template_name='projects.html')
+
+@projects_bp.route('/<int:planta_id>/api', methods=['GET'])
+@engineer_or_admin_required
+def list_projects(planta_id):
+    """Página de proyectos de una planta en JSON para la carga incremental."""
+    cursor, limite = page_params(request.args)
+    return jsonify(page_json(get_repository().projects_summary_page(planta_id, cursor, limite)))
+
+@projects_bp.route('/<int:proyecto_id>/results', methods=['GET'])
+@engineer_or_admin_required
+def project_results(proyecto_id):
+    """Resultados guardados del proyecto, recalculando solo los equipos con entradas nuevas."""
+    calc = get_db('calc')
+    actualizacion = results_store.refresh(get_db('datos'), calc, proyecto_id)
+    return jsonify({
+        'actualizacion': actualizacion.to_dict(),
+        'estados': results_store.status_counts(calc, proyecto_id),
+        'resultados': results_store.load_results(calc, proyecto_id),
+    })
+
+@projects_bp.route('/<int:proyecto_id>/optimize', methods=['GET'])
+@engineer_or_admin_required
+def optimize_project(proyecto_id):
+    """Calibre mínimo por ampacidad y caída de tensión de cada equipo del proyecto.
+
+    El límite de caída se toma del argumento ``limite`` o de ``VOLTAGE_DROP_LIMIT``.
+    """
+    try:
+        limite = float(request.args.get('limite', current_app.config['VOLTAGE_DROP_LIMIT']))
+    except ValueError:
+        return jsonify({'error': 'Límite de caída inválido'}), 400
+    if not limite > 0:
+        return jsonify({'error': 'Límite de caída inválido'}), 400
+
+    filas = [fila for fila in get_db('datos').execute(results_store.SQL_ENTRADAS, (proyecto_id,))
+             if None not in (fila[3], fila[4], fila[5], fila[6])]
+    lote = optimize_circuits(
+        [f[3] for f in filas], [f[4] for f in filas], [f[5] for f in filas], [f[6] for f in filas],
+        limite, [f[7] or NUM_CONDUCTORES_DEFECTO for f in filas],
+    )
+
+    def numero(valor):
+        return None if math.isnan(valor) else round(float(valor), 2)
+
+    return jsonify({'limite': limite, 'circuitos': [{
+        'ID_Equipo': fila[1],
+        'Calibre': lote['Calibre'][i],
+        'Calibre_Ampacidad': lote['Calibre_Ampacidad'][i],
+        'Caida_Tension': numero(lote['Caida_Tension'][i]),
+        'Longitud_Maxima': numero(lote['Longitud_Maxima'][i]),
+        'Canalizacion': lote['Canalizacion'][i],
+        'Estado': lote['Estado'][i],
+        'Error': lote['Error'][i],
+    } for i, fila in enumerate(filas)]})
+
+@projects_bp.route('/<int:proyecto_id>/raceways', methods=['GET'])
+@engineer_or_admin_required
+def project_raceways(proyecto_id):
+    """Canalizaciones del proyecto por grupo de ruta (``?tipo=tuberia|bandeja``)."""
+    tipo = request.args.get('tipo', 'tuberia')
+    if tipo not in raceways.TIPOS:
+        return jsonify({'error': f'Tipo de canalización {tipo} no soportado'}), 400
+    datos, calc = get_db('datos'), get_db('calc')
+    results_store.refresh(datos, calc, proyecto_id)
+    grupos = dict(datos.execute('SELECT id, grupo_ruta FROM main.equipment WHERE proyecto_id = ?',
+                                (proyecto_id,)).fetchall())
+    tags = {}
+    circuitos = []
+    for equipo_id, tag, calibre, conductores in results_store.sized_circuits(calc, proyecto_id):
+        tags[equipo_id] = tag
+        circuitos.append((equipo_id, grupos.get(equipo_id), calibre, conductores))
+    try:
+        empaquetado = raceways.pack_project(circuitos, tipo)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    respuesta = []
+    for grupo, canalizaciones in empaquetado.items():
+        for canalizacion in canalizaciones:
+            fila = canalizacion.to_dict()
+            fila['grupo_ruta'] = grupo
+            fila['circuitos'] = [tags[equipo_id] for equipo_id in canalizacion.circuitos]
+            respuesta.append(fila)
+    return jsonify({'tipo': tipo, 'canalizaciones': respuesta})
+
+@projects_bp.route('/<int:proyecto_id>/export/revit.csv', methods=['GET'])
+@engineer_or_admin_required
+def export_revit(proyecto_id):
+    """CSV de Revit/Eplan del proyecto como respuesta fragmentada (``?gzip=1`` para comprimir)."""
+    comprimir = request.args.get('gzip') == '1'
+    calc = get_db('calc')
+    # El recálculo (escritura) termina antes de responder; en el stream solo se lee el cursor
+    results_store.refresh(get_db('datos'), calc, proyecto_id)
+    filas = results_store.iter_results(calc, proyecto_id)
+
+    nombre = f'proyecto_{proyecto_id}_revit.csv' + ('.gz' if comprimir else '')
+    return Response(stream_with_context(iter_revit_csv(filas, comprimir)),
+                    mimetype='application/gzip' if comprimir else 'text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={nombre}',
+                             'X-Accel-Buffering': 'no'})
+
+@projects_bp.route('/<int:proyecto_id>/export/results.parquet', methods=['GET'])
+@engineer_or_admin_required
+def export_results_parquet(proyecto_id):
+    """Resultados del proyecto en Parquet (``?columnas=tag,calibre,...`` para proyectar)."""
+    columnas = request.args.get('columnas')
+    calc = get_db('calc')
+    results_store.refresh(get_db('datos'), calc, proyecto_id)
+    try:
+        bloques = iter_results_parquet(calc, proyecto_id, columnas.split(',') if columnas else None)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return Response(stream_with_context(bloques), mimetype='application/vnd.apache.parquet',
+                    headers={'Content-Disposition':
+                             f'attachment; filename=proyecto_{proyecto_id}_resultados.parquet'})
+
+@projects_bp.route('/<int:proyecto_id>/circuits', methods=['GET'])
+@engineer_or_admin_required
+def list_circuits(proyecto_id):
+    """Árbol de circuitos del proyecto con la caída de tensión acumulada."""
+    arbol = circuit_tree.load_project(get_main_db_connection(), proyecto_id)
+    return jsonify({'circuitos': arbol.to_list()})
+
+@projects_bp.route('/<int:proyecto_id>/circuits', methods=['POST'])
+@engineer_or_admin_required
+def add_circuit(proyecto_id):
+    """Crea un circuito (JSON) y devuelve su ID y su caída acumulada."""
+    if get_repository().project(proyecto_id) is None:
+        return jsonify({'error': 'Proyecto no encontrado'}), 404
+    conn = get_main_db_connection()
+    try:
+        campos = circuit_tree.parse_fields(
+            request.get_json(silent=True),
+            circuit_tree.CAMPOS_OBLIGATORIOS + ('padre_id', 'equipo_id'),
+            circuit_tree.CAMPOS_OBLIGATORIOS,
+        )
+        circuito_id = circuit_tree.add_circuit(conn, proyecto_id, **campos)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    bump_version('main', 'circuitos')
+    fila = conn.execute('SELECT caida, caida_acumulada FROM circuitos WHERE id = ?',
+                        (circuito_id,)).fetchone()
+    return jsonify({'id': circuito_id, 'caida': fila['caida'],
+                    'caida_acumulada': fila['caida_acumulada']}), 201
+
+@projects_bp.route('/<int:proyecto_id>/circuits/recompute', methods=['POST'])
+@engineer_or_admin_required
+def recompute_circuits(proyecto_id):
+    """Recalcula la caída acumulada de todos los circuitos del proyecto."""
+    try:
+        arbol = circuit_tree.recompute_project(get_main_db_connection(), proyecto_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    bump_version('main', 'circuitos')
+    return jsonify({'circuitos': arbol.to_list()})
+
+@projects_bp.route('/<int:proyecto_id>/circuits/<int:circuito_id>', methods=['POST'])
+@engineer_or_admin_required
+def update_circuit(proyecto_id, circuito_id):
+    """Modifica un circuito (JSON) y devuelve su subárbol recalculado."""
+    conn = get_main_db_connection()
+    fila = conn.execute('SELECT proyecto_id FROM circuitos WHERE id = ?', (circuito_id,)).fetchone()
+    if fila is None or fila['proyecto_id'] != proyecto_id:
+        return jsonify({'error': 'Circuito no encontrado'}), 404
+    try:
+        cambios = circuit_tree.parse_fields(request.get_json(silent=True),
+                                            circuit_tree.CAMPOS_EDITABLES)
+        recalculados = circuit_tree.update_circuit(conn, circuito_id, **cambios)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    bump_version('main', 'circuitos')
+    return jsonify({'circuitos': recalculados})
 
 @projects_bp.route('/edit/<int:id>', methods=['POST'])
 @engineer_or_admin_required
@@ -87,12 +267,10 @@ def edit_project(id):
         conn = get_main_db_connection()
         conn.execute('UPDATE projects SET nombre = ? WHERE id = ?', (nombre_proyecto, id))
         conn.commit()
+        bump_version('main', 'projects')
         flash('Proyecto actualizado exitosamente.', 'success')
     except Exception as e:
         flash(f'Error al editar el proyecto: {e}', 'danger')
-    finally:
-        if conn:
-            conn.close()
     return redirect(url_for('projects.manage_projects', planta_id=planta_id))
 
 @projects_bp.route('/delete/<int:id>', methods=['POST'])
@@ -104,11 +282,35 @@ def delete_project(id):
         conn = get_main_db_connection()
         conn.execute('DELETE FROM projects WHERE id = ?', (id,))
         conn.commit()
+        bump_version('main', 'projects')
         flash('Proyecto eliminado exitosamente.', 'success')
     except Exception as e:
         flash(f'Error al eliminar el proyecto: {e}', 'danger')
-    finally:
-        if conn:
-            conn.close()
     return redirect(url_for('projects.manage_projects', planta_id=planta_id))
 
+
+
+@projects_bp.route('/<int:proyecto_id>/import', methods=['POST'])
+@engineer_or_admin_required
+def import_equipment(proyecto_id):
+    """Importa la lista de equipos de un proyecto desde un archivo .xlsx o .parquet."""
+    planta_id = request.form['planta_id'] # Necesitamos saber a qué planta volver
+    archivo = request.files.get('archivo')
+    nombre = archivo.filename.lower() if archivo else ''
+    if not nombre.endswith(('.xlsx', '.parquet')):
+        flash('Selecciona un archivo Excel (.xlsx) o Parquet (.parquet).', 'warning')
+        return redirect(url_for('projects.manage_projects', planta_id=planta_id))
+    importar = import_equipment_parquet if nombre.endswith('.parquet') else import_equipment_xlsx
+    try:
+        reporte = importar(archivo.stream, current_app.config['MAIN_DB'], proyecto_id)
+    except Exception as e:
+        flash(f'Error al importar equipos: {e}', 'danger')
+    else:
+        if reporte.insertados or reporte.actualizados:
+            bump_version('main', 'equipment')
+        categoria = 'warning' if reporte.total_errores else 'success'
+        flash(f'Importación completada: {reporte.insertados} nuevos, {reporte.actualizados} '
+              f'actualizados, {reporte.total_errores} filas con errores.', categoria)
+        for error in reporte.errores[:5]:
+            flash(f"Fila {error['fila']}: {error['error']}", 'warning')
+    return redirect(url_for('projects.manage_projects', planta_id=planta_id))
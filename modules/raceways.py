@@ -0,0 +1,218 @@
+# modules/raceways.py
+"""Canalizaciones compartidas: ocupación NEC y empaquetado de circuitos.
+
+Este módulo es el único catálogo de áreas de conductor y de canalizaciones:
+``calculations.dimension_channel`` (y su versión vectorizada en
+``batch_sizing``) dimensiona la tubería de un circuito con
+``smallest_raceway``, y aquí se agrupan circuitos de calibres mezclados en
+tuberías o bandejas compartidas, así un circuito solo recibe la misma
+tubería en ambos casos:
+
+- Las áreas de los conductores (THHN, NEC capítulo 9 tabla 5) y los
+  catálogos de tuberías (EMT, tabla 4) y bandejas (tabla 392.22(A)) son
+  tablas de módulo; para otro producto basta con otra tabla.
+- La ocupación máxima de una tubería sigue NEC capítulo 9 tabla 1: 53% con
+  un conductor, 31% con dos y 40% con tres o más. En bandejas se limita la
+  suma de áreas al área admisible del ancho.
+- ``pack_circuits`` reparte un grupo de ruta en el menor número de
+  canalizaciones con la heurística first-fit decreasing (circuitos de mayor
+  área primero, cada uno en la primera canalización donde cabe) y después
+  reduce cada canalización al tamaño de catálogo más pequeño que la admite.
+"""
+
+import bisect
+import hashlib
+import json
+from collections import namedtuple
+
+# Área de conductor aislado THHN/THWN-2 (mm²)
+AREAS_CONDUCTOR = {
+    '14 AWG': 6.258,
+    '12 AWG': 8.581,
+    '10 AWG': 13.61,
+    '8 AWG': 23.61,
+    '6 AWG': 32.71,
+    '4 AWG': 53.16,
+    '2 AWG': 73.16,
+    '1/0': 119.7,
+    '2/0': 143.4,
+    '3/0': 172.8,
+    '4/0': 208.8,
+}
+
+Canal = namedtuple('Canal', 'nombre area')
+
+# Tuberías EMT: área interna total (mm²), ordenadas de menor a mayor
+CATALOGO_TUBERIAS = (
+    Canal('1/2"', 196),
+    Canal('3/4"', 344),
+    Canal('1"', 557),
+    Canal('1-1/4"', 965),
+    Canal('1-1/2"', 1313),
+    Canal('2"', 2165),
+    Canal('2-1/2"', 3779),
+    Canal('3"', 5707),
+    Canal('3-1/2"', 7448),
+    Canal('4"', 9518),
+)
+
+# Bandejas tipo escalera: área de ocupación admisible por ancho (mm²)
+CATALOGO_BANDEJAS = (
+    Canal('150 mm', 4516),
+    Canal('225 mm', 6774),
+    Canal('300 mm', 9032),
+    Canal('450 mm', 13548),
+    Canal('600 mm', 18064),
+    Canal('750 mm', 22580),
+    Canal('900 mm', 27097),
+)
+
+TIPOS = ('tuberia', 'bandeja')
+
+# NEC capítulo 9 tabla 1: ocupación de tuberías por número de conductores
+OCUPACION_TUBERIA = {1: 0.53, 2: 0.31}
+OCUPACION_TUBERIA_VARIOS = 0.40
+
+ERROR_EXCEDE = 'El circuito excede la mayor canalización del catálogo'
+
+# Huella de las tablas de este módulo: forma parte de la huella de los
+# resultados guardados (modules/results_store.py)
+VERSION_CATALOGO = hashlib.sha256(json.dumps(
+    [AREAS_CONDUCTOR, CATALOGO_TUBERIAS, CATALOGO_BANDEJAS, OCUPACION_TUBERIA, OCUPACION_TUBERIA_VARIOS]
+).encode('utf-8')).hexdigest()[:16]
+
+
+def fill_factor(conductores, tipo='tuberia'):
+    """Fracción ocupable de la canalización según el número de conductores."""
+    if tipo == 'bandeja':
+        return 1.0
+    return OCUPACION_TUBERIA.get(conductores, OCUPACION_TUBERIA_VARIOS)
+
+
+def conductor_area(calibre):
+    """Área del conductor aislado de ``calibre`` (mm²)."""
+    if calibre not in AREAS_CONDUCTOR:
+        raise ValueError(f'Calibre {calibre} no soportado')
+    return AREAS_CONDUCTOR[calibre]
+
+
+def _catalogo(tipo):
+    if tipo not in TIPOS:
+        raise ValueError(f'Tipo de canalización {tipo} no soportado')
+    return CATALOGO_TUBERIAS if tipo == 'tuberia' else CATALOGO_BANDEJAS
+
+
+def smallest_raceway(area, conductores, tipo='tuberia'):
+    """Canalización más pequeña del catálogo que admite ``area`` mm² de conductores.
+
+    Devuelve ``None`` si ni la mayor del catálogo la admite.
+    """
+    catalogo = _catalogo(tipo)
+    # Área de catálogo mínima necesaria; el catálogo está ordenado por área
+    necesaria = area / fill_factor(conductores, tipo)
+    i = bisect.bisect_left([canal.area for canal in catalogo], necesaria)
+    return catalogo[i] if i < len(catalogo) else None
+
+
+class Canalizacion:
+    """Una tubería o bandeja con los circuitos asignados."""
+
+    __slots__ = ('tipo', 'canal', 'circuitos', 'conductores', 'area_ocupada', 'error')
+
+    def __init__(self, tipo):
+        self.tipo = tipo
+        self.canal = None
+        self.circuitos = []
+        self.conductores = 0
+        self.area_ocupada = 0.0
+        self.error = None
+
+    def admite(self, area, conductores, capacidad):
+        """``True`` si el circuito cabe en una canalización de ``capacidad`` mm²."""
+        total = self.conductores + conductores
+        return self.area_ocupada + area <= capacidad * fill_factor(total, self.tipo)
+
+    def agregar(self, circuito_id, area, conductores):
+        self.circuitos.append(circuito_id)
+        self.area_ocupada += area
+        self.conductores += conductores
+
+    @property
+    def ocupacion(self):
+        """Fracción del área de la canalización ocupada por conductores."""
+        return self.area_ocupada / self.canal.area if self.canal else None
+
+    def to_dict(self):
+        return {
+            'tipo': self.tipo,
+            'canalizacion': self.canal.nombre if self.canal else None,
+            'circuitos': self.circuitos,
+            'conductores': self.conductores,
+            'area_ocupada': round(self.area_ocupada, 2),
+            'ocupacion': round(self.ocupacion, 4) if self.canal else None,
+            'error': self.error,
+        }
+
+
+def pack_circuits(circuitos, tipo='tuberia'):
+    """Reparte circuitos en el menor número de canalizaciones (first-fit decreasing).
+
+    Args:
+        circuitos: Iterable de ``(id, calibre, num_conductores)``.
+        tipo: ``'tuberia'`` o ``'bandeja'``.
+
+    Returns:
+        list[Canalizacion]: Canalizaciones ya reducidas al tamaño de catálogo
+        mínimo. Un circuito que no cabe ni en la mayor canalización queda solo
+        y con ``error``.
+
+    Raises:
+        ValueError: Si un calibre o el tipo no están soportados.
+    """
+    capacidad = _catalogo(tipo)[-1].area
+    items = sorted(
+        ((conductor_area(calibre) * conductores, conductores, circuito_id)
+         for circuito_id, calibre, conductores in circuitos),
+        key=lambda item: item[0], reverse=True,
+    )
+
+    canalizaciones = []
+    for area, conductores, circuito_id in items:
+        for canalizacion in canalizaciones:
+            if canalizacion.admite(area, conductores, capacidad):
+                break
+        else:
+            canalizacion = Canalizacion(tipo)
+            canalizaciones.append(canalizacion)
+        canalizacion.agregar(circuito_id, area, conductores)
+
+    for canalizacion in canalizaciones:
+        canalizacion.canal = smallest_raceway(canalizacion.area_ocupada, canalizacion.conductores, tipo)
+        if canalizacion.canal is None:
+            canalizacion.error = ERROR_EXCEDE
+    return canalizaciones
+
+
+def pack_project(circuitos, tipo='tuberia'):
+    """Empaqueta todos los grupos de ruta de un proyecto en una sola pasada.
+
+    Args:
+        circuitos: Iterable de ``(id, grupo, calibre, num_conductores)``. Los
+            circuitos sin grupo (``None``) van cada uno en su canalización.
+        tipo: ``'tuberia'`` o ``'bandeja'``.
+
+    Returns:
+        dict: ``{grupo: [Canalizacion, ...]}``; los circuitos sin grupo
+        quedan bajo la clave ``None``.
+    """
+    grupos = {}
+    for circuito_id, grupo, calibre, conductores in circuitos:
+        grupos.setdefault(grupo, []).append((circuito_id, calibre, conductores))
+
+    resultado = {}
+    for grupo, miembros in grupos.items():
+        if grupo is None:
+            resultado[None] = [canal for miembro in miembros for canal in pack_circuits([miembro], tipo)]
+        else:
+            resultado[grupo] = pack_circuits(miembros, tipo)
+    return resultado
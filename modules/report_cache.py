@@ -0,0 +1,225 @@
+# modules/report_cache.py
+"""Caché de reportes direccionada por contenido.
+
+Cada reporte se identifica por un hash SHA-256 de sus entradas: formato,
+versión de la plantilla, proyecto, opciones y la lista de resultados. Si se
+pide de nuevo un reporte con las mismas entradas se devuelve el archivo ya
+generado, sin volver a construirlo.
+
+Los archivos viven en ``reports/cache``. Se expulsan por antigüedad (TTL,
+contado desde que se generaron) y, si el directorio supera el presupuesto de
+disco, por uso menos reciente (LRU, según la fecha de último acceso que se
+actualiza en cada acierto).
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+
+from modules import metrics
+
+DIRECTORIO_REPORTES = 'reports'
+DIRECTORIO_CACHE = os.path.join(DIRECTORIO_REPORTES, 'cache')
+MAX_BYTES_DEFECTO = int(os.environ.get('REPORT_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+TTL_DEFECTO = int(os.environ.get('REPORT_CACHE_TTL', 7 * 24 * 3600))
+
+
+class ReportCache:
+    """Directorio de artefactos con expulsión LRU/TTL y contadores."""
+
+    def __init__(self, directorio=DIRECTORIO_CACHE, max_bytes=MAX_BYTES_DEFECTO, ttl=TTL_DEFECTO):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bypass = 0
+
+    def clave(self, formato, version, proyecto_id, resultados, opciones):
+        """Hash de todas las entradas que determinan el contenido del reporte."""
+        h = hashlib.sha256()
+        h.update(json.dumps([formato, version, proyecto_id, opciones],
+                            sort_keys=True, default=str).encode('utf-8'))
+        for r in resultados:
+            h.update(json.dumps(r, sort_keys=True, default=str).encode('utf-8'))
+        return h.hexdigest()[:32]
+
+    def ruta(self, clave, proyecto_id, extension):
+        return os.path.join(self.directorio, f'proyecto_{proyecto_id}_{clave}{extension}')
+
+    def obtener(self, ruta):
+        """Devuelve ``ruta`` si el artefacto existe y no ha expirado."""
+        try:
+            st = os.stat(ruta)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        ahora = time.time()
+        if ahora - st.st_mtime > self.ttl:
+            self._eliminar(ruta)
+            with self._lock:
+                self.misses += 1
+            return None
+        # Marcar el uso para la política LRU sin tocar la fecha de creación
+        os.utime(ruta, (ahora, st.st_mtime))
+        with self._lock:
+            self.hits += 1
+        return ruta
+
+    def guardar(self, generado, ruta):
+        """Mueve el archivo recién generado a la caché y aplica la expulsión."""
+        os.makedirs(self.directorio, exist_ok=True)
+        os.replace(generado, ruta)
+        self.expulsar()
+        return ruta
+
+    def _eliminar(self, ruta):
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self.evictions += 1
+
+    def _archivos(self):
+        archivos = []
+        try:
+            entradas = os.scandir(self.directorio)
+        except FileNotFoundError:
+            return archivos
+        with entradas:
+            for entrada in entradas:
+                if entrada.is_file():
+                    st = entrada.stat()
+                    archivos.append((st.st_atime, st.st_mtime, st.st_size, entrada.path))
+        return archivos
+
+    def expulsar(self):
+        """Elimina los artefactos expirados y los menos usados sobre el presupuesto."""
+        ahora = time.time()
+        vigentes = []
+        for atime, mtime, size, ruta in self._archivos():
+            if ahora - mtime > self.ttl:
+                self._eliminar(ruta)
+            else:
+                vigentes.append((atime, size, ruta))
+
+        total = sum(size for _, size, _ in vigentes)
+        for _, size, ruta in sorted(vigentes):
+            if total <= self.max_bytes:
+                break
+            self._eliminar(ruta)
+            total -= size
+
+    def stats(self):
+        """Contadores de aciertos, fallos, expulsiones y uso de disco."""
+        archivos = self._archivos()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'bypass': self.bypass,
+            'archivos': len(archivos),
+            'bytes': sum(a[2] for a in archivos),
+            'max_bytes': self.max_bytes,
+            'ttl': self.ttl,
+        }
+
+
+_cache = ReportCache()
+
+
+def get_report_cache():
+    """Devuelve la caché de reportes del proceso."""
+    return _cache
+
+
+def configure(max_bytes=None, ttl=None, directorio=None):
+    """Ajusta el presupuesto de disco, el TTL o el directorio de la caché."""
+    if max_bytes is not None:
+        _cache.max_bytes = max_bytes
+    if ttl is not None:
+        _cache.ttl = ttl
+    if directorio is not None:
+        _cache.directorio = directorio
+
+
+def init_app(app):
+    """Configura la caché con ``REPORT_CACHE_MAX_BYTES`` y ``REPORT_CACHE_TTL``."""
+    configure(app.config.get('REPORT_CACHE_MAX_BYTES'), app.config.get('REPORT_CACHE_TTL'))
+
+
+def new_report_file(proyecto_id, extension, directorio=DIRECTORIO_REPORTES):
+    """Crea un archivo vacío con nombre único para un reporte y devuelve su ruta.
+
+    El nombre lleva la fecha y un sufijo aleatorio, así dos trabajos del
+    mismo proyecto en el mismo segundo no escriben el mismo archivo; el
+    reporte terminado se mueve a la caché con ``os.replace``.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    prefijo = f'proyecto_{proyecto_id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}_'
+    with tempfile.NamedTemporaryFile(dir=directorio, prefix=prefijo, suffix=extension,
+                                     delete=False) as archivo:
+        return archivo.name
+
+
+class _FilasConProgreso:
+    """Envuelve los resultados y avisa a ``progreso`` en cada fila recorrida."""
+
+    def __init__(self, resultados, progreso):
+        self._resultados = resultados
+        self._progreso = progreso
+
+    def __len__(self):
+        return len(self._resultados)
+
+    def __iter__(self):
+        total = len(self._resultados)
+        for i, r in enumerate(self._resultados, 1):
+            self._progreso(i, total)
+            yield r
+
+
+def cached_report(formato, extension, version):
+    """Decorador para funciones ``f(resultados, proyecto_id, ...) -> ruta``.
+
+    Si ``resultados`` es una lista o tupla, el reporte se busca primero en la
+    caché; con cualquier otro iterable no se puede calcular el hash sin
+    consumirlo y la llamada pasa directa. El argumento opcional ``progreso``
+    recibe ``(fila, total)`` a medida que la función recorre los resultados.
+    """
+    def decorador(func):
+        @wraps(func)
+        def wrapper(resultados, proyecto_id, *args, progreso=None, **opciones):
+            cache = get_report_cache()
+            inicio = time.perf_counter()
+            if not isinstance(resultados, (list, tuple)):
+                with cache._lock:
+                    cache.bypass += 1
+                generado = func(resultados, proyecto_id, *args, **opciones)
+                metrics.REPORT_DURATION.observe(time.perf_counter() - inicio,
+                                                formato=formato, cache='bypass')
+                return generado
+
+            clave = cache.clave(formato, version, proyecto_id, resultados, [args, opciones])
+            ruta = cache.ruta(clave, proyecto_id, extension)
+            if cache.obtener(ruta):
+                metrics.REPORT_DURATION.observe(time.perf_counter() - inicio,
+                                                formato=formato, cache='hit')
+                return ruta
+
+            filas = _FilasConProgreso(resultados, progreso) if progreso else resultados
+            generado = func(filas, proyecto_id, *args, **opciones)
+            metrics.REPORT_DURATION.observe(time.perf_counter() - inicio,
+                                            formato=formato, cache='miss')
+            return cache.guardar(generado, ruta)
+        return wrapper
+    return decorador
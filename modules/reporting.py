@@ -2,20 +2,171 @@ from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.platypus import (SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle,
+                                LongTable, PageBreak)
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+from openpyxl.utils import get_column_letter
 from datetime import datetime
-import os
+from itertools import chain, islice
 
-def generate_pdf_report(resultados, proyecto_id):
-    """Genera un reporte PDF con los resultados de los cálculos."""
-    # Crear directorio reports si no existe
-    if not os.path.exists('reports'):
-        os.makedirs('reports')
-    
-    # Nombre del archivo
-    filename = f'reports/proyecto_{proyecto_id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
+from modules.calculations import estado_caida
+from modules.report_cache import cached_report, new_report_file
+
+# Versiones de las plantillas; cambiarlas invalida los reportes en caché
+VERSION_PLANTILLA_PDF = 1
+VERSION_PLANTILLA_EXCEL = 1
+
+# Encabezados de las tablas de resultados
+ENCABEZADOS = ['ID', 'Descripción', 'Corriente (A)', 'Calibre', '%Caída', 'Canalización', 'Estado']
+
+# Modos de generate_pdf_report
+MODOS_PDF = ('completo', 'grande', 'resumen', 'apendice')
+
+# A partir de este número de filas se usa el modo 'grande' por defecto
+UMBRAL_PDF_GRANDE = 500
+
+# Filas de datos por tabla en el modo 'grande' (una tabla por página)
+FILAS_POR_PAGINA_PDF = 40
+
+# Anchos fijos de columna (pt) para el modo 'grande'; suman el ancho útil de
+# una hoja carta con márgenes de 1", así ReportLab no mide cada celda.
+ANCHOS_COLUMNAS_PDF = [62, 132, 56, 50, 46, 60, 62]
+MAX_CARACTERES_DESCRIPCION_PDF = 30
+
+ESTILO_TABLA_PDF = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 10),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+# Estilo compacto compartido por todas las tablas del modo 'grande'
+ESTILO_TABLA_PDF_GRANDE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 8),
+    ('LEADING', (0, 0), (-1, -1), 10),
+    ('TOPPADDING', (0, 0), (-1, -1), 2),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.beige, colors.white]),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.black)
+])
+
+def _fila_pdf(r):
+    """Valores de una fila de la tabla PDF."""
+    return [
+        r['ID_Equipo'],
+        r['Descripcion'],
+        f"{r['Corriente']:.2f}",
+        r['Calibre'],
+        f"{r['Caida_Tension']:.2f}%",
+        r['Canalizacion'],
+        estado_caida(r['Caida_Tension'])
+    ]
+
+def _recortar(texto, maximo):
+    texto = '' if texto is None else str(texto)
+    return texto if len(texto) <= maximo else texto[:maximo - 1] + '…'
+
+def _tablas_por_pagina(resultados, resumen):
+    """Convierte las filas en tablas de una página, acumulando el resumen.
+
+    Cada tabla es un ``LongTable`` con anchos precalculados y la fila de
+    encabezado repetida si llegara a partirse entre páginas.
+    """
+    tablas = []
+    bloque = [ENCABEZADOS]
+    for r in resultados:
+        resumen.agregar(r)
+        data = _fila_pdf(r)
+        data[1] = _recortar(data[1], MAX_CARACTERES_DESCRIPCION_PDF)
+        bloque.append(data)
+        if len(bloque) > FILAS_POR_PAGINA_PDF:
+            tablas.append(bloque)
+            bloque = [ENCABEZADOS]
+    if len(bloque) > 1:
+        tablas.append(bloque)
+
+    elementos = []
+    for i, bloque in enumerate(tablas):
+        if i:
+            elementos.append(PageBreak())
+        elementos.append(LongTable(bloque, colWidths=ANCHOS_COLUMNAS_PDF, repeatRows=1,
+                                   style=ESTILO_TABLA_PDF_GRANDE))
+    return elementos
+
+class _ResumenPDF:
+    """Totales por estado y por calibre de un reporte."""
+
+    def __init__(self):
+        self.total = 0
+        self.por_estado = {}
+        self.por_calibre = {}
+        self.caida_maxima = None
+
+    def agregar(self, r):
+        caida = r['Caida_Tension']
+        estado = estado_caida(caida)
+        self.total += 1
+        self.por_estado[estado] = self.por_estado.get(estado, 0) + 1
+        self.por_calibre[r['Calibre']] = self.por_calibre.get(r['Calibre'], 0) + 1
+        if self.caida_maxima is None or caida > self.caida_maxima:
+            self.caida_maxima = caida
+
+    def elementos(self, styles):
+        """Flowables con las tablas del resumen."""
+        elementos = [Paragraph('Resumen', styles['Heading2'])]
+        datos = [['Circuitos', str(self.total)]]
+        for estado in ('OK', 'Revisar', 'Fuera de rango'):
+            datos.append([estado, str(self.por_estado.get(estado, 0))])
+        if self.caida_maxima is not None:
+            datos.append(['%Caída máxima', f'{self.caida_maxima:.2f}%'])
+        elementos.append(Table(datos, colWidths=[150, 100], style=ESTILO_TABLA_PDF_GRANDE))
+        elementos.append(Spacer(1, 12))
+
+        datos = [['Calibre', 'Circuitos']]
+        datos += [[calibre, str(n)] for calibre, n in sorted(self.por_calibre.items(), key=lambda kv: str(kv[0]))]
+        elementos.append(Table(datos, colWidths=[150, 100], repeatRows=1, style=ESTILO_TABLA_PDF_GRANDE))
+        return elementos
+
+@cached_report('pdf', '.pdf', VERSION_PLANTILLA_PDF)
+def generate_pdf_report(resultados, proyecto_id, modo=None):
+    """Genera un reporte PDF con los resultados de los cálculos.
+
+    Args:
+        resultados: Iterable de diccionarios de resultados.
+        proyecto_id: ID del proyecto.
+        modo: 'completo' (una sola tabla), 'grande' (una tabla de ancho fijo
+            por página), 'resumen' (solo totales) o 'apendice' (totales y el
+            detalle como apéndice). Por defecto 'grande' si hay más de
+            ``UMBRAL_PDF_GRANDE`` filas y 'completo' en otro caso.
+
+    Returns:
+        str: Ruta del archivo generado.
+    """
+    if modo is None:
+        try:
+            modo = 'grande' if len(resultados) > UMBRAL_PDF_GRANDE else 'completo'
+        except TypeError:
+            modo = 'grande'
+    if modo not in MODOS_PDF:
+        raise ValueError(f'Modo de reporte {modo} no soportado')
+
+    # Archivo propio del trabajo (nombre único en reports/)
+    filename = new_report_file(proyecto_id, '.pdf')
     
     # Crear documento
     doc = SimpleDocTemplate(
@@ -43,122 +194,124 @@ def generate_pdf_report(resultados, proyecto_id):
     elements.append(Paragraph(f'Fecha: {datetime.now().strftime("%d/%m/%Y %H:%M")}', normal_style))
     elements.append(Spacer(1, 24))
     
-    # Tabla de resultados
-    data = [
-        ['ID', 'Descripción', 'Corriente (A)', 'Calibre', '%Caída', 'Canalización', 'Estado']
-    ]
-    
-    for r in resultados:
-        estado = 'OK' if r['Caida_Tension'] <= 3 else 'Revisar' if r['Caida_Tension'] <= 5 else 'Fuera de rango'
-        data.append([
-            r['ID_Equipo'],
-            r['Descripcion'],
-            f"{r['Corriente']:.2f}",
-            r['Calibre'],
-            f"{r['Caida_Tension']:.2f}%",
-            r['Canalizacion'],
-            estado
-        ])
-    
-    # Estilo de tabla
-    table = Table(data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 10),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    elements.append(table)
+    if modo == 'completo':
+        # Tabla de resultados
+        data = [ENCABEZADOS] + [_fila_pdf(r) for r in resultados]
+        elements.append(Table(data, style=ESTILO_TABLA_PDF))
+    else:
+        resumen = _ResumenPDF()
+        detalle = _tablas_por_pagina(resultados, resumen)
+        if modo == 'grande':
+            elements.extend(detalle)
+        else:
+            elements.extend(resumen.elementos(styles))
+            if modo == 'apendice' and detalle:
+                elements.append(PageBreak())
+                elements.append(Paragraph('Apéndice: detalle de circuitos', subtitle_style))
+                elements.extend(detalle)
     
     # Generar PDF
     doc.build(elements)
     
     return filename
 
-def generate_excel_report(resultados, proyecto_id):
-    """Genera un reporte Excel con los resultados de los cálculos."""
-    # Crear directorio reports si no existe
-    if not os.path.exists('reports'):
-        os.makedirs('reports')
-    
-    # Nombre del archivo
-    filename = f'reports/proyecto_{proyecto_id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-    
-    # Crear workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Resultados'
-    
-    # Estilos
-    header_font = Font(bold=True, color='FFFFFF')
-    header_fill = PatternFill(start_color='4F81BD', end_color='4F81BD', fill_type='solid')
-    header_alignment = Alignment(horizontal='center', vertical='center')
-    border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-    
+# Filas que se leen por adelantado para estimar el ancho de las columnas
+FILAS_MUESTRA_ANCHOS = 1000
+
+# Estilo con nombre por cada estado de la columna 'Estado'
+ESTILO_ESTADO = {
+    'OK': 'estado_ok',
+    'Revisar': 'estado_revisar',
+    'Fuera de rango': 'estado_fuera',
+}
+
+def _registrar_estilos_excel(wb):
+    """Registra en el libro los estilos con nombre compartidos por todas las celdas."""
+    lado = Side(style='thin')
+    border = Border(left=lado, right=lado, top=lado, bottom=lado)
+
+    encabezado = NamedStyle(name='encabezado')
+    encabezado.font = Font(bold=True, color='FFFFFF')
+    encabezado.fill = PatternFill(start_color='4F81BD', end_color='4F81BD', fill_type='solid')
+    encabezado.alignment = Alignment(horizontal='center', vertical='center')
+    encabezado.border = border
+    wb.add_named_style(encabezado)
+
+    celda = NamedStyle(name='celda')
+    celda.alignment = Alignment(horizontal='center')
+    celda.border = border
+    wb.add_named_style(celda)
+
+    for nombre, color in (('estado_ok', 'C6EFCE'), ('estado_revisar', 'FFEB9C'), ('estado_fuera', 'FFC7CE')):
+        estilo = NamedStyle(name=nombre)
+        estilo.alignment = Alignment(horizontal='center')
+        estilo.border = border
+        estilo.fill = PatternFill(start_color=color, end_color=color, fill_type='solid')
+        wb.add_named_style(estilo)
+
+def _fila_excel(r):
+    """Valores de una fila del reporte Excel."""
+    return [
+        r['ID_Equipo'],
+        r['Descripcion'],
+        round(r['Corriente'], 2),
+        r['Calibre'],
+        round(r['Caida_Tension'], 2),
+        r['Canalizacion'],
+        estado_caida(r['Caida_Tension'])
+    ]
+
+def write_excel_report(resultados, destino):
+    """Escribe el reporte Excel en modo streaming (write-only de openpyxl).
+
+    Las filas se escriben a medida que se recorren ``resultados`` (que puede
+    ser cualquier iterable), con estilos con nombre compartidos en lugar de
+    objetos de estilo por celda. El ancho de las columnas se calcula sobre
+    las primeras ``FILAS_MUESTRA_ANCHOS`` filas, porque en modo write-only
+    debe fijarse antes de escribir la primera fila.
+
+    Args:
+        resultados: Iterable de diccionarios de resultados.
+        destino: Ruta del archivo o archivo binario abierto para escritura.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Resultados')
+    _registrar_estilos_excel(wb)
+
+    filas = iter(resultados)
+    muestra = [_fila_excel(r) for r in islice(filas, FILAS_MUESTRA_ANCHOS)]
+
+    # Ajustar ancho de columnas
+    anchos = [len(h) for h in ENCABEZADOS]
+    for data in muestra:
+        for i, value in enumerate(data):
+            anchos[i] = max(anchos[i], len(str(value)))
+    for i, ancho in enumerate(anchos, 1):
+        ws.column_dimensions[get_column_letter(i)].width = ancho + 2
+
     # Encabezados
-    headers = ['ID', 'Descripción', 'Corriente (A)', 'Calibre', '%Caída', 'Canalización', 'Estado']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = border
-    
+    def celda(value, estilo):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = estilo
+        return cell
+
+    ws.append([celda(h, 'encabezado') for h in ENCABEZADOS])
+
     # Datos
-    for row, r in enumerate(resultados, 2):
-        estado = 'OK' if r['Caida_Tension'] <= 3 else 'Revisar' if r['Caida_Tension'] <= 5 else 'Fuera de rango'
-        data = [
-            r['ID_Equipo'],
-            r['Descripcion'],
-            round(r['Corriente'], 2),
-            r['Calibre'],
-            round(r['Caida_Tension'], 2),
-            r['Canalizacion'],
-            estado
-        ]
-        
-        for col, value in enumerate(data, 1):
-            cell = ws.cell(row=row, column=col, value=value)
-            cell.alignment = Alignment(horizontal='center')
-            cell.border = border
-            
-            # Colorear estado
-            if col == 7:  # columna de estado
-                if value == 'OK':
-                    cell.fill = PatternFill(start_color='C6EFCE', end_color='C6EFCE', fill_type='solid')
-                elif value == 'Revisar':
-                    cell.fill = PatternFill(start_color='FFEB9C', end_color='FFEB9C', fill_type='solid')
-                else:
-                    cell.fill = PatternFill(start_color='FFC7CE', end_color='FFC7CE', fill_type='solid')
-    
-    # Ajustar ancho de columnas
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column].width = adjusted_width
+    for data in chain(muestra, (_fila_excel(r) for r in filas)):
+        fila = [celda(value, 'celda') for value in data[:-1]]
+        fila.append(celda(data[-1], ESTILO_ESTADO.get(data[-1], 'estado_fuera')))
+        ws.append(fila)
+
+    wb.save(destino)
+
+@cached_report('excel', '.xlsx', VERSION_PLANTILLA_EXCEL)
+def generate_excel_report(resultados, proyecto_id):
+    """Genera un reporte Excel con los resultados de los cálculos."""
+    # Archivo propio del trabajo (nombre único en reports/)
+    filename = new_report_file(proyecto_id, '.xlsx')
     
     # Guardar archivo
-    wb.save(filename)
+    write_excel_report(resultados, filename)
     
     return filename
@@ -0,0 +1,122 @@
+# modules/repository.py
+"""Capa de acceso a datos sobre las bases SQLite separadas.
+
+Una sola conexión (``get_db('datos')``) abre ``main_data.db`` y adjunta con
+ATTACH las demás bases, así las consultas que cruzan entidades se resuelven
+en un único JOIN:
+
+- ``main``: proyectos y equipos (main_data.db)
+- ``plantas``: plantas (plants.db, la tabla que gestiona modules/plants.py)
+- ``usuarios``: usuarios (users.db)
+- ``norma``: tablas normativas de cálculo (``NORM_DB``)
+- ``norma_ext``: tablas normativas extendidas (``NORMATIVE_DATA_DB``)
+
+Las consultas frecuentes son constantes de módulo: SQLite reutiliza la
+sentencia ya preparada de la caché de la conexión cada vez que se ejecuta el
+mismo texto SQL. Las filas se devuelven como dataclasses tipadas.
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional
+
+from flask import g
+
+from modules.db import get_db
+from modules.pagination import TAMANO_PAGINA, Pagina, keyset_page
+
+
+@dataclass(frozen=True)
+class Planta:
+    id: int
+    nombre: str
+    cliente: Optional[str]
+    sigla: Optional[str]
+    pais: Optional[str]
+    elevacion: Optional[float]
+    humedad: Optional[float]
+    medium_voltage: Optional[str]
+    low_voltage: Optional[str]
+    control_voltage: Optional[str]
+    temperatura_ambiente: Optional[float]
+
+
+@dataclass(frozen=True)
+class Proyecto:
+    id: int
+    nombre: str
+    planta_id: Optional[int]
+
+
+@dataclass(frozen=True)
+class ProyectoResumen:
+    id: int
+    nombre: str
+    planta_id: Optional[int]
+    planta_nombre: Optional[str]
+    equipos: int
+
+
+# --- Consultas frecuentes (sentencias preparadas) ---
+
+COLUMNAS_PLANTA = ('id, nombre, cliente, sigla, pais, elevacion, humedad, '
+                   'medium_voltage, low_voltage, control_voltage, temperatura_ambiente')
+
+SQL_PLANTAS = f'SELECT {COLUMNAS_PLANTA} FROM plantas.plants ORDER BY nombre'
+SQL_PLANTA = f'SELECT {COLUMNAS_PLANTA} FROM plantas.plants WHERE id = ?'
+SELECT_PLANTAS = f'SELECT {COLUMNAS_PLANTA} FROM plantas.plants'
+
+SQL_PROYECTO = 'SELECT id, nombre, planta_id FROM main.projects WHERE id = ?'
+
+# Proyectos con su planta y número de equipos en un solo JOIN
+SELECT_PROYECTOS_RESUMEN = '''
+    SELECT p.id, p.nombre, p.planta_id, pl.nombre AS planta_nombre,
+           (SELECT COUNT(*) FROM main.equipment e WHERE e.proyecto_id = p.id) AS equipos
+    FROM main.projects p
+    LEFT JOIN plantas.plants pl ON pl.id = p.planta_id
+'''
+
+
+class Repository:
+    """Consultas tipadas sobre la conexión con las bases adjuntas."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def _uno(self, tipo, sql, params=()):
+        fila = self.conn.execute(sql, params).fetchone()
+        return tipo(*fila) if fila is not None else None
+
+    def _todos(self, tipo, sql, params=()):
+        return [tipo(*fila) for fila in self.conn.execute(sql, params)]
+
+    def _pagina(self, tipo, select, orden, filtros, cursor, limite):
+        pagina = keyset_page(self.conn, select, orden, filtros, cursor, limite)
+        return Pagina([tipo(*fila) for fila in pagina.items], pagina.siguiente)
+
+    # Plantas
+    def plants(self) -> List[Planta]:
+        return self._todos(Planta, SQL_PLANTAS)
+
+    def plants_page(self, cliente=None, pais=None, cursor=None, limite=TAMANO_PAGINA) -> Pagina:
+        """Página de plantas ordenadas por nombre, filtradas por cliente y país."""
+        return self._pagina(Planta, SELECT_PLANTAS, ('nombre', 'id'),
+                            {'cliente': cliente, 'pais': pais}, cursor, limite)
+
+    def plant(self, planta_id) -> Optional[Planta]:
+        return self._uno(Planta, SQL_PLANTA, (planta_id,))
+
+    # Proyectos
+    def project(self, proyecto_id) -> Optional[Proyecto]:
+        return self._uno(Proyecto, SQL_PROYECTO, (proyecto_id,))
+
+    def projects_summary_page(self, planta_id, cursor=None, limite=TAMANO_PAGINA) -> Pagina:
+        """Proyectos de una planta con el nombre de la planta y su número de equipos, por nombre."""
+        return self._pagina(ProyectoResumen, SELECT_PROYECTOS_RESUMEN, ('p.nombre', 'p.id'),
+                            {'p.planta_id': planta_id}, cursor, limite)
+
+
+def get_repository():
+    """Repositorio de la petición actual."""
+    if 'repositorio' not in g:
+        g.repositorio = Repository(get_db('datos'))
+    return g.repositorio
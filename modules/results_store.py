@@ -0,0 +1,219 @@
+# modules/results_store.py
+"""Resultados de cálculo persistentes con recálculo incremental.
+
+Cada equipo tiene una fila en ``resultados_calculo`` (calculations.db) con
+el resultado y la huella de sus entradas: corriente, temperatura ambiente de
+la planta, longitud, tensión, número de conductores y versiones de la
+rejilla de ampacidad corregida (tablas normativas y de derating) y del
+catálogo de canalizaciones (``modules.raceways``). ``refresh`` compara las
+huellas actuales con las guardadas y recalcula, en un solo lote vectorizado,
+solo los equipos cuyas entradas cambiaron. Editar un equipo recalcula su fila; cambiar la temperatura de una
+planta, las de sus equipos; cambiar la normativa, todas.
+
+Los reportes y exportaciones leen los resultados guardados con
+``load_results`` (o ``iter_results``, fila a fila) en lugar de recibirlos en
+la petición.
+"""
+
+import hashlib
+import json
+import math
+import time
+
+from modules.batch_sizing import NUM_CONDUCTORES_DEFECTO, size_circuits
+from modules.calculations import derating_grid, tablas_normativas
+from modules.derating import grid_from_tables
+from modules.raceways import VERSION_CATALOGO
+
+# Entradas de cálculo de los equipos de un proyecto (conexión 'datos')
+SQL_ENTRADAS = '''
+    SELECT e.id, e.tag, e.descripcion, e.corriente, pl.temperatura_ambiente,
+           e.longitud, e.voltaje, e.num_conductores
+    FROM main.equipment e
+    JOIN main.projects p ON p.id = e.proyecto_id
+    LEFT JOIN plantas.plants pl ON pl.id = p.planta_id
+    WHERE e.proyecto_id = ?
+'''
+
+SQL_GUARDADOS = 'SELECT equipo_id, huella, tag, descripcion FROM resultados_calculo WHERE proyecto_id = ?'
+
+SQL_GUARDAR = '''
+    INSERT INTO resultados_calculo (
+        equipo_id, proyecto_id, tag, descripcion, corriente, temperatura, longitud, voltaje,
+        num_conductores, version_normativa, huella, calibre, caida_tension, canalizacion,
+        estado, error, calculado
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(equipo_id) DO UPDATE SET
+        proyecto_id = excluded.proyecto_id, tag = excluded.tag, descripcion = excluded.descripcion,
+        corriente = excluded.corriente, temperatura = excluded.temperatura,
+        longitud = excluded.longitud, voltaje = excluded.voltaje,
+        num_conductores = excluded.num_conductores, version_normativa = excluded.version_normativa,
+        huella = excluded.huella, calibre = excluded.calibre, caida_tension = excluded.caida_tension,
+        canalizacion = excluded.canalizacion, estado = excluded.estado, error = excluded.error,
+        calculado = excluded.calculado
+'''
+
+SQL_RESULTADOS = '''
+    SELECT tag, descripcion, corriente, calibre, caida_tension, canalizacion
+    FROM resultados_calculo
+    WHERE proyecto_id = ? AND error IS NULL
+    ORDER BY tag
+'''
+
+SQL_CALIBRES = '''
+    SELECT equipo_id, tag, calibre, num_conductores
+    FROM resultados_calculo
+    WHERE proyecto_id = ? AND calibre IS NOT NULL
+'''
+
+SQL_ESTADOS = '''
+    SELECT estado, COUNT(*) FROM resultados_calculo WHERE proyecto_id = ? GROUP BY estado
+'''
+
+# Entradas obligatorias (posición en la fila de SQL_ENTRADAS -> nombre)
+ENTRADAS_OBLIGATORIAS = {3: 'corriente', 4: 'temperatura ambiente de la planta',
+                         5: 'longitud', 6: 'voltaje'}
+
+
+class Actualizacion:
+    """Resultado de ``refresh``: cuántas filas se recalcularon, se mantuvieron o se borraron."""
+
+    __slots__ = ('recalculados', 'vigentes', 'eliminados')
+
+    def __init__(self, recalculados=0, vigentes=0, eliminados=0):
+        self.recalculados = recalculados
+        self.vigentes = vigentes
+        self.eliminados = eliminados
+
+    def to_dict(self):
+        return {'recalculados': self.recalculados, 'vigentes': self.vigentes,
+                'eliminados': self.eliminados}
+
+
+def fingerprint(corriente, temperatura, longitud, voltaje, num_conductores, version_normativa):
+    """Huella de las entradas que determinan el resultado de un equipo."""
+    datos = [corriente, temperatura, longitud, voltaje, num_conductores, version_normativa]
+    return hashlib.sha256(json.dumps(datos).encode('utf-8')).hexdigest()[:16]
+
+
+def _faltantes(fila):
+    return [nombre for i, nombre in ENTRADAS_OBLIGATORIAS.items() if fila[i] is None]
+
+
+def _calcular(pendientes, proyecto_id, tablas, rejilla, ahora):
+    """Filas para SQL_GUARDAR de los equipos pendientes (un solo lote vectorizado)."""
+    completos = [p for p in pendientes if not _faltantes(p[0])]
+    lote = None
+    if completos:
+        lote = size_circuits(
+            [p[0][3] for p in completos],
+            [p[0][4] for p in completos],
+            [p[0][5] for p in completos],
+            [p[0][6] for p in completos],
+            [p[1] for p in completos],
+            tablas=tablas,
+            rejilla=rejilla,
+        )
+
+    filas = []
+    for i, (fila, num_conductores, huella) in enumerate(completos):
+        caida = float(lote['Caida_Tension'][i])
+        filas.append((
+            fila[0], proyecto_id, fila[1], fila[2], fila[3], fila[4], fila[5], fila[6],
+            num_conductores, tablas.version, huella, lote['Calibre'][i],
+            None if math.isnan(caida) else caida, lote['Canalizacion'][i],
+            lote['Estado'][i], lote['Error'][i], ahora,
+        ))
+    for fila, num_conductores, huella in pendientes:
+        faltantes = _faltantes(fila)
+        if faltantes:
+            filas.append((
+                fila[0], proyecto_id, fila[1], fila[2], fila[3], fila[4], fila[5], fila[6],
+                num_conductores, tablas.version, huella, None, None, None,
+                'Error', f'Faltan datos de entrada: {", ".join(faltantes)}', ahora,
+            ))
+    return filas
+
+
+def refresh(datos, calc, proyecto_id, tablas=None):
+    """Recalcula los resultados de un proyecto cuyas entradas cambiaron.
+
+    Args:
+        datos: Conexión con main_data.db y plants.db adjunta (``get_db('datos')``).
+        calc: Conexión a calculations.db (``get_db('calc')``).
+        proyecto_id: Proyecto a actualizar.
+        tablas: Tablas normativas; por defecto las de la caché de la aplicación
+            (con su rejilla de derating).
+
+    Returns:
+        Actualizacion: Contadores de filas recalculadas, vigentes y eliminadas.
+    """
+    if tablas is None:
+        tablas, rejilla = tablas_normativas(), derating_grid()
+    else:
+        rejilla = grid_from_tables(tablas)
+    guardados = {fila[0]: tuple(fila[1:]) for fila in calc.execute(SQL_GUARDADOS, (proyecto_id,))}
+
+    pendientes = []
+    renombrados = []
+    vigentes = 0
+    for fila in datos.execute(SQL_ENTRADAS, (proyecto_id,)):
+        num_conductores = fila[7] or NUM_CONDUCTORES_DEFECTO
+        huella = fingerprint(fila[3], fila[4], fila[5], fila[6], num_conductores,
+                             f'{rejilla.version}:{VERSION_CATALOGO}')
+        guardado = guardados.pop(fila[0], None)
+        if guardado is None or guardado[0] != huella:
+            pendientes.append((tuple(fila), num_conductores, huella))
+            continue
+        vigentes += 1
+        if guardado[1:] != (fila[1], fila[2]):
+            # El tag o la descripción no intervienen en el cálculo
+            renombrados.append((fila[1], fila[2], fila[0]))
+
+    with calc:
+        if pendientes:
+            calc.executemany(SQL_GUARDAR, _calcular(pendientes, proyecto_id, tablas, rejilla, time.time()))
+        if renombrados:
+            calc.executemany('UPDATE resultados_calculo SET tag = ?, descripcion = ? WHERE equipo_id = ?',
+                             renombrados)
+        if guardados:
+            # Equipos eliminados o movidos a otro proyecto
+            calc.executemany('DELETE FROM resultados_calculo WHERE equipo_id = ? AND proyecto_id = ?',
+                             [(equipo_id, proyecto_id) for equipo_id in guardados])
+    return Actualizacion(len(pendientes), vigentes, len(guardados))
+
+
+def iter_results(calc, proyecto_id):
+    """Genera los resultados calculados del proyecto fila a fila desde el cursor.
+
+    Mismo formato que ``load_results``, sin cargar el proyecto en memoria.
+    """
+    for tag, descripcion, corriente, calibre, caida, canalizacion in calc.execute(
+            SQL_RESULTADOS, (proyecto_id,)):
+        yield {
+            'ID_Equipo': tag,
+            'Descripcion': descripcion,
+            'Corriente': corriente,
+            'Calibre': calibre,
+            'Caida_Tension': round(caida, 2),
+            'Canalizacion': canalizacion,
+        }
+
+
+def load_results(calc, proyecto_id):
+    """Resultados calculados del proyecto en el formato de reportes y exportaciones.
+
+    Las filas con error (entradas incompletas o fuera de tabla) se omiten;
+    ``status_counts`` las cuenta.
+    """
+    return list(iter_results(calc, proyecto_id))
+
+
+def status_counts(calc, proyecto_id):
+    """Número de equipos del proyecto por estado ('OK', 'Revisar', 'Error', ...)."""
+    return dict(calc.execute(SQL_ESTADOS, (proyecto_id,)).fetchall())
+
+
+def sized_circuits(calc, proyecto_id):
+    """``(equipo_id, tag, calibre, num_conductores)`` de los equipos con calibre calculado."""
+    return calc.execute(SQL_CALIBRES, (proyecto_id,)).fetchall()
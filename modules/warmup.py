@@ -0,0 +1,142 @@
+# modules/warmup.py
+"""Calentamiento de cada proceso worker y endpoints de salud.
+
+En producción (``gunicorn.conf.py``) la aplicación se crea una sola vez en
+el proceso maestro y los workers se bifurcan de él compartiendo memoria por
+copy-on-write. Cada worker llama a ``warm_up`` antes de aceptar peticiones:
+compila las plantillas Jinja, carga los catálogos de Babel de cada idioma y
+las tablas normativas (con la rejilla de derating y los arreglos del
+cálculo vectorizado), así la primera petición no paga esos costes. El tiempo
+de cada etapa se registra en el log.
+
+- ``/healthz`` (vida): responde 200 mientras el proceso atiende peticiones.
+- ``/readyz`` (disponibilidad): 200 cuando el calentamiento terminó; 503
+  mientras está pendiente o si falló.
+"""
+
+import os
+import threading
+import time
+
+from flask import Blueprint, jsonify
+from flask_babel import force_locale, get_translations
+
+from modules.batch_sizing import _arreglos
+from modules.calculations import derating_grid, tablas_normativas
+
+health_bp = Blueprint('health', __name__)
+
+PENDIENTE, CALENTANDO, LISTO, ERROR = 'pendiente', 'calentando', 'listo', 'error'
+
+
+class Calentamiento:
+    """Estado del calentamiento de este proceso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.estado = PENDIENTE
+        self.pid = None
+        self.segundos = None
+        self.etapas = {}
+        self.error = None
+
+    def to_dict(self):
+        return {
+            'estado': self.estado,
+            'pid': self.pid,
+            'segundos': self.segundos,
+            'etapas': self.etapas,
+            'error': self.error,
+        }
+
+
+_estado = Calentamiento()
+
+
+def get_warmup_state():
+    """Devuelve el estado de calentamiento del proceso actual."""
+    global _estado
+    # Tras un fork el estado heredado del maestro no vale para el worker
+    if _estado.pid not in (None, os.getpid()):
+        _estado = Calentamiento()
+    return _estado
+
+
+def _plantillas(app):
+    entorno = app.jinja_env
+    nombres = [n for n in entorno.list_templates() if n.endswith('.html')]
+    for nombre in nombres:
+        entorno.get_template(nombre)
+    return len(nombres)
+
+
+def _catalogos(app):
+    idiomas = list(app.config['LANGUAGES'])
+    with app.test_request_context():
+        for idioma in idiomas:
+            with force_locale(idioma):
+                get_translations()
+    return len(idiomas)
+
+
+def _tablas(app):
+    with app.app_context():
+        tablas = tablas_normativas()
+        _arreglos(tablas)
+        derating_grid()
+    return tablas.version
+
+
+ETAPAS = (
+    ('plantillas', _plantillas),
+    ('catalogos', _catalogos),
+    ('tablas_normativas', _tablas),
+)
+
+
+def warm_up(app):
+    """Calienta el proceso actual. Devuelve el estado; un fallo no detiene el worker."""
+    estado = get_warmup_state()
+    with estado._lock:
+        if estado.estado in (CALENTANDO, LISTO):
+            return estado
+        estado.estado = CALENTANDO
+        estado.pid = os.getpid()
+
+    inicio = time.perf_counter()
+    etapas = {}
+    try:
+        for nombre, etapa in ETAPAS:
+            t = time.perf_counter()
+            resultado = etapa(app)
+            etapas[nombre] = {'segundos': round(time.perf_counter() - t, 4), 'resultado': resultado}
+    except Exception as e:
+        estado.error = str(e)
+        estado.estado = ERROR
+        app.logger.exception('Calentamiento del worker %s fallido en %s', estado.pid, nombre)
+    else:
+        estado.estado = LISTO
+    estado.etapas = etapas
+    estado.segundos = round(time.perf_counter() - inicio, 4)
+    app.logger.info('Calentamiento del worker %s: %s en %.3f s (%s)', estado.pid, estado.estado,
+                    estado.segundos,
+                    ', '.join(f'{n} {e["segundos"]:.3f} s' for n, e in etapas.items()))
+    return estado
+
+
+@health_bp.route('/healthz')
+def healthz():
+    """Vida: el proceso responde."""
+    return jsonify({'estado': 'vivo', 'pid': os.getpid()})
+
+
+@health_bp.route('/readyz')
+def readyz():
+    """Disponibilidad: el calentamiento del worker terminó sin errores."""
+    estado = get_warmup_state()
+    return jsonify(estado.to_dict()), 200 if estado.estado == LISTO else 503
+
+
+def init_app(app):
+    """Registra ``/healthz`` y ``/readyz``."""
+    app.register_blueprint(health_bp)
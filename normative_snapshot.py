@@ -0,0 +1,28 @@
+# normative_snapshot.py
+"""Compila las tablas normativas en la instantánea binaria que leen los workers.
+
+Uso:
+    python normative_snapshot.py             # compila NORM_DB en NORM_SNAPSHOT
+    python normative_snapshot.py --salida X  # escribe la instantánea en X
+
+Volver a ejecutarlo después de modificar las tablas normativas (o
+normative_data.db, o el material y aislante por defecto): mientras la
+instantánea no corresponda a las tablas actuales, la aplicación las lee de
+SQLite y construye la rejilla de derating en cada proceso. ``NORM_DB`` debe
+tener aplicadas las migraciones (contador de cambios normativos).
+"""
+
+import argparse
+
+from config import Config
+from modules.normative_snapshot import compile_snapshot
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Instantánea binaria de las tablas normativas.')
+    parser.add_argument('--salida', default=Config.NORM_SNAPSHOT,
+                        help='Archivo de destino. Por defecto, NORM_SNAPSHOT.')
+    args = parser.parse_args()
+    version = compile_snapshot(Config.NORM_DB, args.salida, Config.NORMATIVE_DATA_DB,
+                               Config.DERATING_MATERIAL, Config.DERATING_TEMPERATURA_AISLANTE)
+    print(f'Instantánea {args.salida}: versión normativa {version}')
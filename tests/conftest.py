@@ -0,0 +1,44 @@
+# tests/conftest.py
+"""Bases de prueba (normativa con los datos de ``init_normative_db`` y principal) y aplicación mínima."""
+
+import sqlite3
+
+import pytest
+from flask import Flask
+
+from modules.db_init import init_main_db, init_normative_db
+from modules.migrations import migrate
+from modules.normative_cache import get_normative_cache
+
+
+@pytest.fixture
+def norm_db(tmp_path):
+    ruta = str(tmp_path / 'normativa.db')
+    init_normative_db(ruta)
+    return ruta
+
+
+@pytest.fixture
+def main_db(tmp_path):
+    """main_data.db migrada con los proyectos 1 y 2."""
+    ruta = str(tmp_path / 'main_data.db')
+    init_main_db(ruta)
+    migrate(ruta, 'main', salida=lambda *_: None)
+    with sqlite3.connect(ruta) as conn:
+        conn.executemany('INSERT INTO projects (id, nombre) VALUES (?, ?)', [(1, 'P1'), (2, 'P2')])
+    conn.close()
+    return ruta
+
+
+@pytest.fixture
+def tablas(norm_db):
+    return get_normative_cache(norm_db).tablas()
+
+
+@pytest.fixture
+def app(norm_db):
+    """Aplicación con solo la configuración que leen ``modules.calculations`` y la rejilla."""
+    app = Flask(__name__)
+    app.config.update(NORM_DB=norm_db, NORM_SNAPSHOT=None, NORMATIVE_DATA_DB=None)
+    with app.app_context():
+        yield app
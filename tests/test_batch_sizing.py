@@ -0,0 +1,81 @@
+# tests/test_batch_sizing.py
+import math
+
+import numpy as np
+import pytest
+
+from modules.batch_sizing import size_circuits
+from modules.calculations import (calculate_voltage_drop, dimension_channel, estado_caida,
+                                  select_cable)
+
+
+def _escalar(corriente, temperatura, longitud, voltaje, num_conductores):
+    """Resultado de las funciones escalares, con el mensaje de su ValueError."""
+    try:
+        calibre = select_cable(corriente, temperatura, num_conductores)
+    except ValueError as e:
+        return None, math.nan, None, 'Error', str(e)
+    try:
+        caida = calculate_voltage_drop(corriente, longitud, calibre, voltaje)
+    except ValueError as e:
+        return calibre, math.nan, None, 'Error', str(e)
+    try:
+        canalizacion = dimension_channel(calibre, num_conductores)
+    except ValueError as e:
+        return calibre, caida, None, 'Error', str(e)
+    return calibre, caida, canalizacion, estado_caida(caida), None
+
+
+def _comparar(corrientes, temperaturas, longitudes, voltajes, conductores):
+    lote = size_circuits(corrientes, temperaturas, longitudes, voltajes, conductores)
+    for i, entrada in enumerate(zip(corrientes, temperaturas, longitudes, voltajes, conductores)):
+        calibre, caida, canalizacion, estado, error = _escalar(*(float(v) for v in entrada[:4]),
+                                                               int(entrada[4]))
+        assert lote['Calibre'][i] == calibre, entrada
+        assert lote['Caida_Tension'][i] == pytest.approx(caida, nan_ok=True), entrada
+        assert lote['Canalizacion'][i] == canalizacion, entrada
+        assert lote['Estado'][i] == estado, entrada
+        assert lote['Error'][i] == error, entrada
+
+
+def test_coincide_con_escalares_en_entradas_aleatorias(app):
+    rng = np.random.default_rng(2024)
+    n = 2000
+    _comparar(
+        rng.uniform(0.5, 250, n).round(1),
+        # Incluye temperaturas con decimales y fuera de la tabla (21-50 °C)
+        rng.uniform(10, 60, n).round(1),
+        rng.uniform(1, 500, n).round(1),
+        rng.choice([120, 208, 240, 480], n).astype(float),
+        rng.integers(1, 25, n),
+    )
+
+
+def test_coincide_con_escalares_en_los_bordes(app):
+    casos = [
+        # corriente, temperatura, longitud, voltaje, conductores
+        (25.0, 30, 10, 480, 3),         # ampacidad exacta del 12 AWG
+        (25.01, 30, 10, 480, 3),
+        (20.0, 21, 10, 480, 3),         # límites de la tabla de temperatura
+        (20.0, 50, 10, 480, 3),
+        (20.0, 20.9, 10, 480, 3),       # temperaturas fuera de rango
+        (20.0, 50.5, 10, 480, 3),
+        (20.0, 51, 10, 480, 3),
+        (20.0, -5, 10, 480, 3),
+        (20.0, math.nan, 10, 480, 3),   # NaN
+        (math.nan, 30, 10, 480, 3),
+        (20.0, 30, math.nan, 480, 3),
+        (196.0, 30, 10, 480, 3),        # corrientes por encima de la tabla
+        (211.0, 21, 10, 480, 3),
+        (160.0, 30, 10, 480, 4),        # excede solo por agrupamiento
+        (20.0, 30, 10, 480, 0),         # sin conductores
+        (80.0, 25, 2000, 120, 40),      # caída fuera de rango, excede la mayor tubería
+        (20.0, 30, 60, 480, 3),         # caída 'Revisar'
+    ]
+    _comparar(*(np.array(columna) for columna in zip(*casos)))
+
+
+def test_acepta_escalares_y_difunde(app):
+    lote = size_circuits([10, 20, 30], 30, 50, 480)
+    assert len(lote['Calibre']) == 3
+    assert lote['Calibre'][0] == select_cable(10, 30)
@@ -0,0 +1,78 @@
+# tests/test_calc_api.py
+import io
+import json
+
+import pytest
+
+from modules.calc_api import CuerpoExcedido, _lineas, calc_api_bp
+
+TOKEN = {'Authorization': 'Bearer secreto'}
+CIRCUITO = {'ID_Equipo': 'M-1', 'Corriente': 20, 'Temperatura': 30, 'Longitud': 20, 'Voltaje': 220}
+
+
+@pytest.fixture
+def cliente(app):
+    app.config.update(TESTING=True, SECRET_KEY='prueba', CALC_API_TOKEN='secreto',
+                      CALC_API_MAX_BATCH=3, CALC_API_MAX_BYTES=1024,
+                      CALC_API_CHUNK=2, CALC_API_TIME_BUDGET=30)
+    app.register_blueprint(calc_api_bp)
+    return app.test_client()
+
+
+def _ndjson(lineas):
+    return '\n'.join(json.dumps(linea) for linea in lineas)
+
+
+def _filas(respuesta):
+    return [json.loads(linea) for linea in respuesta.get_data(as_text=True).splitlines()]
+
+
+def test_el_token_se_compara_completo(cliente):
+    for cabecera in ({}, {'Authorization': 'Bearer secret'}, {'Authorization': 'Bearer secretoo'}):
+        assert cliente.post('/api/calc/batch', json=[CIRCUITO], headers=cabecera).status_code == 403
+    assert cliente.post('/api/calc/batch', json=[CIRCUITO], headers=TOKEN).status_code == 200
+
+
+def test_cuerpo_mayor_que_el_limite_es_413(cliente):
+    relleno = {**CIRCUITO, 'ID_Equipo': 'x' * 2000}
+    respuesta = cliente.post('/api/calc/batch', json=[relleno], headers=TOKEN)
+    assert respuesta.status_code == 413
+    assert '1024 bytes' in respuesta.get_json()['error']
+
+
+def test_sin_content_length_el_limite_se_comprueba_al_leer():
+    flujo = io.BytesIO(_ndjson([CIRCUITO] * 40).encode())
+    with pytest.raises(CuerpoExcedido):
+        list(_lineas(flujo, 1024, tamano=256))
+    flujo = io.BytesIO(_ndjson([CIRCUITO] * 3).encode())
+    assert len(list(_lineas(flujo, 1024, tamano=16))) == 3
+
+
+@pytest.mark.parametrize('content_type', ['application/json', 'application/x-ndjson'])
+def test_lote_mayor_que_el_maximo_es_413(cliente, content_type):
+    circuitos = [CIRCUITO] * 4
+    cuerpo = json.dumps(circuitos) if content_type == 'application/json' else _ndjson(circuitos)
+    respuesta = cliente.post('/api/calc/batch', data=cuerpo, headers=TOKEN, content_type=content_type)
+    assert respuesta.status_code == 413
+    assert '3 circuitos' in respuesta.get_json()['error']
+
+
+def test_los_circuitos_invalidos_producen_su_linea_de_error_en_orden(cliente):
+    circuitos = [CIRCUITO, {'ID_Equipo': 'M-2', 'Corriente': 'veinte', 'Temperatura': 30,
+                            'Longitud': 20, 'Voltaje': 220}, 'no es un objeto']
+    respuesta = cliente.post('/api/calc/batch', data=_ndjson(circuitos), headers=TOKEN,
+                             content_type='application/x-ndjson')
+    assert respuesta.status_code == 200
+    assert respuesta.mimetype == 'application/x-ndjson'
+    filas = _filas(respuesta)
+    assert [fila['indice'] for fila in filas] == [0, 1, 2]
+    assert filas[0]['Calibre'] and filas[0]['Error'] is None
+    assert filas[1] == {'indice': 1, 'ID_Equipo': 'M-2', 'Estado': 'Error', 'Error': 'Corriente inválido'}
+    assert filas[2]['Estado'] == 'Error' and filas[2]['ID_Equipo'] is None
+
+
+def test_linea_ndjson_ilegible_es_400(cliente):
+    respuesta = cliente.post('/api/calc/batch', data='{"Corriente": 1}\n{roto', headers=TOKEN,
+                             content_type='application/x-ndjson')
+    assert respuesta.status_code == 400
+    assert respuesta.get_json()['error'] == 'Línea 2: JSON inválido'
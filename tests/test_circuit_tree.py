@@ -0,0 +1,98 @@
+# tests/test_circuit_tree.py
+import sqlite3
+
+import pytest
+
+from modules import circuit_tree
+from modules.calculations import calculate_voltage_drop
+
+
+@pytest.fixture
+def conn(main_db):
+    conn = sqlite3.connect(main_db)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def arbol(app, conn):
+    """Proyecto 1: A -> B -> C y A -> D; proyecto 2: X."""
+    ids = {}
+    for tag, padre, tipo, longitud, proyecto in (
+        ('A', None, 'alimentador', 50, 1),
+        ('B', 'A', 'tablero', 30, 1),
+        ('C', 'B', 'ramal', 20, 1),
+        ('D', 'A', 'ramal', 10, 1),
+        ('X', None, 'alimentador', 40, 2),
+    ):
+        ids[tag] = circuit_tree.add_circuit(conn, proyecto, tag, tipo, 20.0, longitud, 220.0,
+                                            '10 AWG', padre_id=ids.get(padre))
+    return ids
+
+
+def _acumuladas(conn):
+    return dict(conn.execute('SELECT tag, caida_acumulada FROM circuitos'))
+
+
+def test_la_acumulada_suma_las_caidas_del_camino(app, conn, arbol):
+    caida = lambda longitud: calculate_voltage_drop(20.0, longitud, '10 AWG', 220.0)
+    acumuladas = _acumuladas(conn)
+    assert acumuladas['C'] == pytest.approx(caida(50) + caida(30) + caida(20))
+    assert acumuladas['D'] == pytest.approx(caida(50) + caida(10))
+
+
+def test_update_recalcula_solo_el_subarbol(app, conn, arbol):
+    antes = _acumuladas(conn)
+    conn.execute('UPDATE circuitos SET caida_acumulada = -1 WHERE tag = ?', ('D',))
+    conn.commit()
+
+    subarbol = circuit_tree.update_circuit(conn, arbol['B'], longitud=60.0)
+    assert [nodo['tag'] for nodo in subarbol] == ['B', 'C']
+
+    despues = _acumuladas(conn)
+    delta = (calculate_voltage_drop(20.0, 60.0, '10 AWG', 220.0)
+             - calculate_voltage_drop(20.0, 30.0, '10 AWG', 220.0))
+    assert despues['B'] == pytest.approx(antes['B'] + delta)
+    assert despues['C'] == pytest.approx(antes['C'] + delta)
+    # Fuera del subárbol no se toca nada (D conserva el valor alterado)
+    assert despues['A'] == antes['A'] and despues['D'] == -1
+
+    # El resultado coincide con recalcular todo el proyecto
+    completo = {n['tag']: n['caida_acumulada'] for n in circuit_tree.recompute_project(conn, 1).to_list()}
+    assert completo['C'] == pytest.approx(despues['C'], abs=1e-4)
+
+
+def test_mover_un_subarbol_parte_de_la_acumulada_del_nuevo_padre(app, conn, arbol):
+    circuit_tree.update_circuit(conn, arbol['C'], padre_id=arbol['D'])
+    acumuladas = _acumuladas(conn)
+    caida_c = calculate_voltage_drop(20.0, 20, '10 AWG', 220.0)
+    assert acumuladas['C'] == pytest.approx(acumuladas['D'] + caida_c)
+
+
+@pytest.mark.parametrize('nuevo_padre', ['B', 'C'])
+def test_un_circuito_no_puede_colgar_de_su_subarbol(app, conn, arbol, nuevo_padre):
+    antes = list(conn.execute('SELECT id, padre_id, caida_acumulada FROM circuitos ORDER BY id'))
+    with pytest.raises(ValueError, match='propio subárbol'):
+        circuit_tree.update_circuit(conn, arbol['B'], padre_id=arbol[nuevo_padre])
+    # La transacción se deshace
+    assert list(conn.execute('SELECT id, padre_id, caida_acumulada FROM circuitos ORDER BY id')) == antes
+
+
+def test_un_ciclo_ya_guardado_se_detecta_al_recalcular(app, conn, arbol):
+    conn.execute('UPDATE circuitos SET padre_id = ? WHERE id = ?', (arbol['C'], arbol['A']))
+    conn.commit()
+    with pytest.raises(ValueError, match='ciclos'):
+        circuit_tree.recompute_project(conn, 1)
+
+
+def test_el_padre_debe_ser_del_mismo_proyecto(app, conn, arbol):
+    with pytest.raises(ValueError, match='no existe en el proyecto'):
+        circuit_tree.update_circuit(conn, arbol['C'], padre_id=arbol['X'])
+    assert conn.execute('SELECT padre_id FROM circuitos WHERE id = ?',
+                        (arbol['C'],)).fetchone()[0] == arbol['B']
+
+    total = conn.execute('SELECT COUNT(*) FROM circuitos').fetchone()[0]
+    with pytest.raises(ValueError, match='no existe en el proyecto'):
+        circuit_tree.add_circuit(conn, 1, 'E', 'ramal', 10.0, 10.0, 220.0, '12 AWG',
+                                 padre_id=arbol['X'])
+    assert conn.execute('SELECT COUNT(*) FROM circuitos').fetchone()[0] == total
@@ -0,0 +1,116 @@
+# tests/test_derating.py
+import sqlite3
+
+import numpy as np
+import pytest
+
+from modules.batch_sizing import optimize_circuits, size_circuits
+from modules.calculations import dimension_channel, select_cable
+from modules.derating import grid_from_tables, normalizar_calibre
+
+
+def test_mas_de_tres_conductores_aumenta_el_calibre(tablas):
+    rejilla = grid_from_tables(tablas)
+    # 24 A a 30 °C: 12 AWG (25 A) alcanza con 3 conductores; con 4-6 (factor 0.8) no
+    assert rejilla.select_calibre(24, 30, 3) == '12 AWG'
+    assert rejilla.select_calibre(24, 30, 4) == '10 AWG'
+    assert rejilla.select_calibre(24, 30, 7) == '8 AWG'
+
+
+def test_size_circuits_usa_el_numero_de_conductores(tablas):
+    lote = size_circuits([24, 24, 24], 30, 10, 480, [3, 4, 7], tablas=tablas)
+    assert list(lote['Calibre']) == ['12 AWG', '10 AWG', '8 AWG']
+    assert list(lote['Estado']) == ['OK', 'OK', 'OK']
+
+
+def test_optimize_circuits_usa_el_numero_de_conductores(tablas):
+    lote = optimize_circuits([24, 24], 30, 10, 480, num_conductores=[3, 4], tablas=tablas)
+    assert list(lote['Calibre_Ampacidad']) == ['12 AWG', '10 AWG']
+
+
+def test_select_many_coincide_con_select_calibre(tablas):
+    rejilla = grid_from_tables(tablas)
+    rng = np.random.default_rng(0)
+    corrientes = rng.uniform(1, 180, 500)
+    temperaturas = rng.uniform(21, 50, 500)
+    conductores = rng.integers(1, 45, 500)
+    calibres = rejilla.select_many(corrientes, temperaturas, conductores)
+    for c, t, n, calibre in zip(corrientes, temperaturas, conductores, calibres):
+        try:
+            esperado = rejilla.select_calibre(c, t, n)
+        except ValueError:
+            esperado = None
+        assert calibre == esperado
+
+
+@pytest.fixture
+def normative_data_db(tmp_path):
+    """normative_data.db con calibres sin sufijo AWG, dos aislantes y dos materiales."""
+    ruta = str(tmp_path / 'normative_data.db')
+    conn = sqlite3.connect(ruta)
+    conn.executescript('''
+        CREATE TABLE ampacidad_cables (calibre_awg TEXT, material TEXT,
+                                       temperatura_aislante INTEGER, ampacidad REAL);
+        CREATE TABLE factores_correccion_temp (temperatura_ambiente INTEGER, factor REAL);
+        CREATE TABLE factores_correccion_agrupamiento (numero_conductores INTEGER, factor REAL);
+    ''')
+    calibres = ['14', '12', '10', '8', '6', '4', '2', '1/0 AWG']
+    filas = [(c, 'Cobre', 75, a) for c, a in zip(calibres, [15, 20, 30, 50, 65, 85, 115, 150])]
+    filas += [(c, 'Cobre', 90, a) for c, a in zip(calibres, [25, 30, 40, 55, 75, 95, 130, 170])]
+    filas += [(c, 'Aluminio', 75, a) for c, a in zip(calibres[1:], [15, 25, 40, 50, 65, 90, 120])]
+    conn.executemany('INSERT INTO ampacidad_cables VALUES (?, ?, ?, ?)', filas)
+    conn.executemany('INSERT INTO factores_correccion_temp VALUES (?, ?)',
+                     [(25, 1.05), (30, 1.0), (35, 0.94), (40, 0.88), (45, 0.82), (50, 0.75)])
+    conn.executemany('INSERT INTO factores_correccion_agrupamiento VALUES (?, ?)',
+                     [(3, 1.0), (6, 0.8), (9, 0.7)])
+    conn.commit()
+    conn.close()
+    return ruta
+
+
+@pytest.fixture
+def app_extendida(app, normative_data_db):
+    app.config.update(NORMATIVE_DATA_DB=normative_data_db,
+                      DERATING_MATERIAL='Cobre', DERATING_TEMPERATURA_AISLANTE=75)
+    return app
+
+
+def test_normalizar_calibre():
+    assert normalizar_calibre('12') == '12 AWG'
+    assert normalizar_calibre(' 12 awg ') == '12 AWG'
+    assert normalizar_calibre('1/0 AWG') == '1/0'
+    assert normalizar_calibre('4/0') == '4/0'
+    assert normalizar_calibre('250 kcmil') == '250 kcmil'
+
+
+def test_tablas_extendidas_con_material_y_aislante_por_defecto(app_extendida):
+    # Cobre 75 °C de normative_data.db, con nombres de NORM_DB
+    assert select_cable(20, 30) == '12 AWG'
+    assert select_cable(20, 30, 4) == '10 AWG'
+    assert select_cable(140, 30) == '1/0'
+    assert select_cable(20, 30, material='Cobre', temperatura_aislante=90) == '14 AWG'
+    assert select_cable(20, 30, material='Aluminio', temperatura_aislante=75) == '10 AWG'
+    with pytest.raises(ValueError, match='Sin ampacidades'):
+        select_cable(20, 30, material='Plata', temperatura_aislante=75)
+
+
+def test_size_circuits_con_tablas_extendidas(app_extendida):
+    lote = size_circuits([15, 20, 30], 30, 10, 480)
+    assert list(lote['Calibre']) == ['14 AWG', '12 AWG', '10 AWG']
+    assert list(lote['Estado']) == ['OK', 'OK', 'OK']
+    assert list(lote['Error']) == [None, None, None]
+    assert list(lote['Canalizacion']) == [dimension_channel(c, 3) for c in lote['Calibre']]
+
+
+def test_sin_el_par_por_defecto_se_usa_norm_db(app_extendida):
+    app_extendida.config['DERATING_MATERIAL'] = 'Plata'
+    # NORM_DB: 14 AWG = 20 A
+    assert select_cable(20, 30) == '14 AWG'
+
+
+def test_temperatura_con_decimales_usa_el_grado_siguiente(tablas):
+    rejilla = grid_from_tables(tablas)
+    # 30.5 °C queda entre los rangos 26-30 y 31-35 de NORM_DB: factor de 31 °C
+    assert rejilla.ampacity('12 AWG', 30.5) == pytest.approx(25 * 0.91)
+    with pytest.raises(ValueError, match='fuera de rango'):
+        rejilla.select_calibre(20, 50.5)
@@ -0,0 +1,18 @@
+# tests/test_exports.py
+import pytest
+
+from modules.calculations import CAIDA_OK, CAIDA_REVISAR
+from modules.exports import ENCABEZADOS_REVIT, revit_row
+
+
+@pytest.mark.parametrize('caida, estado', [
+    (CAIDA_OK, 'OK'),
+    (CAIDA_OK + 0.01, 'Revisar'),
+    (CAIDA_REVISAR, 'Revisar'),
+    (CAIDA_REVISAR + 0.01, 'Fuera de rango'),
+])
+def test_el_estado_revit_usa_los_umbrales_de_calculations(caida, estado):
+    fila = revit_row({'ID_Equipo': 'M-1', 'Descripcion': 'Motor', 'Corriente': 20,
+                      'Calibre': '12 AWG', 'Caida_Tension': caida, 'Canalizacion': '3/4"'})
+    assert len(fila) == len(ENCABEZADOS_REVIT)
+    assert fila[6] == estado
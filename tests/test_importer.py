@@ -0,0 +1,66 @@
+# tests/test_importer.py
+import sqlite3
+
+import pytest
+from openpyxl import Workbook
+
+from modules.importer import import_equipment_xlsx
+
+ENCABEZADO = ('Tag', 'Descripción', 'Corriente (A)', 'Longitud (m)', 'Voltaje (V)', 'Conductores')
+
+
+@pytest.fixture
+def equipos(main_db):
+    with sqlite3.connect(main_db) as conn:
+        conn.execute("INSERT INTO equipment (tag, descripcion, proyecto_id, corriente) "
+                     "VALUES ('M-EXISTE', 'Motor', 1, 10)")
+        conn.execute("INSERT INTO equipment (tag, descripcion, proyecto_id) VALUES ('M-OTRO', 'Bomba', 2)")
+    conn.close()
+    return main_db
+
+
+def _libro(tmp_path, filas):
+    wb = Workbook()
+    wb.active.append(ENCABEZADO)
+    for fila in filas:
+        wb.active.append(fila)
+    ruta = tmp_path / 'equipos.xlsx'
+    wb.save(ruta)
+    return str(ruta)
+
+
+def _errores(reporte):
+    return {(e['fila'], e['tag']): e['error'] for e in reporte.errores}
+
+
+def test_importacion_valida_tags_y_numeros(tmp_path, equipos):
+    libro = _libro(tmp_path, [
+        ('M-1', 'Motor 1', 20, 30, 220, 3),         # fila 2: nuevo
+        ('M-1', 'Repetido', 25, 30, 220, 3),        # fila 3: duplicado en el archivo
+        ('M-EXISTE', 'Motor', None, 40, None, 4),   # fila 4: ya existe en el proyecto
+        ('M-OTRO', 'Bomba', 5, 10, 220, 3),         # fila 5: de otro proyecto
+        ('M-2', 'Motor 2', 10, 10, 220, 2.5),       # fila 6: conductores fraccionarios
+        ('M-3', 'Motor 3', 'veinte', 10, 220, 3),   # fila 7: celda no numérica
+        ('M-4', 'Motor 4', '12,5', 10, 220, 4.0),   # fila 8: coma decimal y 4.0 entero
+    ])
+    reporte = import_equipment_xlsx(libro, equipos, 1, tamano_bloque=3)
+
+    assert reporte.filas == 7
+    errores = _errores(reporte)
+    assert errores.pop((7, 'M-3')).startswith('Valor numérico inválido')
+    assert errores == {
+        (3, 'M-1'): 'Tag duplicado en el archivo',
+        (5, 'M-OTRO'): 'El tag ya pertenece a otro proyecto',
+        (6, 'M-2'): 'Valor numérico inválido: num_conductores 2.5 no es un número entero',
+    }
+    assert (reporte.insertados, reporte.actualizados) == (2, 1)
+
+    with sqlite3.connect(equipos) as conn:
+        guardados = {fila[0]: fila[1:] for fila in conn.execute(
+            'SELECT tag, proyecto_id, corriente, longitud, num_conductores FROM equipment')}
+    assert guardados['M-1'] == (1, 20.0, 30.0, 3)
+    # Una celda vacía conserva el valor guardado
+    assert guardados['M-EXISTE'] == (1, 10.0, 40.0, 4)
+    assert guardados['M-OTRO'] == (2, None, None, None)
+    assert guardados['M-4'] == (1, 12.5, 10.0, 4)
+    assert 'M-2' not in guardados and 'M-3' not in guardados
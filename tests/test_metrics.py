@@ -0,0 +1,46 @@
+# tests/test_metrics.py
+import os
+
+import pytest
+from flask import Flask
+
+from modules import metrics
+
+
+@pytest.fixture
+def cliente():
+    app = Flask(__name__)
+    app.config.update(TESTING=True, METRICS_TOKEN='secreto', METRICS_ALLOWED_NETWORKS='',
+                      REQUEST_LOG_SAMPLE_RATE=0, REQUEST_LOG_SLOW_MS=1000)
+    metrics.init_app(app)
+    return app.test_client()
+
+
+def test_metrics_exige_el_token(cliente):
+    assert cliente.get('/metrics').status_code == 401
+    assert cliente.get('/metrics', headers={'Authorization': 'Bearer otro'}).status_code == 401
+    assert cliente.get('/metrics', headers={'Authorization': 'Bearer secretoo'}).status_code == 401
+    assert cliente.get('/metrics', headers={'Authorization': 'Bearer secreto'}).status_code == 200
+
+
+def test_los_totales_se_declaran_counter_con_etiqueta_worker():
+    registro = metrics.Registry()
+    peticiones = registro.counter('peticiones_total', 'Peticiones.', ('ruta',))
+    peticiones.inc(ruta='/')
+    registro.collector(lambda: [('aciertos_total', 'counter', 'Aciertos.', 3),
+                                ('bytes', 'gauge', 'Bytes.', 10)])
+    texto = registro.render()
+    worker = f'worker="{os.getpid()}"'
+    assert '# TYPE peticiones_total counter' in texto
+    assert f'peticiones_total{{{worker},ruta="/"}} 1' in texto
+    assert '# TYPE aciertos_total counter' in texto
+    assert f'aciertos_total{{{worker}}} 3' in texto
+    assert '# TYPE bytes gauge' in texto
+
+
+def test_los_contadores_de_las_caches_son_counter():
+    texto = metrics.registry.render()
+    for nombre in ('report_cache_hits_total', 'page_cache_not_modified_total',
+                   'sqlite_connections_opened_total'):
+        assert f'# TYPE {nombre} counter' in texto
+    assert '# TYPE report_cache_bytes gauge' in texto
@@ -0,0 +1,87 @@
+# tests/test_normative_snapshot.py
+import mmap
+import sqlite3
+
+import pytest
+
+from modules import normative_snapshot
+from modules.derating import DeratingCache, grid_from_tables
+from modules.normative_cache import NormativeCache, leer_sello
+from modules.normative_snapshot import SnapshotError, compile_snapshot, load_snapshot
+
+
+@pytest.fixture
+def snapshot(norm_db, tmp_path):
+    ruta = str(tmp_path / 'normative.snapshot')
+    compile_snapshot(norm_db, ruta)
+    return ruta
+
+
+def _sin_sql(*args):
+    raise AssertionError('Se leyeron las tablas normativas de SQLite')
+
+
+def test_arranque_desde_la_instantanea_sin_leer_las_tablas(norm_db, snapshot, tablas, monkeypatch):
+    monkeypatch.setattr(NormativeCache, '_filas', _sin_sql)
+    cache = NormativeCache(norm_db, snapshot)
+    desde_mapa = cache.tablas()
+    assert cache.stats()['snapshot'] == snapshot
+    assert desde_mapa.version == tablas.version
+    assert desde_mapa.calibre_para_corriente(24) == tablas.calibre_para_corriente(24)
+    assert desde_mapa.factor_temperatura(33) == tablas.factor_temperatura(33)
+    assert desde_mapa.resistencia_reactancia('12 AWG') == tablas.resistencia_reactancia('12 AWG')
+    assert desde_mapa.resistencia_reactancia('500 kcmil') is None
+    # Escribir otra tabla de la base no cambia el contador normativo
+    conn = sqlite3.connect(norm_db)
+    conn.execute('CREATE TABLE otra (x)')
+    conn.commit()
+    conn.close()
+    assert cache.tablas() is desde_mapa
+
+
+def test_la_rejilla_se_lee_de_la_instantanea(norm_db, snapshot, tablas):
+    rejilla = DeratingCache(norm_db, snapshot=snapshot).grid()
+    esperada = grid_from_tables(tablas)
+    assert rejilla._mapa is not None
+    assert rejilla.version == esperada.version
+    for corriente, temperatura, conductores in [(24, 30, 3), (24, 30, 4), (24, 30, 7), (100, 45, 2)]:
+        assert (rejilla.select_calibre(corriente, temperatura, conductores)
+                == esperada.select_calibre(corriente, temperatura, conductores))
+
+
+def test_un_cambio_normativo_descarta_la_instantanea(norm_db, snapshot):
+    conn = sqlite3.connect(norm_db)
+    conn.execute("UPDATE ampacidad_cables SET ampacidad = 26 WHERE calibre = '12 AWG'")
+    conn.commit()
+    conn.close()
+    tablas = NormativeCache(norm_db, snapshot).tablas()
+    assert tablas._mapa is None
+    assert tablas.ampacidades[1] == 26
+    conn = sqlite3.connect(norm_db)
+    sello = leer_sello(conn)
+    conn.close()
+    with pytest.raises(SnapshotError, match='vuelva a compilarla'):
+        load_snapshot(snapshot, sello_esperado=sello)
+
+
+@pytest.mark.parametrize('danar', [
+    lambda datos: datos[:10],
+    lambda datos: datos[:16] + b'{"sello": 1}' + datos[28:],
+    lambda datos: datos[:-8] + b'\x00' * 8,
+])
+def test_una_instantanea_invalida_cierra_el_mapa(snapshot, danar, monkeypatch):
+    with open(snapshot, 'rb') as f:
+        datos = f.read()
+    with open(snapshot, 'wb') as f:
+        f.write(danar(datos))
+
+    abiertos = []
+
+    class Mapa(mmap.mmap):
+        def __init__(self, *args, **kwargs):
+            abiertos.append(self)
+
+    monkeypatch.setattr(normative_snapshot.mmap, 'mmap', Mapa)
+    with pytest.raises(SnapshotError):
+        load_snapshot(snapshot)
+    assert abiertos and all(mapa.closed for mapa in abiertos)
@@ -0,0 +1,99 @@
+# tests/test_page_cache.py
+import sqlite3
+
+import pytest
+from flask import Flask, session
+from flask_babel import Babel
+
+from modules import db, page_cache
+from modules.migrations import SQL_VERSIONES
+
+
+@pytest.fixture
+def cliente(tmp_path):
+    ruta = str(tmp_path / 'main.db')
+    with sqlite3.connect(ruta) as conn:
+        conn.execute(SQL_VERSIONES)
+    db.registry.register('main', ruta)
+
+    app = Flask(__name__)
+    app.config.update(TESTING=True, SECRET_KEY='prueba')
+    Babel(app, locale_selector=lambda: session.get('idioma', 'es'))
+    app.teardown_appcontext(db._liberar)
+    app.renders = 0
+
+    @app.route('/lista')
+    @page_cache.conditional_page(('main', 'projects'))
+    def lista():
+        app.renders += 1
+        return f'{session.get("username")}|{session.get("role")}|{session.get("idioma", "es")}'
+
+    @app.route('/escribir')
+    def escribir():
+        page_cache.bump_version('main', 'projects')
+        return ''
+
+    page_cache.get_page_cache().clear()
+    yield app.test_client()
+    db.registry.close_thread()
+
+
+def _sesion(cliente, **valores):
+    # Se conserva el token CSRF: la clave solo debe cambiar por los valores indicados
+    with cliente.session_transaction() as s:
+        token = s.get('csrf_token')
+        s.clear()
+        s.update(valores)
+        if token:
+            s['csrf_token'] = token
+
+
+def _etag(respuesta):
+    return respuesta.get_etag()[0]
+
+
+def test_etag_vigente_responde_304_sin_renderizar(cliente):
+    _sesion(cliente, user_id=1, username='ana', role='Ingeniero')
+    primera = cliente.get('/lista')
+    assert primera.status_code == 200 and _etag(primera)
+    assert 'Last-Modified' not in primera.headers
+    assert cliente.application.renders == 1
+
+    no_modificada = cliente.get('/lista', headers={'If-None-Match': f'"{_etag(primera)}"'})
+    assert no_modificada.status_code == 304
+    assert no_modificada.get_data() == b''
+    assert _etag(no_modificada) == _etag(primera)
+    assert cliente.application.renders == 1
+
+    # Una escritura en la tabla cambia el ETag
+    cliente.get('/escribir')
+    nueva = cliente.get('/lista', headers={'If-None-Match': f'"{_etag(primera)}"'})
+    assert nueva.status_code == 200 and _etag(nueva) != _etag(primera)
+    assert cliente.application.renders == 2
+
+
+def test_if_modified_since_sin_etag_no_responde_304(cliente):
+    _sesion(cliente, user_id=1, username='ana', role='Ingeniero')
+    cliente.get('/escribir')
+    respuesta = cliente.get('/lista', headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+    assert respuesta.status_code == 200
+
+
+@pytest.mark.parametrize('otra_sesion', [
+    {'user_id': 2, 'username': 'luis', 'role': 'Ingeniero'},
+    {'user_id': 1, 'username': 'ana', 'role': 'Administrador'},
+    {'user_id': 1, 'username': 'ana', 'role': 'Ingeniero', 'idioma': 'en'},
+])
+def test_las_entradas_se_separan_por_usuario_rol_e_idioma(cliente, otra_sesion):
+    _sesion(cliente, user_id=1, username='ana', role='Ingeniero')
+    primera = cliente.get('/lista')
+    cliente.get('/lista')
+    assert cliente.application.renders == 1
+
+    _sesion(cliente, **otra_sesion)
+    otra = cliente.get('/lista', headers={'If-None-Match': f'"{_etag(primera)}"'})
+    assert otra.status_code == 200
+    assert _etag(otra) != _etag(primera)
+    assert otra.get_data(as_text=True) == (
+        f'{otra_sesion["username"]}|{otra_sesion["role"]}|{otra_sesion.get("idioma", "es")}')
+    assert cliente.application.renders == 2
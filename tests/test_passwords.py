@@ -0,0 +1,60 @@
+# tests/test_passwords.py
+import time
+
+import bcrypt
+import pytest
+
+from modules.db_init import init_user_db
+from modules.migrations import migrate
+from modules.passwords import LoginThrottle, PasswordHasher
+
+
+@pytest.fixture
+def user_db(tmp_path):
+    ruta = str(tmp_path / 'users.db')
+    init_user_db(ruta)
+    migrate(ruta, 'users')
+    return ruta
+
+
+def test_los_fallos_se_comparten_entre_procesos(user_db):
+    # Dos limitadores sobre la misma base equivalen a dos workers de gunicorn
+    worker_a = LoginThrottle(user_db, ventana=60, max_fallos_usuario=3, max_fallos_ip=5)
+    worker_b = LoginThrottle(user_db, ventana=60, max_fallos_usuario=3, max_fallos_ip=5)
+    worker_a.failed('Ana', '10.0.0.1')
+    worker_b.failed('ana', '10.0.0.1')
+    assert worker_a.retry_after('ana', '10.0.0.2') == 0
+    worker_a.failed('ANA', '10.0.0.1')
+    assert 0 < worker_b.retry_after('ana', '10.0.0.2') <= 61
+
+
+def test_un_login_correcto_libera_al_usuario_pero_no_a_la_ip(user_db):
+    throttle = LoginThrottle(user_db, ventana=60, max_fallos_usuario=2, max_fallos_ip=2)
+    throttle.failed('ana', '10.0.0.1')
+    throttle.failed('ana', '10.0.0.1')
+    throttle.succeeded('ana')
+    assert throttle.retry_after('ana', '10.0.0.2') == 0
+    assert throttle.retry_after('luis', '10.0.0.1') > 0
+
+
+def test_los_fallos_fuera_de_la_ventana_no_cuentan(user_db, monkeypatch):
+    throttle = LoginThrottle(user_db, ventana=60, max_fallos_usuario=1, max_fallos_ip=10)
+    throttle.failed('ana', '10.0.0.1')
+    assert throttle.retry_after('ana', '10.0.0.1') > 0
+    ahora = time.time()
+    monkeypatch.setattr('modules.passwords.time.time', lambda: ahora + 61)
+    assert throttle.retry_after('ana', '10.0.0.1') == 0
+
+
+def test_usuario_inexistente_ejecuta_checkpw(monkeypatch):
+    hasher = PasswordHasher(rounds=4, max_workers=1, max_queue=1)
+    llamadas = []
+    original = bcrypt.checkpw
+
+    def checkpw(password, hashed):
+        llamadas.append(hashed)
+        return original(password, hashed)
+
+    monkeypatch.setattr(bcrypt, 'checkpw', checkpw)
+    assert hasher.verify_dummy('admin789') is False
+    assert len(llamadas) == 1 and llamadas[0].startswith(b'$2b$04$')
@@ -0,0 +1,28 @@
+# tests/test_raceways.py
+import pytest
+
+from modules.batch_sizing import size_circuits
+from modules.calculations import dimension_channel
+from modules.raceways import AREAS_CONDUCTOR, ERROR_EXCEDE, pack_circuits
+
+
+@pytest.mark.parametrize('calibre', list(AREAS_CONDUCTOR))
+def test_dimension_channel_coincide_con_el_empaquetado(calibre):
+    for conductores in range(1, 41):
+        canal = pack_circuits([(1, calibre, conductores)])[0]
+        if canal.error:
+            with pytest.raises(ValueError, match=ERROR_EXCEDE):
+                dimension_channel(calibre, conductores)
+        else:
+            assert dimension_channel(calibre, conductores) == canal.canal.nombre
+
+
+def test_size_circuits_usa_la_misma_tuberia_que_raceways(app):
+    corrientes = [10, 40, 90, 150, 24, 24]
+    conductores = [1, 2, 3, 3, 9, 12]
+    lote = size_circuits(corrientes, 30, 10, 480, conductores)
+    for calibre, n, canalizacion, error in zip(lote['Calibre'], conductores,
+                                               lote['Canalizacion'], lote['Error']):
+        canal = pack_circuits([(1, calibre, n)])[0]
+        assert canalizacion == (canal.canal.nombre if canal.canal else None)
+        assert error == canal.error
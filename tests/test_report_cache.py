@@ -0,0 +1,28 @@
+# tests/test_report_cache.py
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from modules import report_cache
+from modules.exports import export_for_revit
+
+RESULTADOS = [{'ID_Equipo': 'M-1', 'Descripcion': 'Motor', 'Corriente': 20,
+               'Calibre': '12 AWG', 'Caida_Tension': 1.2, 'Canalizacion': '3/4"'}]
+
+
+def test_reportes_simultaneos_del_mismo_proyecto_no_comparten_archivo(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # Iterables sin caché: cada llamada genera su archivo en reports/
+    with ThreadPoolExecutor(8) as pool:
+        rutas = list(pool.map(lambda _: export_for_revit(iter(RESULTADOS), 7), range(8)))
+    assert len(set(rutas)) == 8
+    contenidos = {open(ruta, 'rb').read() for ruta in rutas}
+    assert len(contenidos) == 1 and contenidos.pop()
+
+
+def test_el_reporte_en_cache_se_mueve_desde_un_archivo_unico(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(report_cache.get_report_cache(), 'directorio', os.path.join('reports', 'cache'))
+    ruta = export_for_revit(RESULTADOS, 7)
+    assert os.path.dirname(ruta) == os.path.join('reports', 'cache')
+    # El archivo temporal se movió: solo queda el directorio de la caché
+    assert os.listdir('reports') == ['cache']
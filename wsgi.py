@@ -0,0 +1,13 @@
+# wsgi.py
+"""Punto de entrada WSGI de producción.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Con ``preload_app`` el módulo se importa una vez en el proceso maestro: la
+creación de carpetas, bases y migraciones de ``create_app`` ocurre una sola
+vez y los workers heredan la aplicación ya construida.
+"""
+
+from app import create_app
+
+app = create_app()